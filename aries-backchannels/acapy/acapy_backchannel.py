@@ -1,11 +1,10 @@
 import asyncio
-import functools
+import hashlib
 import json
 import logging
 import os
-import signal
-import subprocess
 import sys
+from secrets import token_hex
 from time import gmtime, strftime
 from timeit import default_timer
 from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
@@ -14,15 +13,20 @@ import yaml
 from acapy.routes.agent_routes import routes as agent_routes
 from acapy.routes.mediation_routes import get_mediation_record_by_connection_id
 from acapy.routes.mediation_routes import routes as mediation_routes
-from aiohttp import (ClientError, ClientRequest, ClientSession, ClientTimeout,
-                     web)
+from aiohttp import ClientError, ClientRequest, ClientTimeout, web
 from python.agent_backchannel import (RUN_MODE, START_TIMEOUT,
                                       AgentBackchannel, AgentPorts,
-                                      BackchannelCommand, default_genesis_txns,
-                                      get_ledger_url)
+                                      BackchannelCommand, command_handler,
+                                      default_genesis_txns, get_ledger_url,
+                                      translate_state)
+from python.agent_process import AgentProcess
+from python.bootstrap_cache import bootstrap_cache
+from python.event_log import log_event, log_webhook
+from python.json_text import JsonText, parse_json
 from python.storage import (get_data_id_from_exch_id, get_resource,
-                            pop_resource, pop_resource_latest, push_resource)
-from python.utils import flatten, log_msg, output_reader, prompt_loop
+                            pop_resource_latest, push_resource,
+                            wait_pop_resource, wait_pop_resource_latest)
+from python.utils import flatten, log_msg, prompt_loop
 from typing_extensions import Literal
 
 # from helpers.jsonmapper.json_mapper import JsonMapper
@@ -67,7 +71,9 @@ class AcaPyAgentBackchannel(AgentBackchannel):
     ):
         super().__init__(ident, agent_ports, genesis_data, params, extra_args)
 
-        self.output_handler_futures = []
+        self.proc: Optional[AgentProcess] = None
+        # hash of the argument vector the running agent process was started with
+        self.proc_args_hash = None
 
         # get aca-py version if available
         self.acapy_version = None
@@ -183,6 +189,17 @@ class AcaPyAgentBackchannel(AgentBackchannel):
             "active": "completed",
         }
 
+        # (topic, their_role) : Aca-py to RFC state map, the role only matters for DID Exchange
+        self.stateTranslationMaps = {
+            ("connection", None): self.connectionStateTranslationDict,
+            ("issue-credential", None): self.issueCredentialStateTranslationDict,
+            ("proof", None): self.presentProofStateTranslationDict,
+            ("did-exchange", "invitee"): self.didExchangeResponderStateTranslationDict,
+            ("did-exchange", "inviter"): self.didExchangeRequesterStateTranslationDict,
+            # no role, probably Out of Band
+            ("did-exchange", None): self.didExchangeResponderStateTranslationDict,
+        }
+
     def is_wallet_anoncreds(self):
         return self.wallet_type == "askar-anoncreds"
 
@@ -272,6 +289,19 @@ class AcaPyAgentBackchannel(AgentBackchannel):
 
         if self.genesis_data:
             result.append(("--genesis-transactions", self.genesis_data))
+        elif self.genesis_data == "":
+            # an empty genesis (from the ledger stand-in service): no Indy pool, the
+            # ledger requests go to the stand-in through the acapy.ledger_stand_in plugin
+            result.extend(
+                [
+                    "--no-ledger",
+                    ("--plugin", "acapy.ledger_stand_in"),
+                    (
+                        "--plugin-config-value",
+                        f"ledger_stand_in.url={get_ledger_url()}",
+                    ),
+                ]
+            )
         # deprecated - should be removed
         if self.storage_type:
             result.append(("--storage-type", self.storage_type))
@@ -391,7 +421,7 @@ class AcaPyAgentBackchannel(AgentBackchannel):
     async def _receive_webhook(self, request: ClientRequest):
         topic = request.match_info["topic"]
         payload = await request.json()
-        await self.handle_webhook(topic, payload)
+        await self.dispatch_webhook(topic, payload)
         # TODO web hooks don't require a response???
         return web.Response(text="")
 
@@ -403,7 +433,7 @@ class AcaPyAgentBackchannel(AgentBackchannel):
 
             method = getattr(self, handler, None)
             # put a log message here
-            log_msg("Passing webhook payload to handler " + handler)
+            log_event("Passing webhook payload to handler " + handler, level=logging.DEBUG)
             if method:
                 await method(payload)
             else:
@@ -412,10 +442,10 @@ class AcaPyAgentBackchannel(AgentBackchannel):
                     f"has no method {handler} "
                     f"to handle webhook on topic {topic}"
                 )
+            # wake up anybody waiting on a state change
+            await self.notify_webhook(topic, payload)
         else:
-            log_msg(
-                "in webhook, topic is: " + topic + " payload is: " + json.dumps(payload, indent=4)
-            )
+            log_webhook(f"in webhook, topic is: {topic} payload is", payload)
 
     async def handle_connections(self, message: Mapping[str, Any]):
         message_protocol = message.get("connection_protocol")
@@ -434,19 +464,17 @@ class AcaPyAgentBackchannel(AgentBackchannel):
             raise Exception(
                 f"Unknown message type in Connections Webhook: {json.dumps(message)}"
             )
-        log_msg("Received a Connection Webhook message: " + json.dumps(message, indent=4))
+        log_webhook("Received a Connection Webhook message", message)
 
     async def handle_revocation_notification(self, message: Mapping[str, Any]):
-        log_msg(
-            "Received a Revocation Notification Webhook message: " + json.dumps(message, indent=4)
-        )
+        log_webhook("Received a Revocation Notification Webhook message", message)
 
         thread_id = message["thread_id"]
 
         push_resource(thread_id, "revocation-notification-msg", message)
 
     async def handle_issue_credential(self, message: Mapping[str, Any]):
-        log_msg("Received Issue Credential Webhook message: " + json.dumps(message, indent=4))
+        log_webhook("Received Issue Credential Webhook message", message)
         thread_id = message["thread_id"]
         if "state" in message and message["state"] == "deleted":
             # ignore "deleted" state
@@ -457,7 +485,7 @@ class AcaPyAgentBackchannel(AgentBackchannel):
             log_msg("Issue Credential Webhook message contains revocation info")
 
     async def handle_issue_credential_v2_0(self, message: Mapping[str, Any]):
-        log_msg("Received Issue Credential v2 Webhook message: " + json.dumps(message, indent=4))
+        log_webhook("Received Issue Credential v2 Webhook message", message)
         thread_id = message["thread_id"]
         if "state" in message and message["state"] == "deleted":
             # ignore "deleted" state
@@ -468,7 +496,7 @@ class AcaPyAgentBackchannel(AgentBackchannel):
             log_msg("Issue Credential Webhook message contains revocation info")
 
     async def handle_issue_credential_v2_0_anoncreds(self, message: Mapping[str, Any]):
-        log_msg("Received Issue Credential v2 Anoncreds Webhook message: " + json.dumps(message, indent=4))
+        log_webhook("Received Issue Credential v2 Anoncreds Webhook message", message)
         thread_id = get_data_id_from_exch_id("credential-msg", "cred_ex_id", message["cred_ex_id"])
         log_msg(f"Thread ID: {thread_id}")
         # fetch the credential to get the revocation info
@@ -480,7 +508,7 @@ class AcaPyAgentBackchannel(AgentBackchannel):
         (resp_status, resp_text) = await self.admin_GET(agent_operation)
         log_msg(f"Anoncreds Credential: {resp_status} {resp_text}")
         if resp_status == 200:
-            resp_json = json.loads(resp_text)
+            resp_json = parse_json(resp_text)
             if "cred_rev_id" in resp_json:
                 message["revocation_id"] = resp_json["cred_rev_id"]
             if "rev_reg_id" in resp_json:
@@ -490,7 +518,7 @@ class AcaPyAgentBackchannel(AgentBackchannel):
             log_msg(f"Issue Anoncreds Credential Webhook message contains revocation info: {thread_id} {message}")
 
     async def handle_present_proof_v2_0(self, message: Mapping[str, Any]):
-        log_msg("Received a Present Proof v2 Webhook message: " + json.dumps(message, indent=4))
+        log_webhook("Received a Present Proof v2 Webhook message", message)
         thread_id = message["thread_id"]
         if "state" in message and message["state"] == "deleted":
             # ignore "deleted" state
@@ -498,7 +526,7 @@ class AcaPyAgentBackchannel(AgentBackchannel):
         push_resource(thread_id, "presentation-msg", message, exch_id_name="presentation_exchange_id")
 
     async def handle_present_proof(self, message: Mapping[str, Any]):
-        log_msg("Received a Present Proof Webhook message: " + json.dumps(message, indent=4))
+        log_webhook("Received a Present Proof Webhook message", message)
         thread_id = message["thread_id"]
         if "state" in message and message["state"] == "deleted":
             # ignore "deleted" state
@@ -509,7 +537,7 @@ class AcaPyAgentBackchannel(AgentBackchannel):
         # No thread id in the webhook for revocation registry messages
         cred_def_id = message["cred_def_id"]
         push_resource(cred_def_id, "revocation-registry-msg", message)
-        log_msg("Received Revocation Registry Webhook message: " + json.dumps(message, indent=4))
+        log_webhook("Received Revocation Registry Webhook message", message)
 
     # TODO Handle handle_issuer_cred_rev (this must be newer than the revocation tests?)
     # TODO Handle handle_issue_credential_v2_0_indy
@@ -519,20 +547,16 @@ class AcaPyAgentBackchannel(AgentBackchannel):
         # No thread id in the webhook for revocation registry messages
         invitation_id = message["invitation_id"]
         push_resource(invitation_id, "oob-inviation-msg", message)
-        log_msg(
-            "Received Out of Band Invitation Webhook message: " + json.dumps(message, indent=4)
-        )
+        log_webhook("Received Out of Band Invitation Webhook message", message)
 
     async def handle_out_of_band(self, message: Mapping[str, Any]):
-        log_msg(
-            "Received Out of Band Webhook message: " + json.dumps(message, indent=4)
-        )
+        log_webhook("Received Out of Band Webhook message", message)
         #invitation_id = message["invitation_msg_id"]
         invitation_id = message["invi_msg_id"]
         push_resource(invitation_id, "out-of-band-msg", message)
 
     async def handle_problem_report(self, message: Mapping[str, Any]):
-        log_msg("Received Problem Report Webhook message: " + json.dumps(message, indent=4))
+        log_webhook("Received Problem Report Webhook message", message)
         thread_id = message.get("thread_id")
         if thread_id:
             push_resource(thread_id, "problem-report-msg", message)
@@ -549,13 +573,15 @@ class AcaPyAgentBackchannel(AgentBackchannel):
         ex_id = None
         webcall_returned = None
         while webcall_returned is None and timeout <= wait_time:
+            seen_count = self.webhook_count
             msg = get_resource(thread_id, data_type)
             try:
                 ex_id = msg[0][id_txt]
                 webcall_returned = True
             except TypeError:
-                await asyncio.sleep(sleep_time)
-                timeout += sleep_time
+                start = default_timer()
+                await self.wait_for_webhook(seen_count, sleep_time)
+                timeout += default_timer() - start
         if timeout >= wait_time:
             raise TimeoutError(
                 "Timeout waiting for web callback to retrieve the thread id based on the exchange id"
@@ -569,18 +595,23 @@ class AcaPyAgentBackchannel(AgentBackchannel):
         wait_time: float = 2.0,
         sleep_time: float = 0.5,
     ):
-        await asyncio.sleep(sleep_time)
         state = "None"
         if type(status_txt) != list:
             status_txt = [status_txt]
-        for i in range(int(wait_time / sleep_time)):
+        deadline = default_timer() + wait_time
+        while True:
+            seen_count = self.webhook_count
             (resp_status, resp_text) = await self.make_admin_request("GET", path)
             if resp_status == 200:
-                resp_json = json.loads(resp_text)
+                resp_json = parse_json(resp_text)
                 state = resp_json["state"]
                 if state in status_txt:
                     return True
-            await asyncio.sleep(sleep_time)
+            remaining = deadline - default_timer()
+            if remaining <= 0:
+                break
+            # re-check as soon as the agent sends a webhook, or after sleep_time at the latest
+            await self.wait_for_webhook(seen_count, min(sleep_time, remaining))
         print(
             "Expected state",
             status_txt,
@@ -603,7 +634,7 @@ class AcaPyAgentBackchannel(AgentBackchannel):
             method, self.admin_url + path, json=data, params=params
         ) as resp:
             resp_status = resp.status
-            resp_text = await resp.text()
+            resp_text = JsonText(await resp.text())
             return (resp_status, resp_text)
 
     async def admin_GET(
@@ -636,453 +667,449 @@ class AcaPyAgentBackchannel(AgentBackchannel):
             self.log(f"Error during POST {path}: {str(e)}")
             raise
 
-    async def make_agent_POST_request(
-        self, command: BackchannelCommand
-    ) -> Tuple[int, str]:
+    @command_handler(
+        "POST",
+        "connection",
+        "create-invitation",
+        "receive-invitation",
+        "accept-invitation",
+        "accept-request",
+        "remove",
+        "start-introduction",
+        "send-ping",
+    )
+    async def handle_connection_POST(self, command: BackchannelCommand):
         data = command.data
 
-        if command.topic == "connection":
-            # If mediator_connection_id is included we should use that as the mediator for this connection
-            mediation_id = None
-            if (
-                data
-                and "mediator_connection_id" in data
-                and data["mediator_connection_id"] != None
-            ):
-                mediation_record = await get_mediation_record_by_connection_id(
-                    self, data["mediator_connection_id"]
-                )
-                mediation_id = mediation_record["mediation_id"]
+        # If mediator_connection_id is included we should use that as the mediator for this connection
+        mediation_id = None
+        if (
+            data
+            and "mediator_connection_id" in data
+            and data["mediator_connection_id"] != None
+        ):
+            mediation_record = await get_mediation_record_by_connection_id(
+                self, data["mediator_connection_id"]
+            )
+            mediation_id = mediation_record["mediation_id"]
 
-            operation = command.operation
-            if operation == "create-invitation":
-                agent_operation = f"/connections/{operation}"
+        operation = command.operation
+        if operation == "create-invitation":
+            agent_operation = f"/connections/{operation}"
 
-                post_data = {}
+            post_data = {}
 
-                if mediation_id:
-                    post_data["mediation_id"] = mediation_id
+            if mediation_id:
+                post_data["mediation_id"] = mediation_id
 
-                (resp_status, resp_text) = await self.admin_POST(
-                    agent_operation, data=post_data
-                )
+            (resp_status, resp_text) = await self.admin_POST(
+                agent_operation, data=post_data
+            )
 
-                # extract invitation from the agent's response
-                invitation_resp = json.loads(resp_text)
-                resp_text = json.dumps(invitation_resp)
+            # extract invitation from the agent's response
+            invitation_resp = parse_json(resp_text)
+            if resp_status == 200:
+                self.translate_agent_state(command.topic, invitation_resp)
+            resp_text = JsonText.from_data(invitation_resp)
+            return (resp_status, resp_text)
 
-                if resp_status == 200:
-                    resp_text = self.agent_state_translation(command.topic, resp_text)
-                return (resp_status, resp_text)
+        elif operation == "receive-invitation":
+            agent_operation = "/connections/" + operation
 
-            elif operation == "receive-invitation":
-                agent_operation = "/connections/" + operation
+            if mediation_id:
+                agent_operation += f"?mediation_id={mediation_id}"
 
-                if mediation_id:
-                    agent_operation += f"?mediation_id={mediation_id}"
+            (resp_status, resp_text) = await self.admin_POST(
+                agent_operation, data=data
+            )
+            if resp_status == 200:
+                resp_text = self.agent_state_translation(command.topic, resp_text)
+            return (resp_status, resp_text)
 
-                (resp_status, resp_text) = await self.admin_POST(
-                    agent_operation, data=data
-                )
-                if resp_status == 200:
-                    resp_text = self.agent_state_translation(command.topic, resp_text)
-                return (resp_status, resp_text)
+        elif (
+            operation == "accept-invitation"
+            or operation == "accept-request"
+            or operation == "remove"
+            or operation == "start-introduction"
+            or operation == "send-ping"
+        ):
+            connection_id = command.record_id
 
-            elif (
-                operation == "accept-invitation"
-                or operation == "accept-request"
-                or operation == "remove"
-                or operation == "start-introduction"
-                or operation == "send-ping"
-            ):
-                connection_id = command.record_id
-
-                # wait for the connection to be in "requested" status
-                if operation == "accept-request":
-                    if not self.auto_accept_requests:
-                        if not await self.expected_agent_state(
-                            f"/connections/{connection_id}", "request", wait_time=60.0
-                        ):
-                            raise Exception("Expected state request but not received")
+            # wait for the connection to be in "requested" status
+            if operation == "accept-request":
+                if not self.auto_accept_requests:
+                    if not await self.expected_agent_state(
+                        f"/connections/{connection_id}", "request", wait_time=60.0
+                    ):
+                        raise Exception("Expected state request but not received")
 
-                agent_operation = f"/connections/{connection_id}/{operation}"
-                log_msg("POST Request: ", agent_operation, json.dumps(command.data, indent=4))
+            agent_operation = f"/connections/{connection_id}/{operation}"
+            log_msg("POST Request: ", agent_operation, json.dumps(command.data, indent=4))
 
-                if self.auto_accept_requests and operation == "accept-request":
-                    resp_status = 200
-                    resp_text = "Aca-py agent in auto accept request mode. accept-request operation not called."
-                else:
-                    # As of adding the Auto Accept and Auto Respond support, it seems a sleep is required here,
-                    # or sometimes the agent isn't in the correct state to accept the operation. Not sure why...
-                    await asyncio.sleep(1)
-                    (resp_status, resp_text) = await self.admin_POST(
-                        agent_operation, command.data
+            if self.auto_accept_requests and operation == "accept-request":
+                resp_status = 200
+                resp_text = "Aca-py agent in auto accept request mode. accept-request operation not called."
+            else:
+                # As of adding the Auto Accept and Auto Respond support, it seems a sleep is required here,
+                # or sometimes the agent isn't in the correct state to accept the operation. Not sure why...
+                await asyncio.sleep(1)
+                (resp_status, resp_text) = await self.admin_POST(
+                    agent_operation, command.data
+                )
+                if resp_status == 200:
+                    resp_text = self.agent_state_translation(
+                        command.topic, resp_text
                     )
-                    if resp_status == 200:
-                        resp_text = self.agent_state_translation(
-                            command.topic, resp_text
-                        )
 
-                log_msg(resp_status, json.dumps(resp_text, indent=4))
-                return (resp_status, resp_text)
+            log_msg(resp_status, json.dumps(resp_text, indent=4))
+            return (resp_status, resp_text)
 
-        elif command.topic == "schema":
-            # check command type vs agent wallet type - can we support "anoncreds" tests?
-            if self.use_anoncreds(command):
-                if not self.is_wallet_anoncreds():
-                    return (400, "Bad request - agent wallet cannot support anoncreds format")
-
-            # POST operation is to create a new schema
-            if self.use_anoncreds(command):
-                # make sure our "data" is in the correct format
-                if "schema" not in data:
-                    new_data = {
-                        "schema": {
-                            "issuerId": data.get("issuer_id"),
-                            "name": data.get("schema_name"),
-                            "version": data.get("schema_version"),
-                            "attrNames": data.get("attributes"),
-                        }
+    @command_handler("POST", "schema")
+    async def handle_schema_POST(self, command: BackchannelCommand):
+        data = command.data
+
+        # check command type vs agent wallet type - can we support "anoncreds" tests?
+        if self.use_anoncreds(command):
+            if not self.is_wallet_anoncreds():
+                return (400, "Bad request - agent wallet cannot support anoncreds format")
+
+        # POST operation is to create a new schema
+        if self.use_anoncreds(command):
+            # make sure our "data" is in the correct format
+            if "schema" not in data:
+                new_data = {
+                    "schema": {
+                        "issuerId": data.get("issuer_id"),
+                        "name": data.get("schema_name"),
+                        "version": data.get("schema_version"),
+                        "attrNames": data.get("attributes"),
                     }
-                    data = new_data
-                schema_name = data['schema'].get("name")
-                schema_version = data['schema'].get("version")
-                schema_get_endpoint = '/anoncreds/schemas'
-                schema_post_endpoint = '/anoncreds/schema'
-            else:
-                schema_name = data.get("schema_name")
-                schema_version = data.get("schema_version")
-                schema_get_endpoint = '/schemas/created'
-                schema_post_endpoint = '/schemas'
-                # not needed for "legacy" indy schemas
-                if "issuer_id" in data:
-                    del data["issuer_id"]
-
-            # Check if schema id already exists
-            log_msg(schema_post_endpoint, data)
-
-            (resp_status, resp_text) = await self.admin_GET(
-                schema_get_endpoint,
-                params={"schema_version": schema_version, "schema_name": schema_name},
-            )
-            resp_json = json.loads(resp_text)
-            if len(resp_json["schema_ids"]) > 0:
-                schema_id = resp_json["schema_ids"][0]
-                return (200, json.dumps({"schema_id": schema_id}))
+                }
+                data = new_data
+            schema_name = data['schema'].get("name")
+            schema_version = data['schema'].get("version")
+            schema_get_endpoint = '/anoncreds/schemas'
+            schema_post_endpoint = '/anoncreds/schema'
+        else:
+            schema_name = data.get("schema_name")
+            schema_version = data.get("schema_version")
+            schema_get_endpoint = '/schemas/created'
+            schema_post_endpoint = '/schemas'
+            # not needed for "legacy" indy schemas
+            if "issuer_id" in data:
+                del data["issuer_id"]
+
+        # Check if schema id already exists
+        log_msg(schema_post_endpoint, data)
+
+        (resp_status, resp_text) = await self.admin_GET(
+            schema_get_endpoint,
+            params={"schema_version": schema_version, "schema_name": schema_name},
+        )
+        resp_json = parse_json(resp_text)
+        if len(resp_json["schema_ids"]) > 0:
+            schema_id = resp_json["schema_ids"][0]
+            return (200, JsonText.from_data({"schema_id": schema_id}))
 
-            (resp_status, resp_text) = await self.admin_POST(
-                schema_post_endpoint, data
-            )
+        (resp_status, resp_text) = await self.admin_POST(
+            schema_post_endpoint, data
+        )
 
-            log_msg(resp_status, json.dumps(resp_text, indent=4))
-            resp_text = self.move_field_to_top_level(resp_text, "schema_id")
-            return (resp_status, resp_text)
+        log_msg(resp_status, json.dumps(resp_text, indent=4))
+        resp_text = self.move_field_to_top_level(resp_text, "schema_id")
+        return (resp_status, resp_text)
 
-        elif command.topic == "credential-definition":
-            # check command type vs agent wallet type - can we support "anoncreds" tests?
-            if self.use_anoncreds(command):
-                if not self.is_wallet_anoncreds():
-                    return (400, "Bad request - agent wallet cannot support anoncreds format")
-
-            # POST operation is to create a new cred def
-            if self.use_anoncreds(command):
-                if "credential_definition" not in data:
-                    new_data = {
-                        "credential_definition": {
-                            "schemaId": data.get("schema_id"),
-                            "issuerId": data.get("issuer_id"),
-                            "tag": data.get("tag"),
-                            "options": {
-                                "support_revocation": data.get("support_revocation"),
-                            },
-                        }
+    @command_handler("POST", "credential-definition")
+    async def handle_credential_definition_POST(self, command: BackchannelCommand):
+        data = command.data
+
+        # check command type vs agent wallet type - can we support "anoncreds" tests?
+        if self.use_anoncreds(command):
+            if not self.is_wallet_anoncreds():
+                return (400, "Bad request - agent wallet cannot support anoncreds format")
+
+        # POST operation is to create a new cred def
+        if self.use_anoncreds(command):
+            if "credential_definition" not in data:
+                new_data = {
+                    "credential_definition": {
+                        "schemaId": data.get("schema_id"),
+                        "issuerId": data.get("issuer_id"),
+                        "tag": data.get("tag"),
+                        "options": {
+                            "support_revocation": data.get("support_revocation"),
+                        },
                     }
-                    data = new_data
-                schema_id = data['credential_definition'].get("schemaId")
-                tag = data['credential_definition'].get("tag")
-                cred_defs_get_endpoint = '/anoncreds/credential-definitions'
-                cred_defs_post_endpoint = '/anoncreds/credential-definition'
-            else:
-                tag = data.get("tag")
-                schema_id = data.get("schema_id")
-                cred_defs_get_endpoint = '/credential-definitions/created'
-                cred_defs_post_endpoint = '/credential-definitions'
-                # not needed for "legacy" indy cred defs
-                if "issuer_id" in data:
-                    del data["issuer_id"]
-
-            agent_operation = "/credential-definitions"
-            log_msg(agent_operation, json.dumps(command.data, indent=4))
-
-            # Check if credential definition id already exists
-            (resp_status, resp_text) = await self.admin_GET(
-                cred_defs_get_endpoint,
-                params={
-                    "schema_id": schema_id,
-                },
-            )
-            resp_json = json.loads(resp_text)
-            if len(resp_json["credential_definition_ids"]) > 0:
-                # need to check the 'tag' value
-                for cred_def_id in resp_json["credential_definition_ids"]:
-                    cred_def_id_parts = cred_def_id.split(":")
-                    if tag == cred_def_id_parts[4]:
-                        return (
-                            200,
-                            json.dumps({"credential_definition_id": cred_def_id}),
-                        )
+                }
+                data = new_data
+            schema_id = data['credential_definition'].get("schemaId")
+            tag = data['credential_definition'].get("tag")
+            cred_defs_get_endpoint = '/anoncreds/credential-definitions'
+            cred_defs_post_endpoint = '/anoncreds/credential-definition'
+        else:
+            tag = data.get("tag")
+            schema_id = data.get("schema_id")
+            cred_defs_get_endpoint = '/credential-definitions/created'
+            cred_defs_post_endpoint = '/credential-definitions'
+            # not needed for "legacy" indy cred defs
+            if "issuer_id" in data:
+                del data["issuer_id"]
+
+        agent_operation = "/credential-definitions"
+        log_msg(agent_operation, json.dumps(command.data, indent=4))
+
+        # Check if credential definition id already exists
+        (resp_status, resp_text) = await self.admin_GET(
+            cred_defs_get_endpoint,
+            params={
+                "schema_id": schema_id,
+            },
+        )
+        resp_json = parse_json(resp_text)
+        if len(resp_json["credential_definition_ids"]) > 0:
+            # need to check the 'tag' value
+            for cred_def_id in resp_json["credential_definition_ids"]:
+                cred_def_id_parts = cred_def_id.split(":")
+                if tag == cred_def_id_parts[4]:
+                    return (
+                        200,
+                        JsonText.from_data({"credential_definition_id": cred_def_id}),
+                    )
 
-            (resp_status, resp_text) = await self.admin_POST(
-                cred_defs_post_endpoint, data
-            )
+        (resp_status, resp_text) = await self.admin_POST(
+            cred_defs_post_endpoint, data
+        )
 
-            log_msg(resp_status, json.dumps(resp_text, indent=4))
-            resp_text = self.move_field_to_top_level(
-                resp_text, "credential_definition_id"
-            )
-            return (resp_status, resp_text)
+        log_msg(resp_status, json.dumps(resp_text, indent=4))
+        resp_text = self.move_field_to_top_level(
+            resp_text, "credential_definition_id"
+        )
+        return (resp_status, resp_text)
 
-        elif command.topic == "issue-credential":
-            operation = command.operation
-            data = command.data
+    @command_handler("POST", "issue-credential")
+    async def handle_issue_credential_POST(self, command: BackchannelCommand):
+        operation = command.operation
+        data = command.data
 
-            acapy_topic = "/issue-credential/"
+        acapy_topic = "/issue-credential/"
 
-            if (
-                self.auto_respond_credential_proposal
-                and operation == "send-offer"
-                and command.record_id
-            ):
-                resp_status = 200
-                resp_text = '{"message": "Aca-py agent in auto respond mode for proposal. send-offer operation not called."}'
-                return (resp_status, resp_text)
-            elif self.auto_respond_credential_offer and operation == "send-request":
-                resp_status = 200
-                resp_text = '{"message": "Aca-py agent in auto respond mode for offer. send-request operation not called."}'
-                return (resp_status, resp_text)
-            elif self.auto_respond_credential_request and operation == "issue":
-                resp_status = 200
-                resp_text = '{"message": "Aca-py agent in auto respond mode for request. issue operation not called."}'
-                return (resp_status, resp_text)
+        if (
+            self.auto_respond_credential_proposal
+            and operation == "send-offer"
+            and command.record_id
+        ):
+            resp_status = 200
+            resp_text = '{"message": "Aca-py agent in auto respond mode for proposal. send-offer operation not called."}'
+            return (resp_status, resp_text)
+        elif self.auto_respond_credential_offer and operation == "send-request":
+            resp_status = 200
+            resp_text = '{"message": "Aca-py agent in auto respond mode for offer. send-request operation not called."}'
+            return (resp_status, resp_text)
+        elif self.auto_respond_credential_request and operation == "issue":
+            resp_status = 200
+            resp_text = '{"message": "Aca-py agent in auto respond mode for request. issue operation not called."}'
+            return (resp_status, resp_text)
+        else:
+            if command.record_id is None:
+                agent_operation = acapy_topic + operation
             else:
-                if command.record_id is None:
-                    agent_operation = acapy_topic + operation
-                else:
+                if (
+                    operation == "send-offer"
+                    or operation == "send-request"
+                    or operation == "issue"
+                    or operation == "store"
+                ):
+
+                    # swap thread id for cred ex id from the webhook
+                    cred_ex_id = await self.swap_thread_id_for_exchange_id(
+                        command.record_id,
+                        "credential-msg",
+                        "credential_exchange_id",
+                    )
+                    agent_operation = (
+                        f"{acapy_topic}records/{cred_ex_id}/{operation}"
+                    )
+
+                    # wait for the issue cred to be in "request-received" status
                     if (
-                        operation == "send-offer"
-                        or operation == "send-request"
-                        or operation == "issue"
-                        or operation == "store"
+                        operation == "issue"
+                        and not self.auto_respond_credential_request
                     ):
-
-                        # swap thread id for cred ex id from the webhook
-                        cred_ex_id = await self.swap_thread_id_for_exchange_id(
-                            command.record_id,
-                            "credential-msg",
-                            "credential_exchange_id",
-                        )
-                        agent_operation = (
-                            f"{acapy_topic}records/{cred_ex_id}/{operation}"
-                        )
-
-                        # wait for the issue cred to be in "request-received" status
-                        if (
-                            operation == "issue"
-                            and not self.auto_respond_credential_request
+                        if not await self.expected_agent_state(
+                            f"{acapy_topic}records/{cred_ex_id}",
+                            "request_received",
+                            wait_time=60.0,
                         ):
-                            if not await self.expected_agent_state(
-                                f"{acapy_topic}records/{cred_ex_id}",
-                                "request_received",
-                                wait_time=60.0,
-                            ):
-                                raise Exception(
-                                    "Expected state request-received but not received"
-                                )
-
-                    # Make Special provisions for revoke since it is passing multiple query params not just one id.
-                    elif operation == "revoke":
-                        cred_rev_id = command.record_id
-                        rev_reg_id = data["rev_registry_id"]
-                        publish = data["publish_immediately"]
-                        notify_connection_id = data.get("notify_connection_id")
-                        agent_operation = (
-                            f"{acapy_topic}{operation}"
-                            f"?cred_rev_id={cred_rev_id}"
-                            f"&rev_reg_id={rev_reg_id}"
-                            f"&publish={str(publish).lower()}"
-                        )
-
-                        # If notify connection id is present, notify the holder
-                        if notify_connection_id:
-                            agent_operation += (
-                                "&notify=true&connection_id={notify_connection_id}"
+                            raise Exception(
+                                "Expected state request-received but not received"
                             )
-                        data = None
-                    else:
-                        agent_operation = acapy_topic + operation
-
-                log_msg(agent_operation, json.dumps(data, indent=4))
-
-                # As of adding the Auto Accept and Auto Respond support and not taking time to check interim states
-                # it seems a sleep is required here,
-                # or sometimes the agent isn't in the correct state to accept the operation. Not sure why...
-                await asyncio.sleep(1)
-                (resp_status, resp_text) = await self.admin_POST(agent_operation, data)
-
-                log_msg(resp_status, json.dumps(resp_text, indent=4))
-                if resp_status == 200 and self.aip_version != "AIP20":
-                    resp_text = self.agent_state_translation(command.topic, resp_text)
 
-                if operation == "create-offer":
-                    resp_json = json.loads(resp_text)
-                    resp_text = json.dumps(
-                        {
-                            "record": resp_json,
-                            "message": resp_json["credential_offer_dict"],
-                        }
+                # Make Special provisions for revoke since it is passing multiple query params not just one id.
+                elif operation == "revoke":
+                    cred_rev_id = command.record_id
+                    rev_reg_id = data["rev_registry_id"]
+                    publish = data["publish_immediately"]
+                    notify_connection_id = data.get("notify_connection_id")
+                    agent_operation = (
+                        f"{acapy_topic}{operation}"
+                        f"?cred_rev_id={cred_rev_id}"
+                        f"&rev_reg_id={rev_reg_id}"
+                        f"&publish={str(publish).lower()}"
                     )
-                return (resp_status, resp_text)
-
-        # Handle issue credential v2 POST operations
-        elif command.topic == "issue-credential-v2":
-            (resp_status, resp_text) = await self.handle_issue_credential_v2_POST(
-                command
-            )
-            return (resp_status, resp_text)
-
-        # Handle proof v2 POST operations
-        elif command.topic == "proof-v2":
-            (resp_status, resp_text) = await self.handle_proof_v2_POST(command)
-            return (resp_status, resp_text)
 
-        elif command.topic == "revocation":
-            # set the acapyversion to master since work to set it is not complete. Remove when master report proper version
-            # self.acapy_version = "0.5.5-RC"
-            operation = command.operation
-            (
-                agent_operation,
-                admin_data,
-            ) = await self.get_agent_operation_acapy_version_based(command)
+                    # If notify connection id is present, notify the holder
+                    if notify_connection_id:
+                        agent_operation += (
+                            "&notify=true&connection_id={notify_connection_id}"
+                        )
+                    data = None
+                else:
+                    agent_operation = acapy_topic + operation
 
-            log_msg(agent_operation, json.dumps(admin_data, indent=4))
+            log_msg(agent_operation, json.dumps(data, indent=4))
 
-            if admin_data is None:
-                (resp_status, resp_text) = await self.admin_POST(agent_operation)
-            else:
-                (resp_status, resp_text) = await self.admin_POST(
-                    agent_operation, admin_data
-                )
+            # As of adding the Auto Accept and Auto Respond support and not taking time to check interim states
+            # it seems a sleep is required here,
+            # or sometimes the agent isn't in the correct state to accept the operation. Not sure why...
+            await asyncio.sleep(1)
+            (resp_status, resp_text) = await self.admin_POST(agent_operation, data)
 
             log_msg(resp_status, json.dumps(resp_text, indent=4))
-            if resp_status == 200:
+            if operation == "create-offer":
+                resp_json = parse_json(resp_text)
+                if resp_status == 200 and self.aip_version != "AIP20":
+                    self.translate_agent_state(command.topic, resp_json)
+                resp_text = JsonText.from_data(
+                    {
+                        "record": resp_json,
+                        "message": resp_json["credential_offer_dict"],
+                    }
+                )
+            elif resp_status == 200 and self.aip_version != "AIP20":
                 resp_text = self.agent_state_translation(command.topic, resp_text)
             return (resp_status, resp_text)
 
-        elif command.topic == "proof":
-            operation = command.operation
-            record_id = command.record_id
-            data = command.data
-
-            if (
-                self.auto_respond_presentation_proposal
-                and operation == "send-request"
-                and record_id
-            ):
-                resp_status = 200
-                resp_text = '{"message": "Aca-py agent in auto respond mode for presentation proposal. send-request operation not called."}'
-                log_msg(
-                    "Aca-py agent in auto respond mode for presentation proposal. send-request operation not called."
-                )
-                return (resp_status, resp_text)
-            elif (
-                self.auto_respond_presentation_request
-                and operation == "send-presentation"
-            ):
-                resp_status = 200
-                resp_text = '{"message": "Aca-py agent in auto respond mode for presentation request. send-presentation operation not called."}'
-                log_msg(
-                    "Aca-py agent in auto respond mode for presentation request. send-presentation operation not called."
-                )
-                return (resp_status, resp_text)
-            else:
-                if record_id is None:
-                    agent_operation = f"/present-proof/{operation}"
-                else:
-                    if (
-                        operation == "send-presentation"
-                        or operation == "send-request"
-                        or operation == "verify-presentation"
-                        or operation == "remove"
-                    ):
+    @command_handler("POST", "revocation")
+    async def handle_revocation_POST(self, command: BackchannelCommand):
+        # set the acapyversion to master since work to set it is not complete. Remove when master report proper version
+        # self.acapy_version = "0.5.5-RC"
+        operation = command.operation
+        (
+            agent_operation,
+            admin_data,
+        ) = await self.get_agent_operation_acapy_version_based(command)
 
-                        # swap thread id for pres ex id from the webhook
-                        pres_ex_id = await self.swap_thread_id_for_exchange_id(
-                            record_id,
-                            "presentation-msg",
-                            "presentation_exchange_id",
-                        )
-                        agent_operation = (
-                            f"/present-proof/records/{pres_ex_id}/{operation}"
-                        )
+        log_msg(agent_operation, json.dumps(admin_data, indent=4))
 
-                        # wait for the proof to be in "presentation-received" status
-                        if (
-                            operation == "verify-presentation"
-                            and not self.auto_respond_presentation_request
-                        ):
-                            if not await self.expected_agent_state(
-                                f"/present-proof/records/{pres_ex_id}",
-                                "presentation_received",
-                                wait_time=60.0,
-                            ):
-                                raise Exception(
-                                    "Expected state presentation-received but not received"
-                                )
+        if admin_data is None:
+            (resp_status, resp_text) = await self.admin_POST(agent_operation)
+        else:
+            (resp_status, resp_text) = await self.admin_POST(
+                agent_operation, admin_data
+            )
 
-                    else:
-                        agent_operation = f"/present-proof/{operation}"
+        log_msg(resp_status, json.dumps(resp_text, indent=4))
+        if resp_status == 200:
+            resp_text = self.agent_state_translation(command.topic, resp_text)
+        return (resp_status, resp_text)
 
-                log_msg(agent_operation, json.dumps(data, indent=4))
+    @command_handler("POST", "proof")
+    async def handle_proof_POST(self, command: BackchannelCommand):
+        operation = command.operation
+        record_id = command.record_id
+        data = command.data
 
-                if data is not None:
-                    # Format the message data that came from the test, to what the Aca-py admin api expects.
-                    data = self.map_test_json_to_admin_api_json(
-                        command.topic, operation, data
+        if (
+            self.auto_respond_presentation_proposal
+            and operation == "send-request"
+            and record_id
+        ):
+            resp_status = 200
+            resp_text = '{"message": "Aca-py agent in auto respond mode for presentation proposal. send-request operation not called."}'
+            log_msg(
+                "Aca-py agent in auto respond mode for presentation proposal. send-request operation not called."
+            )
+            return (resp_status, resp_text)
+        elif (
+            self.auto_respond_presentation_request
+            and operation == "send-presentation"
+        ):
+            resp_status = 200
+            resp_text = '{"message": "Aca-py agent in auto respond mode for presentation request. send-presentation operation not called."}'
+            log_msg(
+                "Aca-py agent in auto respond mode for presentation request. send-presentation operation not called."
+            )
+            return (resp_status, resp_text)
+        else:
+            if record_id is None:
+                agent_operation = f"/present-proof/{operation}"
+            else:
+                if (
+                    operation == "send-presentation"
+                    or operation == "send-request"
+                    or operation == "verify-presentation"
+                    or operation == "remove"
+                ):
+
+                    # swap thread id for pres ex id from the webhook
+                    pres_ex_id = await self.swap_thread_id_for_exchange_id(
+                        record_id,
+                        "presentation-msg",
+                        "presentation_exchange_id",
+                    )
+                    agent_operation = (
+                        f"/present-proof/records/{pres_ex_id}/{operation}"
                     )
 
-                # As of adding the Auto Accept and Auto Respond support and not taking time to check interim states
-                # it seems a sleep is required here,
-                # or sometimes the agent isn't in the correct state to accept the operation. Not sure why...
-                await asyncio.sleep(1)
-                (resp_status, resp_text) = await self.admin_POST(agent_operation, data)
+                    # wait for the proof to be in "presentation-received" status
+                    if (
+                        operation == "verify-presentation"
+                        and not self.auto_respond_presentation_request
+                    ):
+                        if not await self.expected_agent_state(
+                            f"/present-proof/records/{pres_ex_id}",
+                            "presentation_received",
+                            wait_time=60.0,
+                        ):
+                            raise Exception(
+                                "Expected state presentation-received but not received"
+                            )
 
-                log_msg(resp_status, json.dumps(resp_text, indent=4))
-                if resp_status == 200:
-                    resp_text = self.agent_state_translation(command.topic, resp_text)
+                else:
+                    agent_operation = f"/present-proof/{operation}"
 
-                if operation == "create-request":
-                    resp_json = json.loads(resp_text)
-                    if resp_status == 200:
-                        resp_text = json.dumps(
-                            {
-                                "record": resp_json,
-                                "message": resp_json["presentation_request_dict"],
-                            }
-                        )
-                return (resp_status, resp_text)
+            log_msg(agent_operation, json.dumps(data, indent=4))
 
-        # Handle out of band POST operations
-        elif command.topic == "out-of-band":
-            (resp_status, resp_text) = await self.handle_out_of_band_POST(command)
-            return (resp_status, resp_text)
+            if data is not None:
+                # Format the message data that came from the test, to what the Aca-py admin api expects.
+                data = self.map_test_json_to_admin_api_json(
+                    command.topic, operation, data
+                )
 
-        # Handle did exchange POST operations
-        elif command.topic == "did-exchange":
-            (resp_status, resp_text) = await self.handle_did_exchange_POST(command)
-            return (resp_status, resp_text)
+            # As of adding the Auto Accept and Auto Respond support and not taking time to check interim states
+            # it seems a sleep is required here,
+            # or sometimes the agent isn't in the correct state to accept the operation. Not sure why...
+            await asyncio.sleep(1)
+            (resp_status, resp_text) = await self.admin_POST(agent_operation, data)
 
-        return (501, "501: Not Implemented\n\n")
+            log_msg(resp_status, json.dumps(resp_text, indent=4))
+            if resp_status == 200 and operation == "create-request":
+                resp_json = self.translate_agent_state(
+                    command.topic, parse_json(resp_text)
+                )
+                resp_text = JsonText.from_data(
+                    {
+                        "record": resp_json,
+                        "message": resp_json["presentation_request_dict"],
+                    }
+                )
+            elif resp_status == 200:
+                resp_text = self.agent_state_translation(command.topic, resp_text)
+            return (resp_status, resp_text)
 
+    @command_handler(
+        "POST", "out-of-band", "send-invitation-message", "receive-invitation"
+    )
     async def handle_out_of_band_POST(self, command: BackchannelCommand):
         operation = command.operation
         data = command.data
@@ -1124,28 +1151,28 @@ class AcaPyAgentBackchannel(AgentBackchannel):
                     (_, resp_text) = await self.admin_GET(
                         "/issue-credential/records", params={"thread_id": thread_id}
                     )
-                    resp_json = json.loads(resp_text)
+                    resp_json = parse_json(resp_text)
                     record_id = resp_json["results"][0]["credential_exchange_id"]
                     record_type = "credential-offer"
                 elif message_type.endswith("/issue-credential/2.0/offer-credential"):
                     (_, resp_text) = await self.admin_GET(
                         "/issue-credential-2.0/records", params={"thread_id": thread_id}
                     )
-                    resp_json = json.loads(resp_text)
+                    resp_json = parse_json(resp_text)
                     record_id = resp_json["results"][0]["cred_ex_record"]["cred_ex_id"]
                     record_type = "credential-offer"
                 elif message_type.endswith("present-proof/1.0/request-presentation"):
                     (_, resp_text) = await self.admin_GET(
                         "/present-proof/records", params={"thread_id": thread_id}
                     )
-                    resp_json = json.loads(resp_text)
+                    resp_json = parse_json(resp_text)
                     record_id = resp_json["results"][0]["presentation_exchange_id"]
                     record_type = "present-proof"
                 elif message_type.endswith("present-proof/2.0/request-presentation"):
                     (_, resp_text) = await self.admin_GET(
                         "/present-proof-2.0/records", params={"thread_id": thread_id}
                     )
-                    resp_json = json.loads(resp_text)
+                    resp_json = parse_json(resp_text)
                     record_id = resp_json["results"][0]["pres_ex_id"]
                     record_type = "present-proof"
                 else:
@@ -1208,7 +1235,7 @@ class AcaPyAgentBackchannel(AgentBackchannel):
         log_msg(resp_status, json.dumps(resp_text, indent=4))
         if resp_status == 200 and operation == "receive-invitation":
             # AATH expects DIDExchange state instead of actual OOB state... :(
-            resp_json = json.loads(resp_text)
+            resp_json = parse_json(resp_text)
             connection_id = resp_json.get("connection_id")
             state = resp_json.get("state")
 
@@ -1220,11 +1247,20 @@ class AcaPyAgentBackchannel(AgentBackchannel):
                 resp_text = self.agent_state_translation(command.topic, resp_text)
             elif state == "prepare-response":
                 resp_json["state"] = "invitation-received"
-                resp_text = json.dumps(resp_json)
+                resp_text = JsonText.from_data(resp_json)
         elif resp_status == 200:
             resp_text = self.agent_state_translation(command.topic, resp_text)
         return (resp_status, resp_text)
 
+    @command_handler(
+        "POST",
+        "did-exchange",
+        "send-request",
+        "receive-invitation",
+        "send-response",
+        "create-request-resolvable-did",
+        "receive-request-resolvable-did",
+    )
     async def handle_did_exchange_POST(self, command: BackchannelCommand):
         operation = command.operation
         data = command.data
@@ -1259,7 +1295,7 @@ class AcaPyAgentBackchannel(AgentBackchannel):
             # The test expects a connection_id returned so, return the last webhook message
             # agent_operation = agent_operation + "receive-request"
 
-            (wh_status, wh_text) = await self.make_agent_GET_request_response(
+            (wh_status, wh_text) = await self.handle_did_exchange_RESPONSE(
                 command, message_name="didexchange-msg"
             )
             return (wh_status, wh_text)
@@ -1274,6 +1310,7 @@ class AcaPyAgentBackchannel(AgentBackchannel):
             resp_text = self.agent_state_translation(command.topic, resp_text)
         return (resp_status, resp_text)
 
+    @command_handler("POST", "issue-credential-v2")
     async def handle_issue_credential_v2_POST(self, command: BackchannelCommand):
         operation = command.operation
         topic = command.topic
@@ -1317,7 +1354,7 @@ class AcaPyAgentBackchannel(AgentBackchannel):
 
                 did = None
                 if resp_status == 200:
-                    resp_json = json.loads(resp_text)
+                    resp_json = parse_json(resp_text)
 
                     # If there is a matching did use it
                     if len(resp_json["results"]) > 0:
@@ -1335,7 +1372,7 @@ class AcaPyAgentBackchannel(AgentBackchannel):
                         },
                     )
                     if resp_status == 200:
-                        resp_json = json.loads(resp_text)
+                        resp_json = parse_json(resp_text)
                         did = resp_json["result"]["did"]
 
                 if did:
@@ -1344,7 +1381,7 @@ class AcaPyAgentBackchannel(AgentBackchannel):
                     if not did.startswith(f"did:{did_method}"):
                         did = f"did:{did_method}:{did}"
 
-                    resp_text = json.dumps({"did": did})
+                    resp_text = JsonText.from_data({"did": did})
 
                     log_msg(resp_status, json.dumps(resp_text, indent=4))
                     return (resp_status, resp_text)
@@ -1376,7 +1413,7 @@ class AcaPyAgentBackchannel(AgentBackchannel):
             (resp_status, resp_text) = await self.admin_POST(agent_operation, data)
 
             if operation == "store":
-                resp_json = json.loads(resp_text)
+                resp_json = parse_json(resp_text)
 
                 if resp_json["ld_proof"]:
                     resp_json["json-ld"] = resp_json.pop("ld_proof")
@@ -1388,18 +1425,19 @@ class AcaPyAgentBackchannel(AgentBackchannel):
                             "cred_id_stored"
                         )
 
-                resp_text = json.dumps(resp_json)
+                resp_text = JsonText.from_data(resp_json)
 
             log_msg(resp_status, json.dumps(resp_text, indent=4))
             resp_text = self.move_field_to_top_level(resp_text, "state")
 
             if operation == "create-offer":
-                resp_json = json.loads(resp_text)
-                resp_text = json.dumps(
+                resp_json = parse_json(resp_text)
+                resp_text = JsonText.from_data(
                     {"record": resp_json, "message": resp_json["cred_offer"]}
                 )
             return (resp_status, resp_text)
 
+    @command_handler("POST", "proof-v2")
     async def handle_proof_v2_POST(self, command: BackchannelCommand):
         operation = command.operation
         topic = command.topic
@@ -1462,8 +1500,8 @@ class AcaPyAgentBackchannel(AgentBackchannel):
             (resp_status, resp_text) = await self.admin_POST(agent_operation, data)
 
             if operation == "create-request":
-                resp_json = json.loads(resp_text)
-                resp_text = json.dumps(
+                resp_json = parse_json(resp_text)
+                resp_text = JsonText.from_data(
                     {"record": resp_json, "message": resp_json["pres_request"]}
                 )
 
@@ -1475,7 +1513,7 @@ class AcaPyAgentBackchannel(AgentBackchannel):
         # Some responses have been changed to nest fields that were once at top level.
         # The Test harness expects the these fields to be at the root. Other agents have it at the root.
         # This could be removed if it is common across agents to nest these fields in `sent:` for instance.
-        resp_json = json.loads(resp_text)
+        resp_json = parse_json(resp_text)
         if field_to_move in resp_json:
             # If it is already a top level field, forget about it.
             return resp_text
@@ -1485,90 +1523,107 @@ class AcaPyAgentBackchannel(AgentBackchannel):
                 if field_to_move in resp_json[key]:
                     field_value = resp_json[key][field_to_move]
                     resp_json[field_to_move] = field_value
-                    return json.dumps(resp_json)
+                    return JsonText.from_data(resp_json)
 
         return resp_text
 
-    async def make_agent_GET_request(
-        self, command: BackchannelCommand
-    ) -> Tuple[int, str]:
-        record_id = command.record_id
+    @command_handler("GET", "status")
+    async def handle_status_GET(self, command: BackchannelCommand):
+        status = 200 if self.ACTIVE else 418
+        status_msg = "Active" if self.ACTIVE else "Inactive"
+        return (status, JsonText.from_data({"status": status_msg}))
+
+    @command_handler("GET", "version")
+    async def handle_version_GET(self, command: BackchannelCommand):
+        if self.acapy_version is not None:
+            status = 200
+            status_msg = self.acapy_version
+        else:
+            status = 404
+            status_msg = "not found"
+        return (status, status_msg)
 
-        if command.topic == "status":
-            status = 200 if self.ACTIVE else 418
-            status_msg = "Active" if self.ACTIVE else "Inactive"
-            return (status, json.dumps({"status": status_msg}))
+    @command_handler("GET", "connection")
+    async def handle_connection_GET(self, command: BackchannelCommand):
+        record_id = command.record_id
 
-        if command.topic == "version":
-            if self.acapy_version is not None:
-                status = 200
-                status_msg = self.acapy_version
-            else:
-                status = 404
-                status_msg = "not found"
-            return (status, status_msg)
-
-        elif command.topic == "connection":
-            if record_id:
-                connection_id = record_id
-                agent_operation = f"/connections/{connection_id}"
-            else:
-                agent_operation = "/connections"
+        if record_id:
+            connection_id = record_id
+            agent_operation = f"/connections/{connection_id}"
+        else:
+            agent_operation = "/connections"
 
-            log_msg("GET Request agent operation: ", agent_operation)
+        log_msg("GET Request agent operation: ", agent_operation)
 
-            (resp_status, resp_text) = await self.admin_GET(agent_operation)
-            if resp_status != 200:
-                return (resp_status, resp_text)
+        (resp_status, resp_text) = await self.admin_GET(agent_operation)
+        if resp_status != 200:
+            return (resp_status, resp_text)
 
-            log_msg("GET Request response details: ", resp_status, json.dumps(resp_text, indent=4))
+        log_msg("GET Request response details: ", resp_status, json.dumps(resp_text, indent=4))
 
-            resp_json = json.loads(resp_text)
-            if record_id:
+        resp_json = parse_json(resp_text)
+        if record_id:
+            connection_info = {
+                "connection_id": resp_json["connection_id"],
+                "state": resp_json["state"],
+                "connection": resp_json,
+            }
+            # translate the state from that the agent gave to what the tests expect
+            self.translate_agent_state(command.topic, connection_info)
+            resp_text = JsonText.from_data(connection_info)
+        else:
+            resp_json = resp_json["results"]
+            connection_infos = []
+            for connection in resp_json:
                 connection_info = {
-                    "connection_id": resp_json["connection_id"],
-                    "state": resp_json["state"],
-                    "connection": resp_json,
+                    "connection_id": connection["connection_id"],
+                    "state": connection["state"],
+                    "connection": connection,
                 }
-                resp_text = json.dumps(connection_info)
-            else:
-                resp_json = resp_json["results"]
-                connection_infos = []
-                for connection in resp_json:
-                    connection_info = {
-                        "connection_id": connection["connection_id"],
-                        "state": connection["state"],
-                        "connection": connection,
-                    }
-                    connection_infos.append(connection_info)
-                resp_text = json.dumps(connection_infos)
-            # translate the state from that the agent gave to what the tests expect
-            resp_text = self.agent_state_translation(command.topic, resp_text)
-            return (resp_status, resp_text)
+                connection_infos.append(connection_info)
+            resp_text = JsonText.from_data(connection_infos)
+        return (resp_status, resp_text)
 
-        elif command.topic == "did":
-            agent_operation = "/wallet/did/public"
-            
-            # Check agent already has public did
-            (resp_status, resp_text) = await self.admin_GET(agent_operation)
-            resp_json = json.loads(resp_text)
-            if resp_json["result"] is not None:
-                resp_text = json.dumps(resp_json["result"])
-                return (resp_status, resp_text)
-            
-            # Create a new local did sov
+    @command_handler("GET", "did")
+    async def handle_did_GET(self, command: BackchannelCommand):
+        agent_operation = "/wallet/did/public"
+        
+        # Check agent already has public did
+        (resp_status, resp_text) = await self.admin_GET(agent_operation)
+        resp_json = parse_json(resp_text)
+        if resp_json["result"] is not None:
+            resp_text = JsonText.from_data(resp_json["result"])
+            return (resp_status, resp_text)
+        
+        # Create a new local did sov. With the bootstrap cache, from the seed of the DID
+        # registered by an earlier run of this agent, so it doesn't need registering again
+        cache_key = self.bootstrap_cache_key(self.ident)
+        cached = bootstrap_cache.get_did(self.genesis_data, cache_key)
+        create_data = {}
+        if bootstrap_cache.enabled:
+            create_data["seed"] = cached["seed"] if cached else token_hex(16)
+        (resp_status, resp_text) = await self.admin_POST(
+            "/wallet/did/create",
+            create_data,
+        )
+        if resp_status != 200 and create_data:
+            # the agent doesn't take seeds (e.g. without --wallet-allow-insecure-seed)
+            create_data = {}
             (resp_status, resp_text) = await self.admin_POST(
                 "/wallet/did/create",
-                {},
+                create_data,
             )
+        
+        if resp_status == 200:
+            resp_json = parse_json(resp_text)
+            did = resp_json["result"]["did"]
+            verkey = resp_json["result"]["verkey"]
             
-            if resp_status == 200:
-                resp_json = json.loads(resp_text)
-                did = resp_json["result"]["did"]
-                verkey = resp_json["result"]["verkey"]
-                
-            log_msg(f"Got DID: {resp_json["result"]["did"]}")
-            
+        log_msg(f"Got DID: {resp_json["result"]["did"]}")
+        
+        if cached and cached["did"] == did and await self.is_did_on_ledger(did, verkey):
+            log_msg(f"DID {did} is already on the ledger")
+        else:
             # Register the DID as an endorser
             ledger_url = get_ledger_url()
             data = {"did": did, "verkey": verkey, "role": "ENDORSER"}
@@ -1577,240 +1632,287 @@ class AcaPyAgentBackchannel(AgentBackchannel):
             ) as resp:
                 if resp.status != 200:
                     raise Exception(f"Error registering DID, response code {resp.status}")
-            
-            # Set as public did
-            (resp_status, resp_text) = await self.admin_POST(
-                agent_operation,
-                {},
-                params={"did": did},
-            )
-            self.did = did
+            if create_data:
+                bootstrap_cache.put_did(
+                    self.genesis_data,
+                    cache_key,
+                    {
+                        "did": did,
+                        "verkey": verkey,
+                        "seed": create_data["seed"],
+                        "role": "ENDORSER",
+                    },
+                )
+        
+        # Set as public did
+        (resp_status, resp_text) = await self.admin_POST(
+            agent_operation,
+            {},
+            params={"did": did},
+        )
+        self.did = did
 
-            (resp_status, resp_text) = await self.admin_GET(agent_operation)
-            if resp_status != 200:
-                return (resp_status, resp_text)
+        (resp_status, resp_text) = await self.admin_GET(agent_operation)
+        if resp_status != 200:
+            return (resp_status, resp_text)
 
-            resp_json = json.loads(resp_text)
-            did = resp_json["result"]
+        resp_json = parse_json(resp_text)
+        did = resp_json["result"]
 
-            resp_text = json.dumps(did)
-            return (resp_status, resp_text)
+        resp_text = JsonText.from_data(did)
+        return (resp_status, resp_text)
 
-        elif command.topic == "active-connection" and record_id:
-            agent_operation = f"/connections?their_did={record_id}"
+    async def is_did_on_ledger(self, did: str, verkey: str) -> bool:
+        """Is the DID on the ledger with this verkey (a ledger read, cheaper than a write)"""
+        (resp_status, resp_text) = await self.admin_GET(
+            "/ledger/did-verkey", params={"did": did}
+        )
+        return resp_status == 200 and parse_json(resp_text).get("verkey") == verkey
 
-            (resp_status, resp_text) = await self.admin_GET(agent_operation)
-            if resp_status != 200:
-                return (resp_status, resp_text)
+    @command_handler("GET", "active-connection")
+    async def handle_active_connection_GET(self, command: BackchannelCommand):
+        record_id = command.record_id
 
-            # find the first active connection
-            resp_json = json.loads(resp_text)
-            for connection in resp_json["results"]:
-                if connection["state"] == "active":
-                    resp_text = json.dumps(connection)
-                    return (resp_status, resp_text)
+        if not record_id:
+            return (501, "501: Not Implemented\n\n")
 
-            return (400, f"Active connection not found for their_did {record_id}")
+        agent_operation = f"/connections?their_did={record_id}"
 
-        elif command.topic == "schema":
-            schema_id = record_id
-            if self.use_anoncreds(command):
-                agent_operation = f"/anoncreds/schema/{schema_id}"
-            else:
-                agent_operation = f"/schemas/{schema_id}"
+        (resp_status, resp_text) = await self.admin_GET(agent_operation)
+        if resp_status != 200:
+            return (resp_status, resp_text)
 
-            (resp_status, resp_text) = await self.admin_GET(agent_operation)
-            if resp_status != 200:
+        # find the first active connection
+        resp_json = parse_json(resp_text)
+        for connection in resp_json["results"]:
+            if connection["state"] == "active":
+                resp_text = JsonText.from_data(connection)
                 return (resp_status, resp_text)
 
-            resp_json = json.loads(resp_text)
-            schema = resp_json["schema"]
+        return (400, f"Active connection not found for their_did {record_id}")
 
-            # If anoncreds, add the id to the schema to use existing framework
-            if self.use_anoncreds(command):
-                schema["id"] = resp_json["schema_id"]
+    @command_handler("GET", "schema")
+    async def handle_schema_GET(self, command: BackchannelCommand):
+        record_id = command.record_id
+
+        schema_id = record_id
+        if self.use_anoncreds(command):
+            agent_operation = f"/anoncreds/schema/{schema_id}"
+        else:
+            agent_operation = f"/schemas/{schema_id}"
 
-            resp_text = json.dumps(schema)
+        (resp_status, resp_text) = await self.admin_GET(agent_operation)
+        if resp_status != 200:
             return (resp_status, resp_text)
 
-        elif command.topic == "credential-definition":
-            cred_def_id = record_id
+        resp_json = parse_json(resp_text)
+        schema = resp_json["schema"]
 
-            if self.use_anoncreds(command):
-                agent_operation = f"/anoncreds/credential-definition/{cred_def_id}"
-            else:
-                agent_operation = f"/credential-definitions/{cred_def_id}"
+        # If anoncreds, add the id to the schema to use existing framework
+        if self.use_anoncreds(command):
+            schema["id"] = resp_json["schema_id"]
 
-            (resp_status, resp_text) = await self.admin_GET(agent_operation)
-            if resp_status != 200:
-                return (resp_status, resp_text)
+        resp_text = JsonText.from_data(schema)
+        return (resp_status, resp_text)
 
-            resp_json = json.loads(resp_text)
-            credential_definition = resp_json["credential_definition"]
+    @command_handler("GET", "credential-definition")
+    async def handle_credential_definition_GET(self, command: BackchannelCommand):
+        record_id = command.record_id
 
-            # If anoncreds, add the id to the credential definition to use existing framework
-            if self.use_anoncreds(command):
-                credential_definition["id"] = resp_json["credential_definition_id"]
+        cred_def_id = record_id
 
-            resp_text = json.dumps(credential_definition)
+        if self.use_anoncreds(command):
+            agent_operation = f"/anoncreds/credential-definition/{cred_def_id}"
+        else:
+            agent_operation = f"/credential-definitions/{cred_def_id}"
+
+        (resp_status, resp_text) = await self.admin_GET(agent_operation)
+        if resp_status != 200:
             return (resp_status, resp_text)
 
-        elif command.topic == "issue-credential":
-            # swap thread id for cred ex id from the webhook
-            cred_ex_id = await self.swap_thread_id_for_exchange_id(
-                record_id, "credential-msg", "credential_exchange_id"
-            )
-            agent_operation = (
-                self.TopicTranslationDict[command.topic] + "records/" + cred_ex_id
-            )
+        resp_json = parse_json(resp_text)
+        credential_definition = resp_json["credential_definition"]
 
-            (resp_status, resp_text) = await self.admin_GET(agent_operation)
-            if resp_status == 200:
-                resp_text = self.agent_state_translation(command.topic, resp_text)
-            return (resp_status, resp_text)
+        # If anoncreds, add the id to the credential definition to use existing framework
+        if self.use_anoncreds(command):
+            credential_definition["id"] = resp_json["credential_definition_id"]
 
-        elif command.topic == "issue-credential-v2":
-            # swap thread id for cred ex id from the webhook
-            cred_ex_id = await self.swap_thread_id_for_exchange_id(
-                record_id, "credential-msg", "cred_ex_id"
-            )
-            agent_operation = (
-                self.TopicTranslationDict[command.topic] + "records/" + cred_ex_id
-            )
+        resp_text = JsonText.from_data(credential_definition)
+        return (resp_status, resp_text)
 
-            (resp_status, resp_text) = await self.admin_GET(agent_operation)
-            resp_text = self.move_field_to_top_level(resp_text, "state")
-            return (resp_status, resp_text)
+    @command_handler("GET", "issue-credential")
+    async def handle_issue_credential_GET(self, command: BackchannelCommand):
+        record_id = command.record_id
 
-        elif command.topic == "credential":
-            operation = command.operation
-            if operation == "revoked":
-                agent_operation = f"/credential/{operation}/{record_id}"
-                (resp_status, resp_text) = await self.admin_GET(agent_operation)
-                return (resp_status, resp_text)
-            else:
-                # NOTE: We don't know what type of credential to fetch, so we first try an indy credential.
-                # Maybe it would be nice if the test harness passed the credential format that belonged to the
-                # credential
-                # First try indy credential
-                agent_operation = f"/credential/{record_id}"
-                (resp_status, resp_text) = await self.admin_GET(agent_operation)
+        # swap thread id for cred ex id from the webhook
+        cred_ex_id = await self.swap_thread_id_for_exchange_id(
+            record_id, "credential-msg", "credential_exchange_id"
+        )
+        agent_operation = (
+            self.TopicTranslationDict[command.topic] + "records/" + cred_ex_id
+        )
 
-                # If not found try w3c credential
-                if resp_status == 404:
-                    agent_operation = f"/credential/w3c/{record_id}"
-                    (resp_status, resp_text) = await self.admin_GET(agent_operation)
+        (resp_status, resp_text) = await self.admin_GET(agent_operation)
+        if resp_status == 200:
+            resp_text = self.agent_state_translation(command.topic, resp_text)
+        return (resp_status, resp_text)
 
-                    if resp_status == 200:
-                        resp_json = json.loads(resp_text)
-                        return (
-                            resp_status,
-                            json.dumps(
-                                {
-                                    "credential_id": resp_json["record_id"],
-                                    "credential": resp_json["cred_value"],
-                                }
-                            ),
-                        )
+    @command_handler("GET", "issue-credential-v2")
+    async def handle_issue_credential_v2_GET(self, command: BackchannelCommand):
+        record_id = command.record_id
 
-                return (resp_status, resp_text)
+        # swap thread id for cred ex id from the webhook
+        cred_ex_id = await self.swap_thread_id_for_exchange_id(
+            record_id, "credential-msg", "cred_ex_id"
+        )
+        agent_operation = (
+            self.TopicTranslationDict[command.topic] + "records/" + cred_ex_id
+        )
 
-        elif command.topic == "proof":
-            # swap thread id for pres ex id from the webhook
-            pres_ex_id = await self.swap_thread_id_for_exchange_id(
-                record_id, "presentation-msg", "presentation_exchange_id"
-            )
-            agent_operation = f"/present-proof/records/{pres_ex_id}"
+        (resp_status, resp_text) = await self.admin_GET(agent_operation)
+        resp_text = self.move_field_to_top_level(resp_text, "state")
+        return (resp_status, resp_text)
+
+    @command_handler("GET", "credential")
+    async def handle_credential_GET(self, command: BackchannelCommand):
+        record_id = command.record_id
 
+        operation = command.operation
+        if operation == "revoked":
+            agent_operation = f"/credential/{operation}/{record_id}"
             (resp_status, resp_text) = await self.admin_GET(agent_operation)
-            if resp_status == 200:
-                resp_text = self.agent_state_translation(command.topic, resp_text)
             return (resp_status, resp_text)
+        else:
+            # NOTE: We don't know what type of credential to fetch, so we first try an indy credential.
+            # Maybe it would be nice if the test harness passed the credential format that belonged to the
+            # credential
+            # First try indy credential
+            agent_operation = f"/credential/{record_id}"
+            (resp_status, resp_text) = await self.admin_GET(agent_operation)
 
-        elif command.topic == "proof-v2":
-            # swap thread id for pres ex id from the webhook
-            pres_ex_id = await self.swap_thread_id_for_exchange_id(
-                record_id, "presentation-msg", "pres_ex_id"
-            )
-            agent_operation = (
-                self.TopicTranslationDict[command.topic] + "records/" + pres_ex_id
-            )
+            # If not found try w3c credential
+            if resp_status == 404:
+                agent_operation = f"/credential/w3c/{record_id}"
+                (resp_status, resp_text) = await self.admin_GET(agent_operation)
+
+                if resp_status == 200:
+                    resp_json = parse_json(resp_text)
+                    return (
+                        resp_status,
+                        JsonText.from_data(
+                            {
+                                "credential_id": resp_json["record_id"],
+                                "credential": resp_json["cred_value"],
+                            }
+                        ),
+                    )
 
-            (resp_status, resp_text) = await self.admin_GET(agent_operation)
             return (resp_status, resp_text)
 
-        elif command.topic == "revocation":
-            operation = command.operation
-            (
-                agent_operation,
-                admin_data,
-            ) = await self.get_agent_operation_acapy_version_based(command)
+    @command_handler("GET", "proof")
+    async def handle_proof_GET(self, command: BackchannelCommand):
+        record_id = command.record_id
 
-            (resp_status, resp_text) = await self.admin_GET(agent_operation)
-            return (resp_status, resp_text)
+        # swap thread id for pres ex id from the webhook
+        pres_ex_id = await self.swap_thread_id_for_exchange_id(
+            record_id, "presentation-msg", "presentation_exchange_id"
+        )
+        agent_operation = f"/present-proof/records/{pres_ex_id}"
 
-        elif command.topic == "did-exchange":
+        (resp_status, resp_text) = await self.admin_GET(agent_operation)
+        if resp_status == 200:
+            resp_text = self.agent_state_translation(command.topic, resp_text)
+        return (resp_status, resp_text)
 
-            connection_id = record_id
-            agent_operation = f"/connections/{connection_id}"
+    @command_handler("GET", "proof-v2")
+    async def handle_proof_v2_GET(self, command: BackchannelCommand):
+        record_id = command.record_id
 
-            (resp_status, resp_text) = await self.admin_GET(agent_operation)
-            if resp_status == 200:
-                resp_text = self.agent_state_translation(command.topic, resp_text)
-            return (resp_status, resp_text)
+        # swap thread id for pres ex id from the webhook
+        pres_ex_id = await self.swap_thread_id_for_exchange_id(
+            record_id, "presentation-msg", "pres_ex_id"
+        )
+        agent_operation = (
+            self.TopicTranslationDict[command.topic] + "records/" + pres_ex_id
+        )
 
-        return (501, "501: Not Implemented\n\n")
+        (resp_status, resp_text) = await self.admin_GET(agent_operation)
+        return (resp_status, resp_text)
 
-    async def make_agent_DELETE_request(
-        self, command: BackchannelCommand
-    ) -> Tuple[int, str]:
+    @command_handler("GET", "revocation")
+    async def handle_revocation_GET(self, command: BackchannelCommand):
+        operation = command.operation
+        (
+            agent_operation,
+            admin_data,
+        ) = await self.get_agent_operation_acapy_version_based(command)
+
+        (resp_status, resp_text) = await self.admin_GET(agent_operation)
+        return (resp_status, resp_text)
+
+    @command_handler("GET", "did-exchange")
+    async def handle_did_exchange_GET(self, command: BackchannelCommand):
         record_id = command.record_id
 
-        if command.topic == "credential" and record_id:
-            agent_operation = f"/credential/{record_id}"
-            log_msg(agent_operation)
+        connection_id = record_id
+        agent_operation = f"/connections/{connection_id}"
 
-            (resp_status, resp_text) = await self.admin_DELETE(agent_operation)
-            if resp_status == 200:
-                resp_text = self.agent_state_translation(command.topic, resp_text)
-            return (resp_status, resp_text)
+        (resp_status, resp_text) = await self.admin_GET(agent_operation)
+        if resp_status == 200:
+            resp_text = self.agent_state_translation(command.topic, resp_text)
+        return (resp_status, resp_text)
 
-        return (501, "501: Not Implemented\n\n")
+    @command_handler("DELETE", "credential")
+    async def handle_credential_DELETE(self, command: BackchannelCommand):
+        record_id = command.record_id
 
-    async def make_agent_GET_request_response(
-        self, command: BackchannelCommand, message_name: Optional[str] = None
-    ) -> Tuple[int, str]:
-        topic = command.topic
+        if not record_id:
+            return (501, "501: Not Implemented\n\n")
+
+        agent_operation = f"/credential/{record_id}"
+        log_msg(agent_operation)
+
+        (resp_status, resp_text) = await self.admin_DELETE(agent_operation)
+        if resp_status == 200:
+            resp_text = self.agent_state_translation(command.topic, resp_text)
+        return (resp_status, resp_text)
+
+    @command_handler("RESPONSE", "connection")
+    async def handle_connection_RESPONSE(self, command: BackchannelCommand):
         record_id = command.record_id
 
-        if topic == "connection" and record_id:
-            connection_msg = pop_resource(record_id, "connection-msg")
-            i = 0
-            while connection_msg is None and i < MAX_TIMEOUT:
-                await asyncio.sleep(1)
-                connection_msg = pop_resource(record_id, "connection-msg")
-                i = i + 1
+        if not record_id:
+            return (501, "501: Not Implemented\n\n")
 
-            resp_status = 200
-            if connection_msg:
-                resp_text = json.dumps(connection_msg)
-            else:
-                resp_text = "{}"
+        connection_msg = await wait_pop_resource(
+            record_id, "connection-msg", MAX_TIMEOUT
+        )
 
-            return (resp_status, resp_text)
+        resp_status = 200
+        if connection_msg:
+            resp_text = JsonText.from_data(connection_msg)
+        else:
+            resp_text = "{}"
 
-        if topic == "did-exchange" and record_id:
-            didexchange_msg = pop_resource(record_id, "didexchange-msg")
-            i = 0
-            while didexchange_msg is None and i < MAX_TIMEOUT:
-                await asyncio.sleep(1)
-                didexchange_msg = pop_resource(record_id, "didexchange-msg")
-                i = i + 1
+        return (resp_status, resp_text)
+
+    @command_handler("RESPONSE", "did-exchange")
+    async def handle_did_exchange_RESPONSE(
+        self, command: BackchannelCommand, message_name: Optional[str] = None
+    ):
+        topic = command.topic
+        record_id = command.record_id
+
+        if record_id:
+            didexchange_msg = await wait_pop_resource(
+                record_id, "didexchange-msg", MAX_TIMEOUT
+            )
 
             resp_status = 200
             if didexchange_msg:
-                resp_text = json.dumps(didexchange_msg)
-                resp_text = self.agent_state_translation(topic, resp_text)
+                resp_text = JsonText.from_data(
+                    self.translate_agent_state(topic, didexchange_msg)
+                )
             else:
                 resp_text = "{}"
 
@@ -1818,134 +1920,129 @@ class AcaPyAgentBackchannel(AgentBackchannel):
 
         # Poping webhook messages wihtout an id is unusual. This code may be removed when issue 944 is fixed
         # see https://app.zenhub.com/workspaces/von---verifiable-organization-network-5adf53987ccbaa70597dbec0/issues/hyperledger/aries-cloudagent-python/944
-        if topic == "did-exchange" and record_id is None:
-            await asyncio.sleep(1)
-            if message_name is not None:
-                didexchange_msg = pop_resource_latest(message_name)
-            else:
-                didexchange_msg = pop_resource_latest("connection-msg")
-            i = 0
-            while didexchange_msg is None and i < MAX_TIMEOUT:
-                await asyncio.sleep(1)
-                didexchange_msg = pop_resource_latest("connection-msg")
-                i = i + 1
+        await asyncio.sleep(1)
+        if message_name is not None:
+            didexchange_msg = pop_resource_latest(message_name)
+        else:
+            didexchange_msg = pop_resource_latest("connection-msg")
+        if didexchange_msg is None:
+            didexchange_msg = await wait_pop_resource_latest(
+                "connection-msg", MAX_TIMEOUT
+            )
 
-            resp_status = 200
-            if didexchange_msg:
-                resp_text = json.dumps(didexchange_msg)
-                resp_text = self.agent_state_translation(topic, resp_text)
-            else:
-                resp_text = "{}"
+        resp_status = 200
+        if didexchange_msg:
+            resp_text = JsonText.from_data(
+                self.translate_agent_state(topic, didexchange_msg)
+            )
+        else:
+            resp_text = "{}"
 
-            return (resp_status, resp_text)
+        return (resp_status, resp_text)
 
-        elif topic == "issue-credential" and record_id:
-            credential_msg = pop_resource(record_id, "credential-msg")
-            i = 0
-            while credential_msg is None and i < MAX_TIMEOUT:
-                await asyncio.sleep(1)
-                credential_msg = pop_resource(record_id, "credential-msg")
-                i = i + 1
+    @command_handler("RESPONSE", "issue-credential")
+    async def handle_issue_credential_RESPONSE(self, command: BackchannelCommand):
+        record_id = command.record_id
 
-            resp_status = 200
-            if credential_msg:
-                resp_text = json.dumps(credential_msg)
-            else:
-                resp_text = "{}"
+        if not record_id:
+            return (501, "501: Not Implemented\n\n")
 
-            return (resp_status, resp_text)
+        credential_msg = await wait_pop_resource(
+            record_id, "credential-msg", MAX_TIMEOUT
+        )
 
-        elif topic == "credential" and record_id:
-            credential_msg = pop_resource(record_id, "credential-msg")
-            i = 0
-            while credential_msg is None and i < MAX_TIMEOUT:
-                await asyncio.sleep(1)
-                credential_msg = pop_resource(record_id, "credential-msg")
-                i = i + 1
+        resp_status = 200
+        if credential_msg:
+            resp_text = JsonText.from_data(credential_msg)
+        else:
+            resp_text = "{}"
 
-            resp_status = 200
-            if credential_msg:
-                resp_text = json.dumps(credential_msg)
-            else:
-                resp_text = "{}"
+        return (resp_status, resp_text)
 
-            return (resp_status, resp_text)
+    @command_handler("RESPONSE", "credential")
+    async def handle_credential_RESPONSE(self, command: BackchannelCommand):
+        record_id = command.record_id
 
-        elif topic == "proof" and record_id:
-            presentation_msg = pop_resource(record_id, "presentation-msg")
-            i = 0
-            while presentation_msg is None and i < MAX_TIMEOUT:
-                await asyncio.sleep(1)
-                presentation_msg = pop_resource(record_id, "presentation-msg")
-                i = i + 1
+        if not record_id:
+            return (501, "501: Not Implemented\n\n")
 
-            resp_status = 200
-            if presentation_msg:
-                resp_text = json.dumps(presentation_msg)
-                if resp_status == 200:
-                    resp_text = self.agent_state_translation(topic, resp_text)
-            else:
-                resp_text = "{}"
+        credential_msg = await wait_pop_resource(
+            record_id, "credential-msg", MAX_TIMEOUT
+        )
 
-            return (resp_status, resp_text)
+        resp_status = 200
+        if credential_msg:
+            resp_text = JsonText.from_data(credential_msg)
+        else:
+            resp_text = "{}"
 
-        elif topic == "revocation-registry" and record_id:
-            revocation_msg = pop_resource(record_id, "revocation-registry-msg")
-            i = 0
-            while revocation_msg is None and i < MAX_TIMEOUT:
-                await asyncio.sleep(1)
-                revocation_msg = pop_resource(record_id, "revocation-registry-msg")
-                i = i + 1
+        return (resp_status, resp_text)
 
-            resp_status = 200
-            if revocation_msg:
-                resp_text = json.dumps(revocation_msg)
-            else:
-                resp_text = "{}"
+    @command_handler("RESPONSE", "proof")
+    async def handle_proof_RESPONSE(self, command: BackchannelCommand):
+        topic = command.topic
+        record_id = command.record_id
 
-            return (resp_status, resp_text)
+        if not record_id:
+            return (501, "501: Not Implemented\n\n")
+
+        presentation_msg = await wait_pop_resource(
+            record_id, "presentation-msg", MAX_TIMEOUT
+        )
 
-        elif topic == "revocation-notification" and record_id:
-            revocation_notification = pop_resource(
-                record_id, "revocation-notification-msg"
+        resp_status = 200
+        if presentation_msg:
+            resp_text = JsonText.from_data(
+                self.translate_agent_state(topic, presentation_msg)
             )
-            i = 0
-            while revocation_notification is None and i < MAX_TIMEOUT:
-                await asyncio.sleep(1)
-                revocation_notification = pop_resource(
-                    record_id, "revocation-notification-msg"
-                )
-                i = i + 1
+        else:
+            resp_text = "{}"
 
-            # Not sure why the status is 200 even if not found? That's quite confusing
-            resp_status = 200
-            if revocation_notification:
-                resp_text = json.dumps(revocation_notification)
-            else:
-                resp_text = "{}"
+        return (resp_status, resp_text)
 
-            return (resp_status, resp_text)
+    @command_handler("RESPONSE", "revocation-registry")
+    async def handle_revocation_registry_RESPONSE(self, command: BackchannelCommand):
+        record_id = command.record_id
 
-        return (501, "501: Not Implemented\n\n")
+        if not record_id:
+            return (501, "501: Not Implemented\n\n")
 
-    def _process(
-        self, args: List[str], env: Dict[str, str], loop: asyncio.AbstractEventLoop
-    ):
-        proc = subprocess.Popen(args, env=env, encoding="utf-8", preexec_fn=os.setsid)
-        stdout = loop.run_in_executor(
-            None,
-            output_reader,
-            proc.stdout,
-            functools.partial(self.handle_output, source="stdout"),
+        revocation_msg = await wait_pop_resource(
+            record_id, "revocation-registry-msg", MAX_TIMEOUT
         )
-        stderr = loop.run_in_executor(
-            None,
-            output_reader,
-            proc.stderr,
-            functools.partial(self.handle_output, source="stderr"),
+
+        resp_status = 200
+        if revocation_msg:
+            resp_text = JsonText.from_data(revocation_msg)
+        else:
+            resp_text = "{}"
+
+        return (resp_status, resp_text)
+
+    @command_handler("RESPONSE", "revocation-notification")
+    async def handle_revocation_notification_RESPONSE(self, command: BackchannelCommand):
+        record_id = command.record_id
+
+        if not record_id:
+            return (501, "501: Not Implemented\n\n")
+
+        revocation_notification = await wait_pop_resource(
+            record_id, "revocation-notification-msg", MAX_TIMEOUT
+        )
+
+        # Not sure why the status is 200 even if not found? That's quite confusing
+        resp_status = 200
+        if revocation_notification:
+            resp_text = JsonText.from_data(revocation_notification)
+        else:
+            resp_text = "{}"
+
+        return (resp_status, resp_text)
+
+    async def _process(self, args: List[str], env: Dict[str, str]) -> AgentProcess:
+        return await AgentProcess.start(
+            args, env, self.handle_output, self.agent_log, new_session=True
         )
-        self.output_handler_futures = [stdout, stderr]
-        return proc
 
     def get_process_args(self, bin_path: Optional[str] = None) -> List[str]:
         # TODO aca-py needs to be in the path so no need to give it a cmd_path
@@ -1966,21 +2063,27 @@ class AcaPyAgentBackchannel(AgentBackchannel):
         async def fetch_swagger(url: str, timeout: float):
             text = None
             start = default_timer()
-            # add a short delay on startup in case the agent takes some time to initialize
-            await asyncio.sleep(0.5)
-            async with ClientSession(timeout=ClientTimeout(total=3.0)) as session:
-                while default_timer() - start < timeout:
-                    try:
-                        async with session.get(url) as resp:
-                            # a bit of debugging for startup issues
-                            c_time = current_time()
-                            print(f">>> {c_time}: {url} -> {resp.status}")
-                            if resp.status == 200:
-                                text = await resp.text()
-                                break
-                    except (ClientError, asyncio.TimeoutError):
-                        pass
-                    await asyncio.sleep(0.5)
+            # The admin port refuses connections until the agent is up, which is cheap to
+            # check: retry quickly at first, backing off to every 0.5s
+            delay = 0.05
+            while default_timer() - start < timeout:
+                if self.proc and self.proc.poll() is not None:
+                    # the agent process exited, it is not coming up
+                    break
+                try:
+                    async with self.client_session.get(
+                        url, timeout=ClientTimeout(total=3.0)
+                    ) as resp:
+                        # a bit of debugging for startup issues
+                        c_time = current_time()
+                        print(f">>> {c_time}: {url} -> {resp.status}")
+                        if resp.status == 200:
+                            text = await resp.text()
+                            break
+                except (ClientError, asyncio.TimeoutError):
+                    pass
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.5)
             return text
 
         status_url = self.admin_url + "/status"
@@ -2012,12 +2115,9 @@ class AcaPyAgentBackchannel(AgentBackchannel):
                 f"Unexpected response from agent process. Admin URL: {status_url}"
             )
 
-    async def start_process_with_extra_args(
-        self, *, args: List[str] = [], bin_path: Optional[str] = None, wait: bool = True
-    ):
-        my_env = os.environ.copy()
-        my_env["PYTHONPATH"] = DEFAULT_PYTHON_PATH
-
+    def get_process_args_with_extra_args(
+        self, args: List[str], bin_path: Optional[str] = None
+    ) -> List[str]:
         agent_args = self.get_process_args(bin_path)
         # If args contains items that are in agent_args, remove them from agent_args
         # This is to avoid duplicate arguments, and respects the ones that were passed in.
@@ -2031,7 +2131,27 @@ class AcaPyAgentBackchannel(AgentBackchannel):
                 # remove all items after the key until the next key that starts with '--'
                 while index < len(agent_args) and not agent_args[index].startswith('--'):
                     del agent_args[index]
-        agent_args = agent_args + args
+        return agent_args + args
+
+    @staticmethod
+    def hash_process_args(agent_args: List[str]) -> str:
+        return hashlib.sha256("\0".join(agent_args).encode("utf8")).hexdigest()
+
+    def is_running_with_args(self, agent_args: List[str]) -> bool:
+        """Is the agent process running, started with exactly these arguments"""
+        return (
+            self.proc is not None
+            and self.proc.poll() is None
+            and self.proc_args_hash == self.hash_process_args(agent_args)
+        )
+
+    async def start_process_with_extra_args(
+        self, *, args: List[str] = [], bin_path: Optional[str] = None, wait: bool = True
+    ):
+        my_env = os.environ.copy()
+        my_env["PYTHONPATH"] = DEFAULT_PYTHON_PATH
+
+        agent_args = self.get_process_args_with_extra_args(args, bin_path)
 
         # start agent sub-process
         self.log("Starting agent sub-process ...")
@@ -2039,12 +2159,9 @@ class AcaPyAgentBackchannel(AgentBackchannel):
         self.log(agent_args)
         self.log("and environment:")
         self.log(my_env)
-        loop = asyncio.get_event_loop()
-        self.proc = await loop.run_in_executor(
-            None, self._process, agent_args, my_env, loop
-        )
+        self.proc = await self._process(agent_args, my_env)
+        self.proc_args_hash = self.hash_process_args(agent_args)
         if wait:
-            await asyncio.sleep(1.0)
             await self.detect_process()
 
     async def start_process(
@@ -2065,38 +2182,16 @@ class AcaPyAgentBackchannel(AgentBackchannel):
         self.log(f"{c_time}: Starting agent sub-process ...")
         self.log("agent starting with params: ")
         self.log(agent_args)
-        loop = asyncio.get_event_loop()
-        self.proc = await loop.run_in_executor(
-            None, self._process, agent_args, my_env, loop
-        )
+        self.proc = await self._process(agent_args, my_env)
+        self.proc_args_hash = self.hash_process_args(agent_args)
         if wait:
-            await asyncio.sleep(1.0)
             await self.detect_process()
 
-    def _terminate(self):
-        if self.proc and self.proc.poll() is None:
-            # proc.terminate by itself won't kill the servers, this does
-            os.killpg(os.getpgid(self.proc.pid), signal.SIGTERM)
-            self.proc.terminate()
-            try:
-                self.proc.wait(timeout=0.5)
-                self.log(f"Exited with return code {self.proc.returncode}")
-            except subprocess.TimeoutExpired:
-                msg = "Process did not terminate in time"
-                self.log(msg)
-                raise Exception(msg)
-
     async def kill_agent(self, loop: Optional[asyncio.AbstractEventLoop] = None):
-        if loop is None:
-            loop = asyncio.get_event_loop()
-
-        if self.proc:
-            await loop.run_in_executor(None, self._terminate)
-
-        for fut in self.output_handler_futures:
-            fut.cancel()
-
-        self.output_handler_futures = []
+        if self.proc and self.proc.returncode is None:
+            await self.proc.terminate(process_group=True)
+            self.log(f"Exited with return code {self.proc.returncode}")
+        self.proc_args_hash = None
 
     async def terminate(self):
         await self.kill_agent()
@@ -2303,60 +2398,45 @@ class AcaPyAgentBackchannel(AgentBackchannel):
         #
         # Present Proof Protocol:
         # Tests/RFC         |   Aca-py
-
-        def replace_state_values(data: str, *, old_state: str, new_state: str):
-            return data.replace(f'"state": "{old_state}"', f'"state": "{new_state}"')
-
-        resp_json = json.loads(data)
-        # Check to see if state is in the json
-        if "state" in resp_json:
-            agent_state = resp_json["state"]
-
-            # Check the their_role property in the data and set the calling method to swap states to the correct role for DID Exchange
-            if "their_role" in data:
-                if "invitee" in data:
-                    de_state_trans_method = (
-                        self.didExchangeResponderStateTranslationDict
-                    )
-                elif "inviter" in data:
-                    de_state_trans_method = (
-                        self.didExchangeRequesterStateTranslationDict
-                    )
-            else:
-                # make the trans method any one, since it doesn't matter. It's probably Out of Band.
-                de_state_trans_method = self.didExchangeResponderStateTranslationDict
-
-            if topic == "connection":
-                # if the response contains didexchange/1.0, swap out the connection states for the did exchange states
-                # if "didexchange/1.0" in resp_json["connection_protocol"]:
-                if "didexchange/1.0" in data or "didexchange/1.1" in data:
-                    data = replace_state_values(
-                        data,
-                        old_state=agent_state,
-                        new_state=de_state_trans_method[agent_state],
-                    )
-                else:
-                    data = data.replace(
-                        agent_state, self.connectionStateTranslationDict[agent_state]
-                    )
-            elif topic == "issue-credential":
-                data = data.replace(
-                    agent_state, self.issueCredentialStateTranslationDict[agent_state]
-                )
-            elif topic == "proof":
-                data = replace_state_values(
-                    data,
-                    old_state=agent_state,
-                    new_state=self.presentProofStateTranslationDict[agent_state],
-                )
-            elif topic == "out-of-band" or topic == "did-exchange":
-                data = replace_state_values(
-                    data,
-                    old_state=agent_state,
-                    new_state=de_state_trans_method[agent_state],
-                )
+        #
+        # Prefer translate_agent_state() when the response is already parsed.
+        resp_json = parse_json(data)
+        if isinstance(resp_json, dict):
+            agent_state = resp_json.get("state")
+            self.translate_agent_state(topic, resp_json)
+            if resp_json.get("state") != agent_state:
+                data = JsonText.from_data(resp_json)
         return data
 
+    def agent_state_map(
+        self, topic: str, record: Mapping[str, Any]
+    ) -> Optional[Mapping[str, str]]:
+        # the connection record is either the response itself or wrapped in it
+        connection = record.get("connection")
+        if not isinstance(connection, dict):
+            connection = record
+
+        # connections made with DID Exchange report the DID Exchange states
+        if topic == "connection" and str(
+            connection.get("connection_protocol", "")
+        ).startswith("didexchange/"):
+            topic = "did-exchange"
+        elif topic == "out-of-band":
+            topic = "did-exchange"
+
+        their_role = connection.get("their_role") if topic == "did-exchange" else None
+        return self.stateTranslationMaps.get(
+            (topic, their_role)
+        ) or self.stateTranslationMaps.get((topic, None))
+
+    def translate_agent_state(self, topic: str, record: Any) -> Any:
+        """Translate the state of a parsed response in place, see agent_state_translation()"""
+        if isinstance(record, dict) and "state" in record:
+            state_map = self.agent_state_map(topic, record)
+            if state_map is not None:
+                translate_state(record, state_map)
+        return record
+
     async def get_agent_operation_acapy_version_based(
         self, command: BackchannelCommand
     ) -> Tuple[str, Optional[Mapping[str, Any]]]:
@@ -2448,7 +2528,7 @@ async def main(start_port: int, show_timing: bool = False, interactive: bool = T
         extra_args = json.loads(EXTRA_ARGS)
 
     genesis = await default_genesis_txns()
-    if not genesis:
+    if genesis is None:
         print("Error retrieving ledger genesis transactions")
         sys.exit(1)
 
@@ -0,0 +1,119 @@
+"""
+ACA-Py plugin writing to the in-memory ledger stand-in service (services/ledger-stand-in).
+
+Loaded with `--no-ledger --plugin acapy.ledger_stand_in`, the agent gets back the Indy VDR
+ledger (and so the legacy Indy anoncreds registry and the did:sov resolver) with a pool
+that posts each signed request to the stand-in's /submit instead of sending it to the Indy
+nodes. The stand-in URL is the `ledger_stand_in.url` plugin config value, or LEDGER_URL.
+"""
+import json
+import logging
+import os
+
+from acapy_agent.cache.base import BaseCache
+from acapy_agent.config.injection_context import InjectionContext
+from acapy_agent.config.provider import ClassProvider
+from acapy_agent.core.profile import Profile
+from acapy_agent.indy.verifier import IndyVerifier
+from acapy_agent.ledger.base import BaseLedger
+from acapy_agent.ledger.error import LedgerTransactionError
+from acapy_agent.ledger.indy_vdr import IndyVdrLedger
+from acapy_agent.resolver.did_resolver import DIDResolver
+from aiohttp import ClientError, ClientSession, ClientTimeout
+
+LOGGER = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT = 30
+
+
+def stand_in_genesis(url: str) -> str:
+    """What stands in for the genesis transactions: the stand-in's URL"""
+    return json.dumps({"ledger_stand_in": url})
+
+
+class StandInPoolHandle:
+    """Submits ledger requests to the stand-in, like the indy_vdr pool handle"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+
+    async def submit_request(self, request) -> dict:
+        try:
+            async with ClientSession(
+                timeout=ClientTimeout(total=REQUEST_TIMEOUT)
+            ) as session:
+                async with session.post(
+                    f"{self.url}/submit", data=request.body
+                ) as response:
+                    response.raise_for_status()
+                    reply = await response.json()
+        except (ClientError, ValueError) as err:
+            raise LedgerTransactionError(
+                f"Ledger stand-in request error: {err}"
+            ) from err
+
+        if reply.get("op") != "REPLY":
+            raise LedgerTransactionError(reply.get("reason") or json.dumps(reply))
+        return reply["result"]
+
+
+class StandInLedgerPool:
+    """The attributes of IndyVdrLedgerPool that IndyVdrLedger uses"""
+
+    def __init__(self, url: str, cache: BaseCache = None, read_only: bool = False):
+        self.name = "ledger-stand-in"
+        self.handle = StandInPoolHandle(url)
+        self.cache = cache
+        self.cache_duration = 600
+        self.taa_cache = None
+        self.read_only = read_only
+        self.genesis_txns = stand_in_genesis(url)
+
+    async def context_open(self):
+        pass
+
+    async def context_close(self):
+        pass
+
+
+async def setup(context: InjectionContext):
+    url = (context.settings.get("plugin_config") or {}).get("ledger_stand_in", {}).get(
+        "url"
+    ) or os.getenv("LEDGER_URL")
+    if not url:
+        raise ValueError("The ledger stand-in plugin needs ledger_stand_in.url")
+
+    pool = StandInLedgerPool(
+        url,
+        cache=context.inject_or(BaseCache),
+        read_only=bool(context.settings.get("ledger.read_only")),
+    )
+    # the profiles only bind a ledger when they have genesis transactions, and ACA-Py
+    # wants --no-ledger without them: the profile contexts inherit these bindings instead
+    context.injector.bind_provider(
+        BaseLedger, ClassProvider(IndyVdrLedger, pool, ClassProvider.Inject(Profile))
+    )
+    # the (askar wallet) tails uploads send the genesis transactions along, for the
+    # tails-server to check the registry on the ledger: the stand-in serves the tails
+    # files too. The profiles don't open a pool with them, the ledger being disabled
+    if not context.settings.get("ledger.genesis_transactions"):
+        context.settings["ledger.genesis_transactions"] = pool.genesis_txns
+
+    if context.settings.get("wallet.type", "askar") == "askar":
+        context.injector.bind_provider(
+            IndyVerifier,
+            ClassProvider(
+                "acapy_agent.indy.credx.verifier.IndyCredxVerifier",
+                ClassProvider.Inject(Profile),
+            ),
+        )
+
+    resolver = context.inject_or(DIDResolver)
+    if resolver and context.settings.get("ledger.disabled"):
+        indy_resolver = ClassProvider(
+            "acapy_agent.resolver.default.indy.IndyDIDResolver"
+        ).provide(context.settings, context.injector)
+        await indy_resolver.setup(context)
+        resolver.register_resolver(indy_resolver)
+
+    LOGGER.info("Ledger requests go to the ledger stand-in at %s", url)
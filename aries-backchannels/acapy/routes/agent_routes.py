@@ -42,7 +42,12 @@ async def get_mediation_record(request: web.Request):
         args = args + [f"--{flag}" for flag in parameters["flags"]]
 
 
+    # restarting with the arguments the agent is already running with (e.g. resetting
+    # an agent that was never started with custom parameters) would only cost a cold start
+    if backchannel.is_running_with_args(backchannel.get_process_args_with_extra_args(args)):
+        return web.json_response({"restarted": False})
+
     await backchannel.kill_agent()
     await backchannel.start_process_with_extra_args(args=args)
 
-    return web.json_response({})
+    return web.json_response({"restarted": True})
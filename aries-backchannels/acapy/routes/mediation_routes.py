@@ -1,8 +1,8 @@
 import asyncio
-import json
 from time import sleep
 from typing import Any, Dict, TYPE_CHECKING
 from aiohttp import web
+from python.json_text import parse_json
 
 if TYPE_CHECKING:
     from acapy.acapy_backchannel import AcaPyAgentBackchannel
@@ -47,7 +47,7 @@ async def get_mediation_record_by_connection_id(
         "/mediation/requests", params={"conn_id": connection_id}
     )
 
-    resp_json = json.loads(resp_text)
+    resp_json = parse_json(resp_text)
 
     if len(resp_json["results"]) == 0:
         raise web.HTTPNotFound(
@@ -89,7 +89,7 @@ async def mediation_send_request(request: web.Request):
     if resp_status != 201:
         return web.Response(text=resp_text, status=resp_status)
 
-    resp_json = json.loads(resp_text)
+    resp_json = parse_json(resp_text)
     return web.json_response(mediation_record_to_response(resp_json))
 
 
@@ -131,5 +131,5 @@ async def mediation_send_deny(request: web.Request):
     if resp_status != 201:
         return web.Response(text=resp_text, status=resp_status)
 
-    resp_json = json.loads(resp_text)
+    resp_json = parse_json(resp_text)
     return web.json_response(mediation_record_to_response(resp_json))
@@ -1,9 +1,7 @@
 import asyncio
-import functools
 import json
 import logging
 import os
-import subprocess
 from typing import Any, Dict, List, Mapping, Optional, Tuple
 from typing_extensions import Literal
 import uuid
@@ -26,14 +24,18 @@ from python.agent_backchannel import (
     START_TIMEOUT,
     BackchannelCommand,
     AgentPorts,
+    translate_state,
 )
-from python.utils import flatten, log_msg, output_reader, prompt_loop, pad_base64
+from python.agent_process import AgentProcess
+from python.utils import flatten, log_msg, prompt_loop, pad_base64
 from python.storage import (
     get_resource,
     push_resource,
     pop_resource,
     pop_resource_latest,
     get_resource_latest,
+    wait_pop_resource,
+    wait_pop_resource_latest,
 )
 from python.message_queue import (
     push_message_queue,
@@ -81,7 +83,7 @@ class AfGoAgentBackchannel(AgentBackchannel):
     ):
         super().__init__(ident, agent_ports, genesis_data, params)
 
-        self.output_handler_futures = []
+        self.proc: Optional[AgentProcess] = None
         self.agent_meta_params = {}
 
         # Afgo : RFC
@@ -135,6 +137,27 @@ class AfGoAgentBackchannel(AgentBackchannel):
             "abandoned": "abandoned",
         }
 
+        # (topic, operation) : Afgo to RFC state map, the operation tells the connection role
+        self.stateTranslationMaps = {
+            ("connection", None): self.connectionResponderStateTranslationDict,
+            ("connection", "send-request"): self.connectionRequesterStateTranslationDict,
+            # send-response quickly goes to completed, report it as response-sent
+            ("connection", "send-response"): {
+                **self.connectionResponderStateTranslationDict,
+                "completed": "response-sent",
+            },
+            ("issue-credential", None): self.issueCredentialStateTranslationDict,
+            ("issue-credential-v2", None): self.issueCredentialStateTranslationDict,
+            ("issue-credential-v3", None): self.issueCredentialStateTranslationDict,
+            ("proof", None): self.presentProofStateTranslationDict,
+            ("proof-v2", None): self.presentProofStateTranslationDict,
+            ("out-of-band", None): self.connectionResponderStateTranslationDict,
+        }
+        for operation in (None, "send-request", "send-response"):
+            self.stateTranslationMaps[("did-exchange", operation)] = (
+                self.stateTranslationMaps[("connection", operation)]
+            )
+
         # AATH API : AFGO Admin API
         self.issueCredentialOperationTranslationDict = {
             "prepare-json-ld": "prepare-json-ld",
@@ -280,7 +303,7 @@ class AfGoAgentBackchannel(AgentBackchannel):
     async def _receive_webhook(self, request: ClientRequest):
         payload = await request.json()
         topic = payload["topic"]
-        await self.handle_webhook(topic, payload)
+        await self.dispatch_webhook(topic, payload)
         # TODO web hooks don't require a response???
         return web.Response(text="")
 
@@ -301,6 +324,8 @@ class AfGoAgentBackchannel(AgentBackchannel):
                     f"has no method {handler} "
                     f"to handle webhook on topic {topic}"
                 )
+            # wake up anybody waiting on a state change
+            await self.notify_webhook(topic, payload)
         else:
             log_msg(
                 "in webhook, topic is: " + topic + " payload is: " + json.dumps(payload)
@@ -427,12 +452,13 @@ class AfGoAgentBackchannel(AgentBackchannel):
         timeout = 0
         webcall_returned = None
         while webcall_returned is None or timeout == 20:
+            seen_count = self.webhook_count
             msg = get_resource(thread_id, data_type)
             try:
                 ex_id = msg[0][id_txt]
                 webcall_returned = True
             except TypeError:
-                await asyncio.sleep(1)
+                await self.wait_for_webhook(seen_count, 1)
                 timeout += 1
         if timeout == 20:
             raise TimeoutError(
@@ -499,12 +525,11 @@ class AfGoAgentBackchannel(AgentBackchannel):
 
                 # extract invitation from the agent's response
                 invitation_resp = json.loads(resp_text)
-                resp_text = json.dumps(invitation_resp)
-
                 if resp_status == 200:
-                    resp_text = self.agent_state_translation(
-                        command.topic, operation, resp_text
+                    self.translate_agent_state(
+                        command.topic, operation, invitation_resp
                     )
+                resp_text = json.dumps(invitation_resp)
                 return (resp_status, resp_text)
 
             elif operation == "receive-invitation":
@@ -2253,6 +2278,8 @@ class AfGoAgentBackchannel(AgentBackchannel):
                         "state": resp_json["result"]["State"],
                         "connection": resp_json,
                     }
+                    # translate the state from that the agent gave to what the tests expect
+                    self.translate_agent_state(command.topic, None, connection_info)
                     resp_text = json.dumps(connection_info)
                 else:
                     resp_json = resp_json["results"]
@@ -2265,8 +2292,6 @@ class AfGoAgentBackchannel(AgentBackchannel):
                         }
                         connection_infos.append(connection_info)
                     resp_text = json.dumps(connection_infos)
-                # translate the state from that the agent gave to what the tests expect
-                resp_text = self.agent_state_translation(command.topic, None, resp_text)
             return (resp_status, resp_text)
 
         elif command.topic == "did":
@@ -2433,12 +2458,9 @@ class AfGoAgentBackchannel(AgentBackchannel):
 
     async def request_response_connection(self, rec_id: str) -> Tuple[int, str]:
         # TODO: no result will ever be found, since nothing ever pushes 'connection-msg'
-        connection_msg = pop_resource(rec_id, "connection-msg")
-        i = 0
-        while connection_msg is None and i < MAX_TIMEOUT:
-            await asyncio.sleep(1)
-            connection_msg = pop_resource(rec_id, "connection-msg")
-            i = i + 1
+        connection_msg = await wait_pop_resource(
+            rec_id, "connection-msg", MAX_TIMEOUT
+        )
 
         resp_status = 200
         if connection_msg:
@@ -2472,14 +2494,15 @@ class AfGoAgentBackchannel(AgentBackchannel):
 
         resp_status = 200
         if didexchange_msg:
-            resp_text = json.dumps(didexchange_msg)
-            resp_text = self.agent_state_translation("did-exchange", None, resp_text)
-
             if "message" in didexchange_msg:
                 conn_id = didexchange_msg["message"]["Properties"]["connectionID"]
                 resp_text = json.dumps(
                     {"connection_id": conn_id, "data": didexchange_msg}
                 )
+            else:
+                resp_text = json.dumps(
+                    self.translate_agent_state("did-exchange", None, didexchange_msg)
+                )
 
         else:
             print("didex NO RESULT FOUND for didexchange-states-msg")
@@ -2489,23 +2512,21 @@ class AfGoAgentBackchannel(AgentBackchannel):
 
     async def request_response_out_of_band(self, rec_id: str) -> Tuple[int, str]:
         # TODO: no result will ever be found, since nothing ever pushes 'didexchange-msg'
-        c_msg = pop_resource(rec_id, "didexchange-msg")
-        i = 0
-        while didexchange_msg is None and i < MAX_TIMEOUT:
-            await asyncio.sleep(1)
-            didexchange_msg = pop_resource(rec_id, "didexchange-msg")
-            i = i + 1
+        didexchange_msg = await wait_pop_resource(
+            rec_id, "didexchange-msg", MAX_TIMEOUT
+        )
 
         resp_status = 200
         if didexchange_msg:
-            resp_text = json.dumps(didexchange_msg)
-            resp_text = self.agent_state_translation("out-of-band", None, resp_text)
-
             if "message" in didexchange_msg:
                 conn_id = didexchange_msg["message"]["Properties"]["connectionID"]
                 resp_text = json.dumps(
                     {"connection_id": conn_id, "data": didexchange_msg}
                 )
+            else:
+                resp_text = json.dumps(
+                    self.translate_agent_state("out-of-band", None, didexchange_msg)
+                )
 
         else:
             resp_text = "{}"
@@ -2519,12 +2540,7 @@ class AfGoAgentBackchannel(AgentBackchannel):
             message_name = "issue-credential-states-msg"
         await asyncio.sleep(1)
 
-        credential_msg = pop_resource_latest(message_name)
-        i = 0
-        while credential_msg is None and i < MAX_TIMEOUT:
-            await asyncio.sleep(1)
-            credential_msg = pop_resource_latest(message_name)
-            i = i + 1
+        credential_msg = await wait_pop_resource_latest(message_name, MAX_TIMEOUT)
 
         # If we couldn't get a state out of the states webhook message, see if we can get the type and determine what the
         # state should be. This is a guess as afgo doesn't return states to receivers.
@@ -2579,12 +2595,9 @@ class AfGoAgentBackchannel(AgentBackchannel):
         return (resp_status, resp_text)
 
     async def request_response_credential(self, rec_id: str) -> Tuple[int, str]:
-        credential_msg = pop_resource(rec_id, "credential-msg")
-        i = 0
-        while credential_msg is None and i < MAX_TIMEOUT:
-            await asyncio.sleep(1)
-            credential_msg = pop_resource(rec_id, "credential-msg")
-            i = i + 1
+        credential_msg = await wait_pop_resource(
+            rec_id, "credential-msg", MAX_TIMEOUT
+        )
 
         resp_status = 200
         if credential_msg:
@@ -2601,12 +2614,9 @@ class AfGoAgentBackchannel(AgentBackchannel):
             message_name = "present-proof-states-msg"
 
         await asyncio.sleep(1)
-        presentation_msg = pop_resource(command.record_id, message_name)
-        i = 0
-        while presentation_msg is None and i < MAX_TIMEOUT:
-            await asyncio.sleep(1)
-            presentation_msg = pop_resource(command.record_id, message_name)
-            i = i + 1
+        presentation_msg = await wait_pop_resource(
+            command.record_id, message_name, MAX_TIMEOUT
+        )
 
         # If we couldn't get a state out of the states webhook message, see if we can get the type and determine what the
         # state should be. This is a guess as afgo doesn't return states to receivers.
@@ -2634,9 +2644,9 @@ class AfGoAgentBackchannel(AgentBackchannel):
 
         resp_status = 200
         if presentation_msg:
-            resp_text = json.dumps(presentation_msg)
-            if resp_status == 200:
-                resp_text = self.agent_state_translation(command.topic, None, resp_text)
+            resp_text = json.dumps(
+                self.translate_agent_state(command.topic, None, presentation_msg)
+            )
         else:
             resp_text = "{}"
 
@@ -2645,12 +2655,9 @@ class AfGoAgentBackchannel(AgentBackchannel):
     async def request_response_revocation_registry(
         self, rec_id: str
     ) -> Tuple[int, str]:
-        revocation_msg = pop_resource(rec_id, "revocation-registry-msg")
-        i = 0
-        while revocation_msg is None and i < MAX_TIMEOUT:
-            await asyncio.sleep(1)
-            revocation_msg = pop_resource(rec_id, "revocation-registry-msg")
-            i = i + 1
+        revocation_msg = await wait_pop_resource(
+            rec_id, "revocation-registry-msg", MAX_TIMEOUT
+        )
 
         resp_status = 200
         if revocation_msg:
@@ -2702,28 +2709,8 @@ class AfGoAgentBackchannel(AgentBackchannel):
 
         return (501, "501: Not Implemented\n\n")
 
-    def _process(
-        self, args: List[str], env: Dict[str, str], loop: asyncio.AbstractEventLoop
-    ):
-        proc = subprocess.Popen(
-            args,
-            env=env,
-            encoding="utf-8",
-        )
-        stdout = loop.run_in_executor(
-            None,
-            output_reader,
-            proc.stdout,
-            functools.partial(self.handle_output, source="stdout"),
-        )
-        stderr = loop.run_in_executor(
-            None,
-            output_reader,
-            proc.stderr,
-            functools.partial(self.handle_output, source="stderr"),
-        )
-        self.output_handler_futures = [stdout, stderr]
-        return proc
+    async def _process(self, args: List[str], env: Dict[str, str]) -> AgentProcess:
+        return await AgentProcess.start(args, env, self.handle_output, self.agent_log)
 
     def get_process_args(self, bin_path: Optional[str] = None) -> List[str]:
         # TODO aries-agent-rest needs to be in the path so no need to give it a cmd_path
@@ -2773,10 +2760,7 @@ class AfGoAgentBackchannel(AgentBackchannel):
         self.log(agent_args)
         self.log("and environment:")
         self.log(my_env)
-        loop = asyncio.get_event_loop()
-        self.proc = await loop.run_in_executor(
-            None, self._process, agent_args, my_env, loop
-        )
+        self.proc = await self._process(agent_args, my_env)
         if wait:
             await asyncio.sleep(1.0)
             await self.detect_process()
@@ -2795,36 +2779,15 @@ class AfGoAgentBackchannel(AgentBackchannel):
         self.log(agent_args)
         self.log("and environment:")
         self.log(my_env)
-        loop = asyncio.get_event_loop()
-        self.proc = await loop.run_in_executor(
-            None, self._process, agent_args, my_env, loop
-        )
+        self.proc = await self._process(agent_args, my_env)
         if wait:
             await asyncio.sleep(1.0)
             await self.detect_process()
 
-    def _terminate(self):
-        if self.proc and self.proc.poll() is None:
-            self.proc.terminate()
-            try:
-                self.proc.wait(timeout=0.5)
-                self.log(f"Exited with return code {self.proc.returncode}")
-            except subprocess.TimeoutExpired:
-                msg = "Process did not terminate in time"
-                self.log(msg)
-                raise Exception(msg)
-
     async def kill_agent(self, loop: Optional[asyncio.AbstractEventLoop] = None):
-        if loop is None:
-            loop = asyncio.get_event_loop()
-
-        if self.proc:
-            await loop.run_in_executor(None, self._terminate)
-
-        for fut in self.output_handler_futures:
-            fut.cancel()
-
-        self.output_handler_futures = []
+        if self.proc and self.proc.returncode is None:
+            await self.proc.terminate()
+            self.log(f"Exited with return code {self.proc.returncode}")
 
         # delete all backchannel metadata relating to data saved to agent
         self.loaded_jsonld_contexts = []
@@ -2861,72 +2824,34 @@ class AfGoAgentBackchannel(AgentBackchannel):
         #
         # Present Proof Protocol:
         # Tests/RFC         |   Afgo
-
-        def replace_state_values(data: str, *, old_state: str, new_state: str):
-            return data.replace(f'"state": "{old_state}"', f'"state": "{new_state}"')
-
+        #
+        # Prefer translate_agent_state() when the response is already parsed.
         resp_json = json.loads(data)
-
-        # Check to see if state is in the json
-        if "state" in resp_json:
-            agent_state = resp_json["state"]
-
-            if topic == "connection" or topic == "did-exchange":
-                if operation == "send-request":
-                    # We know this is the requester because we are in send-request, so swap for expected requester state
-                    data = data.replace(
-                        agent_state,
-                        self.connectionRequesterStateTranslationDict[agent_state],
-                    )
-                elif operation == "send-response":
-                    # The send response quickly goes to completed state. if completed in the send-reponse, just swap the
-                    # state to response-sent.
-                    if "completed" in data:
-                        data = data.replace("completed", "response-sent")
-                    else:
-                        data = data.replace(
-                            agent_state,
-                            self.connectionResponderStateTranslationDict[agent_state],
-                        )
-                else:
-                    data = data.replace(
-                        agent_state,
-                        self.connectionResponderStateTranslationDict[agent_state],
-                    )
-            elif topic == "issue-credential" or topic == "issue-credential-v2" or topic == "issue-credential-v3":
-                data = data.replace(
-                    agent_state, self.issueCredentialStateTranslationDict[agent_state]
-                )
-            elif topic == "proof" or topic == "proof-v2":
-                data = replace_state_values(
-                    data,
-                    old_state=agent_state,
-                    new_state=self.presentProofStateTranslationDict[agent_state],
-                )
-            elif topic == "out-of-band" or topic == "did-exchange":
-                data = replace_state_values(
-                    data,
-                    old_state=agent_state,
-                    new_state=self.connectionResponderStateTranslationDict[agent_state],
-                )
-
-        else:
-            if topic == "out-of-band":
-                if operation == "send-invitation-message":
-                    resp_json["state"] = "invitation-sent"
-                    resp_json[
-                        "service"
-                    ] = '["did:sov:BzCbsNYhMrjHiqZDTUASHg;spec/didexchange/v1.0"]'
-                    data = json.dumps(resp_json)
-
-            elif topic == "proof" or topic == "proof-v2":
-                if operation == "send-request":
-                    data = json.dumps(resp_json)
-                elif operation == "send-presentation":
-                    data = json.dumps(resp_json)
-
+        if isinstance(resp_json, dict):
+            agent_state = resp_json.get("state")
+            self.translate_agent_state(topic, operation, resp_json)
+            if resp_json.get("state") != agent_state:
+                data = json.dumps(resp_json)
         return data
 
+    def translate_agent_state(self, topic: str, operation: Optional[str], record: Any):
+        """Translate the state of a parsed response in place, see agent_state_translation()"""
+        if not isinstance(record, dict):
+            return record
+
+        if "state" in record:
+            state_map = self.stateTranslationMaps.get(
+                (topic, operation)
+            ) or self.stateTranslationMaps.get((topic, None))
+            if state_map is not None:
+                translate_state(record, state_map)
+        elif topic == "out-of-band" and operation == "send-invitation-message":
+            record["state"] = "invitation-sent"
+            record[
+                "service"
+            ] = '["did:sov:BzCbsNYhMrjHiqZDTUASHg;spec/didexchange/v1.0"]'
+        return record
+
 
 async def main(start_port: int, show_timing: bool = False, interactive: bool = True):
 
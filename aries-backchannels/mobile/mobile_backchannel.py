@@ -4,7 +4,6 @@ import json
 import logging
 import os
 
-from time import sleep
 from typing import Tuple
 
 from qrcode import QRCode
@@ -20,7 +19,7 @@ from python.utils import (
     prompt_loop,
 )
 from python.storage import (
-    pop_resource,
+    wait_pop_resource,
 )
 
 LOGGER = logging.getLogger(__name__)
@@ -215,12 +214,9 @@ class MobileAgentBackchannel(AgentBackchannel):
         record_id = command.record_id
 
         if command.topic == "connection" and record_id:
-            connection_msg = pop_resource(record_id, "connection-msg")
-            i = 0
-            while connection_msg is None and i < MAX_TIMEOUT:
-                sleep(1)
-                connection_msg = pop_resource(record_id, "connection-msg")
-                i = i + 1
+            connection_msg = await wait_pop_resource(
+                record_id, "connection-msg", MAX_TIMEOUT
+            )
 
             resp_status = 200
             if connection_msg:
@@ -1,18 +1,37 @@
+import asyncio
 import json
 import logging
 import os
 import random
 import traceback
+from collections import OrderedDict
+from contextvars import ContextVar
 from dataclasses import dataclass
 from secrets import token_hex
-from typing import Any, Optional, Tuple
+from timeit import default_timer
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
 
-from aiohttp import ClientSession, web
+from aiohttp import ClientError, ClientSession, ClientTimeout, TraceConfig, web
 from aiohttp.typedefs import Handler
 from typing_extensions import Literal, TypedDict
 
 import aiohttp_cors
 
+from .agent_process import AgentLogBuffer
+from .bootstrap_cache import bootstrap_cache
+from .json_text import parse_json
+from .message_queue import get_message_queue_stats
+from .metrics import (
+    PROMETHEUS_CONTENT_TYPE,
+    render_metrics,
+    request_agent_seconds,
+    request_seconds,
+    response_wait_seconds,
+    webhook_handling_seconds,
+    webhook_to_response_seconds,
+    webhooks_received,
+)
+from .storage import get_storage_stats
 from .utils import log_msg
 
 LOGGER = logging.getLogger(__name__)
@@ -23,9 +42,29 @@ DEFAULT_EXTERNAL_HOST = "localhost"
 
 START_TIMEOUT = float(os.getenv("START_TIMEOUT", 60.0))
 
+# Default and max time a /agent/wait request blocks before giving up
+WAIT_TIMEOUT = 60.0
+# Re-check interval for /agent/wait, in case a state change is not signalled by a webhook
+WAIT_POLL_INTERVAL = 1.0
+
 RUN_MODE = os.getenv("RUNMODE")
 
+# Response headers reporting the time (seconds) spent handling a backchannel request,
+# and how much of that was spent waiting on the agent (admin API, ledger)
+BACKCHANNEL_TIME_HEADER = "X-Backchannel-Time"
+AGENT_TIME_HEADER = "X-Agent-Time"
+
+# Agent time accumulated for the backchannel request handled by the current task
+agent_time = ContextVar("agent_time", default=None)
+
+# Payload fields identifying the record (thread, connection, ...) a webhook is about
+WEBHOOK_ID_FIELDS = ("thread_id", "connection_id", "piid", "connectionID", "invitationID")
+# Number of record ids for which the arrival time of the last webhook is kept
+WEBHOOK_TIMESTAMPS_MAX = 10_000
+
 GENESIS_URL = os.getenv("GENESIS_URL")
+# Seconds to wait for the genesis when a cached copy can be used instead
+GENESIS_FETCH_TIMEOUT = 5.0
 LEDGER_URL = os.getenv("LEDGER_URL")
 
 if RUN_MODE == "docker":
@@ -41,6 +80,24 @@ class AgentPorts(TypedDict):
     ws: int
 
 
+def agent_timing_trace_config() -> TraceConfig:
+    """Trace config adding the duration of each outgoing request to agent_time"""
+
+    async def on_request_start(session, ctx, params):
+        ctx.start = default_timer()
+
+    async def on_request_done(session, ctx, params):
+        timer = agent_time.get()
+        if timer is not None:
+            timer[0] += default_timer() - ctx.start
+
+    trace_config = TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_done)
+    trace_config.on_request_exception.append(on_request_done)
+    return trace_config
+
+
 def get_ledger_url(ledger_url: str = None):
     return ledger_url or LEDGER_URL or f"http://{DEFAULT_EXTERNAL_HOST}:9000"
 
@@ -61,19 +118,115 @@ class BackchannelCommand:
     anoncreds: Optional[bool] = False
 
 
+# Command kinds a handler can be registered for: the method of an /agent/command
+# request, or RESPONSE for /agent/response
+COMMAND_KINDS = ("GET", "POST", "DELETE", "RESPONSE")
+
+NOT_IMPLEMENTED = (501, "501: Not Implemented\n\n")
+
+
+def command_handler(kind: str, topic: str, *operations: str):
+    """
+    Register the decorated backchannel method as the handler of a topic.
+
+    With no operations the handler takes every operation of the topic, otherwise
+    only the ones listed. E.g.:
+
+        @command_handler("POST", "connection", "create-invitation", "receive-invitation")
+        async def handle_connection_POST(self, command: BackchannelCommand):
+    """
+    if kind not in COMMAND_KINDS:
+        raise ValueError(f"Unknown command kind {kind}, expected one of {COMMAND_KINDS}")
+
+    def decorator(func):
+        commands = getattr(func, "backchannel_commands", [])
+        commands.extend((kind, topic, operation) for operation in operations or (None,))
+        func.backchannel_commands = commands
+        return func
+
+    return decorator
+
+
+class CommandRouter:
+    """
+    (kind, topic, operation) -> handler table of a backchannel, built once from the
+    methods registered with @command_handler so dispatching a command is a dict lookup.
+    """
+
+    def __init__(self, backchannel: "AgentBackchannel"):
+        self.handlers: Dict[Tuple[str, str, Optional[str]], Callable] = {}
+        for name in dir(type(backchannel)):
+            attr = getattr(type(backchannel), name, None)
+            for key in getattr(attr, "backchannel_commands", ()):
+                self.handlers[key] = getattr(backchannel, name)
+
+    def resolve(self, kind: str, command: BackchannelCommand) -> Optional[Callable]:
+        handler = self.handlers.get((kind, command.topic, command.operation))
+        if handler is None:
+            handler = self.handlers.get((kind, command.topic, None))
+        return handler
+
+    async def dispatch(self, kind: str, command: BackchannelCommand) -> Tuple[int, str]:
+        handler = self.resolve(kind, command)
+        if handler is None:
+            return NOT_IMPLEMENTED
+        return await handler(command)
+
+    def supported_commands(self) -> List[dict]:
+        return [
+            {"kind": kind, "topic": topic, "operation": operation}
+            for (kind, topic, operation) in sorted(
+                self.handlers, key=lambda key: (key[0], key[1], key[2] or "")
+            )
+        ]
+
+
+def translate_state(record: Any, state_map: Mapping[str, str]) -> Any:
+    """
+    Translate the agent "state" of a parsed response into the RFC state the tests
+    expect, in place. Records nested one level down in the same state (e.g. the
+    "connection" of a connection GET) are translated along with it; no other field
+    is touched.
+    """
+    if not isinstance(record, dict) or "state" not in record:
+        return record
+
+    agent_state = record["state"]
+    rfc_state = state_map[agent_state]
+    record["state"] = rfc_state
+    for value in record.values():
+        if isinstance(value, dict) and value.get("state") == agent_state:
+            value["state"] = rfc_state
+    return record
+
+
 async def default_genesis_txns():
     genesis = None
     try:
-        if GENESIS_URL:
-            async with ClientSession() as session:
-                print("From GENESIS_URL:", GENESIS_URL)
-                async with session.get(GENESIS_URL) as resp:
-                    genesis = await resp.text()
-        elif RUN_MODE == "docker":
-            async with ClientSession() as session:
-                ledger_url = get_ledger_url()
-                async with session.get(f"{ledger_url}/genesis") as resp:
-                    genesis = await resp.text()
+        if GENESIS_URL or RUN_MODE == "docker":
+            genesis_url = GENESIS_URL or f"{get_ledger_url()}/genesis"
+            # the ledger may have been reset with a new genesis since it was cached, so
+            # the cached copy is only used when the genesis can't be fetched
+            cached = bootstrap_cache.get_genesis(genesis_url)
+            timeout = ClientTimeout(total=GENESIS_FETCH_TIMEOUT if cached else None)
+            try:
+                async with ClientSession(timeout=timeout) as session:
+                    if GENESIS_URL:
+                        print("From GENESIS_URL:", GENESIS_URL)
+                    async with session.get(genesis_url) as resp:
+                        genesis = await resp.text()
+                        if resp.status == 200:
+                            if cached and genesis != cached:
+                                print("Genesis changed since it was cached:", genesis_url)
+                            bootstrap_cache.put_genesis(genesis_url, genesis)
+                        elif cached:
+                            genesis = None
+            except (ClientError, asyncio.TimeoutError):
+                if not cached:
+                    raise
+            if cached and genesis is None:
+                print("From the bootstrap cache:", genesis_url)
+                genesis = cached
         else:
             print("With local file:", "../local-genesis.txt")
             with open("../local-genesis.txt", "r") as genesis_file:
@@ -115,7 +268,25 @@ class AgentBackchannel:
         async def backchannel_middleware(request: web.Request, handler: Handler):
             request["backchannel"] = self
 
-            return await handler(request)
+            # report where the time went, so the harness can profile its runs
+            start = default_timer()
+            timer = [0.0]
+            token = agent_time.set(timer)
+            try:
+                response = await handler(request)
+            finally:
+                agent_time.reset(token)
+            duration = default_timer() - start
+            labels = {
+                "method": request.method,
+                "topic": request.match_info.get("topic", ""),
+            }
+            request_seconds.observe(duration, **labels)
+            request_agent_seconds.observe(timer[0], **labels)
+            if not response.prepared:
+                response.headers[BACKCHANNEL_TIME_HEADER] = f"{duration:.6f}"
+                response.headers[AGENT_TIME_HEADER] = f"{timer[0]:.6f}"
+            return response
 
         app = web.Application(middlewares=[backchannel_middleware])
         self.app = app
@@ -135,10 +306,34 @@ class AgentBackchannel:
         self.did = None
         self.postgres = False
 
-        self.client_session: ClientSession = ClientSession()
+        self.client_session: ClientSession = ClientSession(
+            trace_configs=[agent_timing_trace_config()]
+        )
+
+        # Incremented for every webhook received from the agent, so waiters can block
+        # until the agent reports a change instead of sleeping for a fixed time
+        self.webhook_count = 0
+        self.webhook_condition = asyncio.Condition()
+        # record id -> arrival time (default_timer) of the last webhook about it
+        self.webhook_timestamps = OrderedDict()
+
+        # The latest output of the agent process, for GET /agent/command/agent-log
+        self.agent_log = AgentLogBuffer()
+        # how handle_output shows the agent output
+        self.color = None
+        self.prefix_str = None
+
+        # Set by activate(), once the agent is started, for GET /agent/ready
+        self.ready = asyncio.Event()
+
+        self.command_router = CommandRouter(self)
 
     def activate(self, active: bool = True):
         self.ACTIVE = active
+        if active:
+            self.ready.set()
+        else:
+            self.ready.clear()
 
     def get_agent_endpoint(self, transport: Literal["http", "ws"]) -> str:
         port = str(self.agent_ports[transport])
@@ -179,6 +374,28 @@ class AgentBackchannel:
 
         self.app.add_routes(
             [
+                web.get("/metrics", self._get_metrics),
+                web.get("/agent/ready", self._get_ready),
+                web.get(
+                    "/agent/command/supported-commands/",
+                    self._get_supported_commands,
+                ),
+                web.get(
+                    "/agent/command/supported-commands",
+                    self._get_supported_commands,
+                ),
+                web.get("/agent/command/storage-stats/", self._get_storage_stats),
+                web.get("/agent/command/storage-stats", self._get_storage_stats),
+                web.get("/agent/command/agent-log/", self._get_agent_log),
+                web.get("/agent/command/agent-log", self._get_agent_log),
+                web.get(
+                    "/agent/command/message-queue-stats/",
+                    self._get_message_queue_stats,
+                ),
+                web.get(
+                    "/agent/command/message-queue-stats",
+                    self._get_message_queue_stats,
+                ),
                 web.post("/agent/command/{topic}/", self._post_command_backchannel),
                 web.post("/agent/command/{topic}", self._post_command_backchannel),
                 web.post(
@@ -212,6 +429,8 @@ class AgentBackchannel:
                     "/agent/response/{topic}/{id}/", self._get_response_backchannel
                 ),
                 web.get("/agent/response/{topic}/{id}", self._get_response_backchannel),
+                web.get("/agent/wait/{topic}/{id}/", self._get_wait_backchannel),
+                web.get("/agent/wait/{topic}/{id}", self._get_wait_backchannel),
             ]
         )
 
@@ -356,11 +575,13 @@ class AgentBackchannel:
         Get a response from the (remote) agent.
         """
         command = None
+        start = default_timer()
         try:
             command = await self.parse_request(request)
             (resp_status, resp_text) = await self.make_agent_GET_request_response(
                 command
             )
+            self.record_response(command, resp_status, start)
 
             if resp_status == 200:
                 return web.Response(text=resp_text, status=resp_status)
@@ -377,37 +598,235 @@ class AgentBackchannel:
             traceback.print_exc()
             return web.Response(body=str(e), status=500)
 
+    async def _get_metrics(self, request: web.Request):
+        """
+        Get the webhook, storage and request latency histograms, in the Prometheus
+        text format.
+        """
+        return web.Response(
+            body=render_metrics().encode("utf8"),
+            headers={"Content-Type": PROMETHEUS_CONTENT_TYPE},
+        )
+
+    async def _get_supported_commands(self, request: web.Request):
+        """
+        Get the (kind, topic, operation) commands the backchannel has handlers for.
+
+        An operation of null means every operation of the topic. An empty list means
+        the backchannel dispatches its commands itself and nothing can be told.
+        """
+        return web.json_response(self.command_router.supported_commands())
+
+    async def _get_storage_stats(self, request: web.Request):
+        """
+        Get entry counts, size estimates and eviction counters of the webhook store.
+        """
+        return web.json_response(get_storage_stats())
+
+    async def _get_message_queue_stats(self, request: web.Request):
+        """
+        Get depth, waiter and wait-time counters of the message queues and stacks.
+        """
+        return web.json_response(get_message_queue_stats())
+
+    async def _get_agent_log(self, request: web.Request):
+        """
+        Get the latest output lines of the agent process.
+
+        GET /agent/command/agent-log?since=<unix time>
+
+        Only the lines read since the given time, e.g. the start of a scenario. Up to
+        AGENT_LOG_MAX_BYTES of output is kept; "truncated" tells if some of the lines
+        asked for were already dropped.
+        """
+        since = float(request.query.get("since", 0))
+        return web.json_response(self.agent_log.since(since))
+
+    async def _get_ready(self, request: web.Request):
+        """
+        Wait until the agent is started and the backchannel ready for commands.
+
+        GET /agent/ready?timeout=<seconds>
+
+        Returns 200 as soon as the backchannel is activated, or 408 if the timeout
+        expires first, so the harness doesn't have to poll the agent status.
+        """
+        timeout = min(float(request.query.get("timeout", START_TIMEOUT)), START_TIMEOUT)
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return web.json_response({"status": "Inactive"}, status=408)
+        return web.json_response({"status": "Active"})
+
+    async def _get_wait_backchannel(self, request: web.Request):
+        """
+        Wait until the record reaches one of the requested states.
+
+        GET /agent/wait/{topic}/{id}?state=<state>[,<state>...]&timeout=<seconds>
+
+        The record state is fetched the same way as GET /agent/command/{topic}/{id},
+        and re-checked every time a webhook is received from the agent. Returns 200
+        with the record as soon as the state matches, or 408 with the last seen state
+        if the timeout expires first. A 404 is not final: the record may not have been
+        created yet, so the wait continues until it appears or the timeout expires.
+        """
+        command = None
+        try:
+            command = await self.parse_request(request)
+            states = [
+                state
+                for state in request.query.get("state", "").split(",")
+                if state
+            ]
+            # "N/A" means the backchannel can't determine the state - treat it as a match
+            states.append("N/A")
+            timeout = min(float(request.query.get("timeout", WAIT_TIMEOUT)), WAIT_TIMEOUT)
+
+            deadline = default_timer() + timeout
+            state = None
+            while True:
+                seen_count = self.webhook_count
+                (resp_status, resp_text) = await self.make_agent_GET_request(command)
+                if resp_status == 200:
+                    state = parse_json(resp_text).get("state")
+                    if state in states:
+                        return web.Response(text=resp_text, status=resp_status)
+                elif resp_status == 501:
+                    return self.not_implemented_response(json.dumps(command.__dict__))
+
+                remaining = deadline - default_timer()
+                if remaining <= 0:
+                    return web.json_response(
+                        {"state": state, "status": resp_status}, status=408
+                    )
+                await self.wait_for_webhook(
+                    seen_count, min(remaining, WAIT_POLL_INTERVAL)
+                )
+        except NotImplementedError:
+            return self.not_implemented_response(json.dumps(command.__dict__))
+        except Exception as e:
+            print("Exception:", e)
+            traceback.print_exc()
+            return web.Response(body=str(e), status=500)
+
+    def record_webhook(self, topic: str, payload: Any = None) -> float:
+        """
+        Count a webhook received from the agent and timestamp it by the record it is
+        about. Returns the arrival time (default_timer).
+        """
+        received = default_timer()
+        webhooks_received.inc(topic=topic)
+        if isinstance(payload, dict):
+            properties = payload.get("message")
+            properties = (
+                properties.get("Properties") if isinstance(properties, dict) else None
+            )
+            for record in (payload, properties or {}):
+                for field in WEBHOOK_ID_FIELDS:
+                    record_id = record.get(field)
+                    if isinstance(record_id, str):
+                        self.webhook_timestamps.pop(record_id, None)
+                        self.webhook_timestamps[record_id] = received
+            while len(self.webhook_timestamps) > WEBHOOK_TIMESTAMPS_MAX:
+                self.webhook_timestamps.popitem(last=False)
+        return received
+
+    async def dispatch_webhook(self, topic: str, payload: Any):
+        """
+        Pass a webhook received from the agent to handle_webhook, recording its arrival
+        and how long handling it took.
+        """
+        received = self.record_webhook(topic, payload)
+        try:
+            await self.handle_webhook(topic, payload)
+        finally:
+            webhook_handling_seconds.observe(default_timer() - received, topic=topic)
+
+    async def handle_webhook(self, topic: str, payload: Any):
+        """
+        Override with agent-specific behaviour
+        """
+        raise NotImplementedError
+
+    def record_response(
+        self, command: BackchannelCommand, resp_status: int, start: float
+    ):
+        """
+        Record how long a /agent/response consumer waited, and how long after the last
+        webhook about the record it got its response.
+        """
+        responded = default_timer()
+        response_wait_seconds.observe(
+            responded - start, topic=command.topic, status=resp_status
+        )
+        received = self.webhook_timestamps.get(command.record_id)
+        if resp_status == 200 and received is not None:
+            webhook_to_response_seconds.observe(
+                responded - received, topic=command.topic
+            )
+
+    async def notify_webhook(self, topic: str, payload: Any = None):
+        """
+        Signal that a webhook was received and processed, waking up anybody
+        blocked in wait_for_webhook
+        """
+        async with self.webhook_condition:
+            self.webhook_count += 1
+            self.webhook_condition.notify_all()
+
+    async def wait_for_webhook(self, seen_count: int, timeout: float) -> bool:
+        """
+        Wait until a webhook arrives after `seen_count` (a previous value of
+        self.webhook_count) or the timeout expires. Returns True if woken by a webhook.
+        """
+
+        async def _wait():
+            async with self.webhook_condition:
+                await self.webhook_condition.wait_for(
+                    lambda: self.webhook_count != seen_count
+                )
+
+        try:
+            await asyncio.wait_for(_wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
     async def make_agent_POST_request(
         self, command: BackchannelCommand
     ) -> Tuple[int, str]:
         """
-        Override with agent-specific behaviour
+        Dispatch to the @command_handler("POST", ...) handler of the command, or
+        override with agent-specific behaviour
         """
-        raise NotImplementedError
+        return await self.command_router.dispatch("POST", command)
 
     async def make_agent_DELETE_request(
         self, command: BackchannelCommand
     ) -> Tuple[int, str]:
         """
-        Override with agent-specific behaviour
+        Dispatch to the @command_handler("DELETE", ...) handler of the command, or
+        override with agent-specific behaviour
         """
-        raise NotImplementedError
+        return await self.command_router.dispatch("DELETE", command)
 
     async def make_agent_GET_request(
         self, command: BackchannelCommand
     ) -> Tuple[int, str]:
         """
-        Override with agent-specific behaviour
+        Dispatch to the @command_handler("GET", ...) handler of the command, or
+        override with agent-specific behaviour
         """
-        raise NotImplementedError
+        return await self.command_router.dispatch("GET", command)
 
     async def make_agent_GET_request_response(
         self, command: BackchannelCommand
     ) -> Tuple[int, str]:
         """
-        Override with agent-specific behaviour
+        Dispatch to the @command_handler("RESPONSE", ...) handler of the command, or
+        override with agent-specific behaviour
         """
-        raise NotImplementedError
+        return await self.command_router.dispatch("RESPONSE", command)
 
     def log(self, msg: str):
         print(msg)
@@ -422,9 +841,41 @@ class AgentBackchannel:
             color = None
         log_msg(*output, color=color, prefix=self.prefix_str, end=end, **kwargs)
 
+    def bootstrap_cache_key(self, alias: str) -> str:
+        """Key of the agent's DID in the bootstrap cache, distinct for each agent pool"""
+        return f"{alias}:{self.agent_ports['http']}"
+
+    async def is_nym_on_ledger(self, ledger_url: str, did: str) -> bool:
+        """Is there a NYM for the DID, according to the von-network ledger browser"""
+        try:
+            async with self.client_session.get(
+                ledger_url + "/ledger/domain", params={"query": did, "type": "1"}
+            ) as resp:
+                if resp.status != 200:
+                    return False
+                result = await resp.json(content_type=None)
+        except (ClientError, ValueError):
+            return False
+
+        for txn in (result or {}).get("results") or []:
+            data = (txn.get("txn") or {}).get("data") or {}
+            if data.get("dest") == did:
+                return True
+        return False
+
     async def register_did(self, ledger_url: str = None, alias: str = None):
         ledger_url = get_ledger_url(ledger_url)
-        data = {"alias": alias or self.ident, "seed": self.seed, "role": "TRUST_ANCHOR"}
+        alias = alias or self.ident
+        cache_key = self.bootstrap_cache_key(alias)
+        cached = bootstrap_cache.get_did(self.genesis_data, cache_key)
+        # a reset ledger has the same genesis, check the DID is still on it
+        if cached and await self.is_nym_on_ledger(ledger_url, cached["did"]):
+            self.seed = cached["seed"]
+            self.did = cached["did"]
+            self.log(f"Got DID: {self.did} (from the bootstrap cache)")
+            return
+
+        data = {"alias": alias, "seed": self.seed, "role": "TRUST_ANCHOR"}
         async with self.client_session.post(
             ledger_url + "/register", json=data
         ) as resp:
@@ -433,3 +884,13 @@ class AgentBackchannel:
             nym_info = await resp.json()
             self.did = nym_info["did"]
         self.log(f"Got DID: {self.did}")
+        bootstrap_cache.put_did(
+            self.genesis_data,
+            cache_key,
+            {
+                "did": self.did,
+                "verkey": nym_info.get("verkey"),
+                "seed": self.seed,
+                "role": "TRUST_ANCHOR",
+            },
+        )
@@ -0,0 +1,151 @@
+"""
+Agent sub-processes, run on the backchannel's event loop.
+
+The output of the agent is read line by line by asyncio stream readers, passed on to
+the backchannel's output handler and kept in an AgentLogBuffer: the last
+AGENT_LOG_MAX_BYTES characters of output, which the harness fetches from
+GET /agent/command/agent-log to keep the agent output of a failed scenario.
+"""
+import asyncio
+import os
+import signal
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+AGENT_LOG_MAX_BYTES = int(os.getenv("AGENT_LOG_MAX_BYTES", 4 * 1024 * 1024))
+
+# longer output lines are passed on in pieces of this size
+MAX_LINE_LENGTH = 1024 * 1024
+
+
+class AgentLogBuffer:
+    """Ring buffer of the latest agent output lines, with the time they were read"""
+
+    def __init__(self, max_bytes: int = AGENT_LOG_MAX_BYTES):
+        self.max_bytes = max_bytes
+        # (time, source, line)
+        self.lines = deque()
+        self.size = 0
+        self.dropped = 0
+
+    def append(self, source: str, line: str):
+        self.lines.append((time.time(), source, line))
+        self.size += len(line)
+        while self.size > self.max_bytes and len(self.lines) > 1:
+            (_, _, dropped_line) = self.lines.popleft()
+            self.size -= len(dropped_line)
+            self.dropped += 1
+
+    def since(self, start: float = 0.0) -> dict:
+        """The lines read since start (a time.time() timestamp)"""
+        lines = []
+        for (line_time, source, line) in reversed(self.lines):
+            if line_time < start:
+                break
+            lines.append({"time": line_time, "source": source, "line": line})
+        lines.reverse()
+
+        # older lines were dropped, some of those asked for may be missing
+        truncated = self.dropped > 0 and (
+            not self.lines or self.lines[0][0] > start
+        )
+        return {"lines": lines, "truncated": truncated}
+
+    def clear(self):
+        self.lines.clear()
+        self.size = 0
+
+
+class AgentProcess:
+    """
+    An agent sub-process and the readers of its output.
+
+    Has the poll() and pid of a subprocess.Popen, for the backchannel code checking
+    whether the agent is (still) running.
+    """
+
+    def __init__(self, proc: asyncio.subprocess.Process, readers: List[asyncio.Future]):
+        self.proc = proc
+        self.readers = readers
+
+    @classmethod
+    async def start(
+        cls,
+        args: List[str],
+        env: Dict[str, str],
+        on_output: Callable[..., None],
+        log_buffer: AgentLogBuffer,
+        new_session: bool = False,
+    ) -> "AgentProcess":
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            env=env,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=MAX_LINE_LENGTH,
+            start_new_session=new_session,
+        )
+        readers = [
+            asyncio.ensure_future(
+                cls._read_lines(proc.stdout, "stdout", on_output, log_buffer)
+            ),
+            asyncio.ensure_future(
+                cls._read_lines(proc.stderr, "stderr", on_output, log_buffer)
+            ),
+        ]
+        return cls(proc, readers)
+
+    @staticmethod
+    async def _read_lines(
+        stream: asyncio.StreamReader,
+        source: str,
+        on_output: Callable[..., None],
+        log_buffer: AgentLogBuffer,
+    ):
+        while True:
+            try:
+                line = await stream.readuntil(b"\n")
+            except asyncio.IncompleteReadError as e:
+                # end of the output, with or without a last unterminated line
+                line = e.partial
+            except asyncio.LimitOverrunError as e:
+                line = await stream.read(e.consumed)
+            if not line:
+                break
+            text = line.decode("utf-8", errors="replace")
+            log_buffer.append(source, text)
+            on_output(text, source=source)
+
+    @property
+    def pid(self) -> int:
+        return self.proc.pid
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self.proc.returncode
+
+    def poll(self) -> Optional[int]:
+        return self.proc.returncode
+
+    async def terminate(self, timeout: float = 0.5, process_group: bool = False):
+        """
+        Terminate the agent (with the processes it started, if process_group) and
+        wait for it to exit and for the rest of its output to be read.
+        """
+        if self.proc.returncode is None:
+            try:
+                if process_group:
+                    # proc.terminate by itself won't kill the servers, this does
+                    os.killpg(os.getpgid(self.proc.pid), signal.SIGTERM)
+                self.proc.terminate()
+            except ProcessLookupError:
+                pass
+            try:
+                await asyncio.wait_for(self.proc.wait(), timeout)
+            except asyncio.TimeoutError:
+                raise Exception("Process did not terminate in time")
+
+        (_, pending) = await asyncio.wait(self.readers, timeout=timeout)
+        for reader in pending:
+            reader.cancel()
@@ -0,0 +1,87 @@
+"""
+On-disk cache of what a backchannel fetches from and writes to the ledger on startup.
+
+Enabled by setting BOOTSTRAP_CACHE_DIR to a directory shared by the agent containers
+(./manage does that with BOOTSTRAP_CACHE=true). It holds:
+
+    genesis/<sha256>.txn            genesis transactions, by content hash
+    sources/<sha256 of url>         content hash of the genesis last fetched from a url
+    ledgers/<genesis hash>/dids/    DID, seed and role registered by each agent on that ledger
+
+The genesis is fetched again on every start, the cached copy is only used when its url
+can't be reached. The ledger of a DID registration is identified by the hash of its
+genesis, so agents on another ledger don't see them. A ledger reset with the same genesis (e.g. a fresh
+von-network) is not detected: clear the cache (./manage clear-bootstrap-cache) when
+resetting the ledger. The backchannels check a cached DID is on the ledger anyway.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from typing import Optional
+
+BOOTSTRAP_CACHE_DIR = os.getenv("BOOTSTRAP_CACHE_DIR")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf8")).hexdigest()
+
+
+class BootstrapCache:
+    def __init__(self, directory: Optional[str] = BOOTSTRAP_CACHE_DIR):
+        self.directory = directory
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.directory, *parts)
+
+    def _read(self, path: str) -> Optional[str]:
+        try:
+            with open(path, "r") as cache_file:
+                return cache_file.read()
+        except OSError:
+            return None
+
+    def _write(self, path: str, text: str):
+        # write to a temporary file and rename it, as other backchannels may read it
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        (fd, tmp_path) = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as cache_file:
+            cache_file.write(text)
+        os.replace(tmp_path, path)
+
+    def get_genesis(self, source: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        genesis_hash = self._read(self._path("sources", content_hash(source)))
+        if not genesis_hash:
+            return None
+        return self._read(self._path("genesis", f"{genesis_hash}.txn"))
+
+    def put_genesis(self, source: str, genesis: str):
+        if not self.enabled or not genesis:
+            return
+        genesis_hash = content_hash(genesis)
+        self._write(self._path("genesis", f"{genesis_hash}.txn"), genesis)
+        self._write(self._path("sources", content_hash(source)), genesis_hash)
+
+    def _did_path(self, genesis: str, alias: str) -> str:
+        return self._path("ledgers", content_hash(genesis), "dids", content_hash(alias))
+
+    def get_did(self, genesis: str, alias: str) -> Optional[dict]:
+        """The DID registered for alias on the ledger of genesis: {did, verkey, seed, role}"""
+        if not self.enabled or not genesis:
+            return None
+        text = self._read(self._did_path(genesis, alias))
+        return json.loads(text) if text else None
+
+    def put_did(self, genesis: str, alias: str, did_info: dict):
+        if not self.enabled or not genesis:
+            return
+        self._write(self._did_path(genesis, alias), json.dumps(did_info))
+
+
+bootstrap_cache = BootstrapCache()
@@ -0,0 +1,95 @@
+"""
+Level-gated logging of backchannel events such as the webhooks received from the agent.
+
+BACKCHANNEL_LOG_LEVEL (default DEBUG) drops events below it before their payload is
+even looked at; webhook payloads are logged at DEBUG, so INFO leaves them out.
+
+BACKCHANNEL_LOG_FORMAT selects the output:
+
+    text   the default, the usual (pretty printed) log_msg output
+    json   one JSON object per line on stdout, written by a background thread, without
+           going through prompt_toolkit. Meant for non-interactive (docker) runs whose
+           logs are collected and searched afterwards.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from typing import Any
+
+from .json_text import dumps
+from .utils import log_msg
+
+BACKCHANNEL_LOG_FORMAT = os.getenv("BACKCHANNEL_LOG_FORMAT", "text").lower()
+
+BACKCHANNEL_LOG_LEVEL = logging.getLevelName(
+    os.getenv("BACKCHANNEL_LOG_LEVEL", "DEBUG").upper()
+)
+if not isinstance(BACKCHANNEL_LOG_LEVEL, int):
+    BACKCHANNEL_LOG_LEVEL = logging.DEBUG
+
+LOGGER = logging.getLogger("backchannel.events")
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": round(record.created, 6),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        line = dumps(entry)
+        payload_json = getattr(record, "payload_json", None)
+        if payload_json is not None:
+            # the payload as it was when logged, serialized by log_event
+            line = line[:-1] + ',"payload":' + payload_json + "}"
+        return line
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue the record as is, so it is formatted by the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _start_json_lines_listener() -> logging.handlers.QueueListener:
+    records = queue.SimpleQueue()
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonLinesFormatter())
+    listener = logging.handlers.QueueListener(records, output)
+    listener.start()
+    # write what is still queued on the way out
+    atexit.register(listener.stop)
+
+    LOGGER.addHandler(DeferredQueueHandler(records))
+    LOGGER.setLevel(BACKCHANNEL_LOG_LEVEL)
+    LOGGER.propagate = False
+    return listener
+
+
+if BACKCHANNEL_LOG_FORMAT == "json":
+    _listener = _start_json_lines_listener()
+
+
+def log_event(message: str, payload: Any = None, level: int = logging.INFO):
+    """Log an event and its (JSON) payload, if the level is enabled"""
+    if level < BACKCHANNEL_LOG_LEVEL:
+        return
+
+    if BACKCHANNEL_LOG_FORMAT == "json":
+        # serialize the payload now: the handlers go on changing it while the record
+        # waits for the listener thread, only writing it out is deferred
+        payload_json = None if payload is None else dumps(payload)
+        LOGGER.log(level, message, extra={"payload_json": payload_json})
+    elif payload is None:
+        log_msg(message)
+    else:
+        log_msg(f"{message}: " + json.dumps(payload, indent=4))
+
+
+def log_webhook(message: str, payload: Any):
+    log_event(message, payload, level=logging.DEBUG)
@@ -0,0 +1,66 @@
+"""
+JSON handling of the backchannel responses.
+
+Agent responses travel through the backchannel handlers as JsonText: the response
+text, carrying its parsed value along so that it is parsed at most once however many
+handlers look into it, and built from the translated value with a single serialization.
+orjson is used when it is installed, the standard json module otherwise.
+"""
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson else "json"
+
+_UNPARSED = object()
+
+
+def loads(text: str) -> Any:
+    if orjson:
+        # orjson only takes exact str, not subclasses like JsonText
+        return orjson.loads(str(text) if isinstance(text, str) else text)
+    return json.loads(text)
+
+
+def dumps(data: Any) -> str:
+    if orjson:
+        try:
+            return orjson.dumps(data).decode("utf8")
+        except TypeError:
+            # e.g. non-str keys or integers too large for orjson
+            pass
+    return json.dumps(data)
+
+
+class JsonText(str):
+    """
+    Response text with its parsed JSON value cached.
+
+    The parsed value is shared: after changing it, build a new JsonText from it rather
+    than keep using the old text.
+    """
+
+    def __new__(cls, text: str, parsed: Any = _UNPARSED):
+        obj = super().__new__(cls, text)
+        obj._parsed = parsed
+        return obj
+
+    @classmethod
+    def from_data(cls, data: Any) -> "JsonText":
+        return cls(dumps(data), data)
+
+    def json(self) -> Any:
+        if self._parsed is _UNPARSED:
+            self._parsed = loads(self)
+        return self._parsed
+
+
+def parse_json(text: str) -> Any:
+    """Parsed value of a response, without parsing JsonText again"""
+    if isinstance(text, JsonText):
+        return text.json()
+    return loads(text)
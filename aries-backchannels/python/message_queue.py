@@ -1,112 +1,201 @@
-import threading, asyncio
-
-message_queues = {}
-mq_lock = threading.Lock()
-
-
-def _get_queue(message_type):
-    if message_type in message_queues:
-        return message_queues[message_type]
-    else:
+import asyncio
+import os
+from timeit import default_timer
+
+# Max number of messages held per queue / stack (0 = unbounded); a full queue
+# blocks push_message_queue (up to MESSAGE_PUSH_TIMEOUT), a full stack drops its oldest message
+MESSAGE_QUEUE_MAXSIZE = int(os.getenv("MESSAGE_QUEUE_MAXSIZE", 1000))
+
+# Default seconds a push waits on a full queue before the message is dropped, so a
+# queue nobody pops can't block the (webhook) producer forever
+MESSAGE_PUSH_TIMEOUT = float(os.getenv("MESSAGE_PUSH_TIMEOUT", 10.0))
+
+# Upper bounds (seconds) of the pop wait-time histogram buckets
+WAIT_TIME_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+
+class DiscardingLifoQueue(asyncio.LifoQueue):
+    """
+    LIFO queue that drops its oldest message instead of blocking when full.
+
+    Stacks are used as a "latest message" fallback that is not always popped,
+    so blocking the (webhook) producer would never be relieved.
+    """
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self.discarded = 0
+
+    def full(self):
+        return False
+
+    def _put(self, item):
+        if 0 < self.maxsize <= len(self._queue):
+            del self._queue[0]
+            self.discarded += 1
+        super()._put(item)
+
+
+class MessageChannel:
+    """A queue or stack of messages of one type, plus its counters"""
+
+    def __init__(self, queue: asyncio.Queue):
+        self.queue = queue
+        self.pushed = 0
+        self.popped = 0
+        self.timeouts = 0
+        # messages dropped because the queue stayed full
+        self.discarded = 0
+        self.getters = 0
+        self.putters = 0
+        self.wait_time_sum = 0.0
+        self.wait_time_buckets = [0] * (len(WAIT_TIME_BUCKETS) + 1)
+
+    def record_wait(self, wait_time: float):
+        self.wait_time_sum += wait_time
+        for (index, bound) in enumerate(WAIT_TIME_BUCKETS):
+            if wait_time <= bound:
+                self.wait_time_buckets[index] += 1
+                return
+        self.wait_time_buckets[-1] += 1
+
+    def clear(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.queue.qsize(),
+            "maxsize": self.queue.maxsize,
+            "getters": self.getters,
+            "putters": self.putters,
+            "pushed": self.pushed,
+            "popped": self.popped,
+            "timeouts": self.timeouts,
+            "discarded": self.discarded + getattr(self.queue, "discarded", 0),
+            "wait_time_sum": self.wait_time_sum,
+            "wait_time_buckets": dict(
+                zip(
+                    [str(bound) for bound in WAIT_TIME_BUCKETS] + ["+Inf"],
+                    self.wait_time_buckets,
+                )
+            ),
+        }
+
+
+class MessageRegistry:
+    """
+    Registry of message channels owned by the event loop that uses them.
+
+    All access happens on that loop, so no locking is needed. If the registry is
+    used from a different loop, the channels (which are bound to the old loop)
+    are discarded.
+    """
+
+    def __init__(self, queue_class, maxsize: int = MESSAGE_QUEUE_MAXSIZE):
+        self.queue_class = queue_class
+        self.maxsize = maxsize
+        self.channels = {}
+        self.loop = None
+
+    def get(self, message_type) -> MessageChannel:
+        loop = asyncio.get_event_loop()
+        if loop is not self.loop:
+            self.loop = loop
+            self.channels = {}
+        channel = self.channels.get(message_type)
+        if channel is None:
+            channel = MessageChannel(self.queue_class(maxsize=self.maxsize))
+            self.channels[message_type] = channel
+        return channel
+
+    async def pop(self, message_type, timeout=0):
+        if timeout <= 0:
+            timeout = None
+
+        channel = self.get(message_type)
+        start = default_timer()
+        channel.getters += 1
+        try:
+            res = await asyncio.wait_for(channel.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            channel.timeouts += 1
+            raise
+        finally:
+            channel.getters -= 1
+        channel.popped += 1
+        channel.record_wait(default_timer() - start)
+        return res
+
+    async def push(self, message_type, value, timeout=0) -> bool:
+        """
+        Add a message, waiting up to timeout seconds (MESSAGE_PUSH_TIMEOUT if not
+        given) while the queue is full. Returns False if the message was dropped.
+        """
+        if timeout <= 0:
+            timeout = MESSAGE_PUSH_TIMEOUT
+
+        channel = self.get(message_type)
+        channel.putters += 1
         try:
-            mq_lock.acquire()
-            if message_type in message_queues:
-                return message_queues[message_type]
-            else:
-                selected_queue = asyncio.Queue()
-                message_queues[message_type] = selected_queue
-                return selected_queue
+            # blocks (backpressure) while a queue is at maxsize
+            await asyncio.wait_for(channel.queue.put(value), timeout)
+        except asyncio.TimeoutError:
+            channel.discarded += 1
+            return False
         finally:
-            mq_lock.release()
+            channel.putters -= 1
+        channel.pushed += 1
+        return True
 
+    def clear(self):
+        # drain instead of dropping the channels, so pending pops stay attached
+        for (message_type, channel) in list(self.channels.items()):
+            channel.clear()
+            if not channel.getters and not channel.putters:
+                del self.channels[message_type]
 
-async def pop_message_queue(message_type, timeout=0):
-    print(f"calling message_queue.pop_message_queue({message_type}, {timeout})")
-    if timeout <= 0:
-        timeout = None
+    def stats(self, message_type=None) -> dict:
+        if message_type is not None:
+            channel = self.channels.get(message_type)
+            return channel.stats() if channel else {}
+        return {
+            message_type: channel.stats()
+            for (message_type, channel) in self.channels.items()
+        }
 
-    selected_queue = _get_queue(message_type)
 
-    res = await asyncio.wait_for(
-        asyncio.shield(message_queues[message_type].get()), timeout
-    )
-    print(
-        f"finished message_queue.pop_message_queue({message_type}, {timeout}) -> {res}"
-    )
-    return res
+message_queues = MessageRegistry(asyncio.Queue)
+message_stacks = MessageRegistry(DiscardingLifoQueue)
 
 
-async def push_message_queue(message_type, value, timeout=0):
-    print(
-        f"calling message_queue.push_message_queue({message_type}, {value}, {timeout})"
-    )
-    if timeout <= 0:
-        timeout = None
+async def pop_message_queue(message_type, timeout=0):
+    return await message_queues.pop(message_type, timeout)
 
-    selected_queue = _get_queue(message_type)
 
-    await asyncio.wait_for(asyncio.shield(selected_queue.put(value)), timeout)
-    print(
-        f"finished message_queue.push_message_queue({message_type}, {value}, {timeout})"
-    )
+async def push_message_queue(message_type, value, timeout=0) -> bool:
+    return await message_queues.push(message_type, value, timeout)
 
 
 async def clear_all():
-    try:
-        mq_lock.acquire()
-        message_queues = {}
-    finally:
-        mq_lock.release()
-
-
-message_stacks = {}
-ms_lock = threading.Lock()
-
-
-def _get_stack(message_type):
-    if message_type in message_stacks:
-        return message_stacks[message_type]
-    else:
-        try:
-            ms_lock.acquire()
-            if message_type in message_stacks:
-                return message_stacks[message_type]
-            else:
-                selected_stack = asyncio.LifoQueue()
-                message_stacks[message_type] = selected_stack
-                return selected_stack
-        finally:
-            ms_lock.release()
+    message_queues.clear()
 
 
 async def pop_message_stack(message_type, timeout=0):
-    print(f"calling message_stack.pop_message({message_type}, {timeout})")
-    if timeout <= 0:
-        timeout = None
+    return await message_stacks.pop(message_type, timeout)
 
-    selected_stack = _get_stack(message_type)
 
-    res = await asyncio.wait_for(
-        asyncio.shield(message_stacks[message_type].get()), timeout
-    )
-    print(f"finished message_stack.pop_message({message_type}, {timeout}) -> {res}")
-    return res
+async def push_message_stack(message_type, value, timeout=0) -> bool:
+    return await message_stacks.push(message_type, value, timeout)
 
 
-async def push_message_stack(message_type, value, timeout=0):
-    print(f"calling message_stack.push_message({message_type}, {value}, {timeout})")
-    if timeout <= 0:
-        timeout = None
-
-    selected_stack = _get_stack(message_type)
-
-    await asyncio.wait_for(asyncio.shield(selected_stack.put(value)), timeout)
-    print(f"finished message_stack.push_message({message_type}, {value}, {timeout})")
+async def clear_all_stacks():
+    message_stacks.clear()
 
 
-async def clear_all_stacks():
-    try:
-        ms_lock.acquire()
-        message_stacks = {}
-    finally:
-        ms_lock.release()
+def get_message_queue_stats(message_type=None) -> dict:
+    """Counters (depth, waiters, wait-time histogram) of the message queues and stacks"""
+    return {
+        "queues": message_queues.stats(message_type),
+        "stacks": message_stacks.stats(message_type),
+    }
@@ -0,0 +1,181 @@
+import threading
+from collections import OrderedDict
+from typing import Iterable
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labelnames, labelvalues, extra: str = "") -> str:
+    pairs = [
+        f'{name}="{_escape(value)}"' for (name, value) in zip(labelnames, labelvalues)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, per combination of label values"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self.values.items())
+        for (key, value) in values:
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Histogram:
+    """Cumulative bucket histogram, per combination of label values"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., +Inf count, sum]
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1) + [0.0]
+                self.values[key] = counts
+            for (index, bound) in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, list(counts)) for (key, counts) in self.values.items())
+        for (key, counts) in values:
+            cumulative = 0
+            for (bound, count) in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = 'le="' + (bound if bound == "+Inf" else repr(float(bound))) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(counts[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+class MetricsRegistry:
+    """The metrics of a backchannel, rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self.metrics = OrderedDict()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+webhooks_received = metrics.counter(
+    "backchannel_webhooks_received_total",
+    "Webhooks received from the agent",
+    ["topic"],
+)
+webhook_handling_seconds = metrics.histogram(
+    "backchannel_webhook_handling_seconds",
+    "Time spent by the backchannel handling a webhook from the agent",
+    ["topic"],
+)
+webhook_to_response_seconds = metrics.histogram(
+    "backchannel_webhook_to_response_seconds",
+    "Time from the last webhook for a record to a /agent/response request returning it",
+    ["topic"],
+)
+response_wait_seconds = metrics.histogram(
+    "backchannel_response_wait_seconds",
+    "Time a /agent/response consumer waited for its response",
+    ["topic", "status"],
+)
+storage_residence_seconds = metrics.histogram(
+    "backchannel_storage_residence_seconds",
+    "Time a webhook message sat in the backchannel storage before it was popped",
+    ["data_type"],
+)
+request_seconds = metrics.histogram(
+    "backchannel_request_seconds",
+    "Time spent handling a backchannel request",
+    ["method", "topic"],
+)
+request_agent_seconds = metrics.histogram(
+    "backchannel_request_agent_seconds",
+    "Part of a backchannel request spent waiting on the agent (admin API, ledger)",
+    ["method", "topic"],
+)
+
+
+def render_metrics() -> str:
+    return metrics.render()
@@ -1,9 +1,49 @@
+import asyncio
+import json
+import os
 import threading
+from collections import OrderedDict, deque
+from timeit import default_timer
 
+from .metrics import storage_residence_seconds
 
-storage = {}
+# Retention policy for the webhook store. A value of 0 disables the limit.
+# Eviction works on whole data_ids (threads), least recently used first.
+STORAGE_MAX_ENTRIES = int(os.getenv("STORAGE_MAX_ENTRIES", 10_000))
+STORAGE_MAX_BYTES = int(os.getenv("STORAGE_MAX_BYTES", 64 * 1024 * 1024))
+STORAGE_TTL = float(os.getenv("STORAGE_TTL", 3600))
+
+# storage[data_id][data_type] holds either a single stored value (store_resource)
+# or a deque of pushed values in arrival order (push_resource).
+# data_ids are kept in least recently used order.
+storage = OrderedDict()
 storage_lock = threading.Lock()
 
+# Estimated size (bytes) of every stored value, mirroring the layout of storage:
+# resource_sizes[data_id][data_type] is an int or a deque of ints
+resource_sizes = {}
+# Last time (default_timer) each data_id was touched, oldest first
+resource_touched = {}
+# Time (default_timer) each pushed value was stored, mirroring the deques of storage,
+# to measure how long messages sit in storage before they are popped
+resource_pushed = {}
+storage_stats = {
+    "entries": 0,
+    "bytes": 0,
+    "evicted_entries": 0,
+    "evicted_bytes": 0,
+    "evicted_expired": 0,
+    "evicted_lru": 0,
+}
+
+# data_type -> data_id of the most recent push_resource for that data_type,
+# so the "latest" lookups don't need to scan or copy the storage keys
+latest_data_ids = {}
+
+# futures of coroutines blocked in wait_pop_resource / wait_pop_resource_latest,
+# keyed by (data_id, data_type), or (None, data_type) when waiting for the latest
+resource_waiters = {}
+
 # data_id is the thread_id (at least as used by aca-py)
 # the exchange_id is specific to the protocol (e.g. cred or proof exchange)
 data_to_exch_id = {}
@@ -28,6 +68,14 @@ def add_data_exch_mapping(data_id, data_type, data, exch_id_name):
     exch_to_data_id[mapping_name][exch_id] = data_id
 
 
+def _remove_data_exch_mappings(data_id):
+    # must be called with the storage lock held
+    for mapping_name, mapping in data_to_exch_id.items():
+        exch_id = mapping.pop(data_id, None)
+        if exch_id is not None:
+            exch_to_data_id.get(mapping_name, {}).pop(exch_id, None)
+
+
 def get_data_id_from_exch_id(data_type, exch_id_name, exch_id):
     mapping_name = data_exch_mapping_name(data_type, exch_id_name)
     if mapping_name in exch_to_data_id:
@@ -42,13 +90,105 @@ def get_exch_id_from_data_id(data_type, exch_id_name, data_id):
     return None
 
 
+def estimate_size(data):
+    try:
+        return len(json.dumps(data, default=str))
+    except (TypeError, ValueError):
+        return len(str(data))
+
+
+def _touch(data_id):
+    # must be called with the storage lock held
+    storage.move_to_end(data_id)
+    resource_touched.pop(data_id, None)
+    resource_touched[data_id] = default_timer()
+
+
+def _account(sizes):
+    # total (entries, bytes) of an int or deque of ints from resource_sizes
+    if isinstance(sizes, deque):
+        return (len(sizes), sum(sizes))
+    return (1, sizes)
+
+
+def _discard(data_id, data_type=None):
+    # must be called with the storage lock held
+    # returns the (entries, bytes) that were removed
+    sizes = resource_sizes.get(data_id, {})
+    data_types = [data_type] if data_type is not None else list(sizes)
+    entries = 0
+    size = 0
+    for d_type in data_types:
+        if d_type in sizes:
+            (n, b) = _account(sizes.pop(d_type))
+            entries += n
+            size += b
+        storage.get(data_id, {}).pop(d_type, None)
+        resource_pushed.get(data_id, {}).pop(d_type, None)
+    if data_id in storage and not storage[data_id]:
+        del storage[data_id]
+        resource_sizes.pop(data_id, None)
+        resource_touched.pop(data_id, None)
+        resource_pushed.pop(data_id, None)
+        _remove_data_exch_mappings(data_id)
+    storage_stats["entries"] -= entries
+    storage_stats["bytes"] -= size
+    return (entries, size)
+
+
+def _evict(data_id, reason):
+    # must be called with the storage lock held
+    (entries, size) = _discard(data_id)
+    # empty deques left behind by pops don't count as entries, drop them as well
+    storage.pop(data_id, None)
+    resource_sizes.pop(data_id, None)
+    resource_touched.pop(data_id, None)
+    resource_pushed.pop(data_id, None)
+    storage_stats["evicted_entries"] += entries
+    storage_stats["evicted_bytes"] += size
+    storage_stats["evicted_" + reason] += 1
+
+
+def _enforce_retention(keep_data_id=None):
+    # must be called with the storage lock held
+    if STORAGE_TTL > 0:
+        expiry = default_timer() - STORAGE_TTL
+        # resource_touched is ordered by last access, so expired data_ids come first
+        while resource_touched:
+            data_id = next(iter(resource_touched))
+            if resource_touched[data_id] > expiry:
+                break
+            _evict(data_id, "expired")
+
+    def over_limit():
+        return (STORAGE_MAX_ENTRIES and storage_stats["entries"] > STORAGE_MAX_ENTRIES) or (
+            STORAGE_MAX_BYTES and storage_stats["bytes"] > STORAGE_MAX_BYTES
+        )
+
+    while over_limit():
+        # storage is kept in LRU order, oldest first
+        data_id = next(iter(storage), None)
+        if data_id is None or data_id == keep_data_id:
+            break
+        _evict(data_id, "lru")
+
+
 def store_resource(data_id, data_type, data, exch_id_name=None):
     storage_lock.acquire()
     try:
+        if data_id in storage and data_type in storage[data_id]:
+            _discard(data_id, data_type)
         if data_id not in storage:
             storage[data_id] = {}
+            resource_sizes[data_id] = {}
+        size = estimate_size(data)
         storage[data_id][data_type] = data
+        resource_sizes[data_id][data_type] = size
+        storage_stats["entries"] += 1
+        storage_stats["bytes"] += size
+        _touch(data_id)
         add_data_exch_mapping(data_id, data_type, data, exch_id_name)
+        _enforce_retention(keep_data_id=data_id)
         return data
     finally:
         storage_lock.release()
@@ -59,21 +199,28 @@ def get_resource(data_id, data_type):
     try:
         if data_id in storage:
             if data_type in storage[data_id]:
+                _touch(data_id)
                 return storage[data_id][data_type]
         return None
     finally:
         storage_lock.release()
 
 
+def _latest_resources(data_type):
+    # must be called with the storage lock held
+    data_id = latest_data_ids.get(data_type)
+    if data_id is None:
+        return None
+    return storage.get(data_id, {}).get(data_type)
+
+
 def get_resource_latest(data_type):
     storage_lock.acquire()
     try:
-        data_ids = list(storage.keys())
-        data_id = data_ids[-1]
-        # data_type_keys = list(storage[data_id].keys())
-        # data_type = data_type_keys[-1]
-        data = storage[data_id][data_type][-1]
-        return data
+        resources = _latest_resources(data_type)
+        if resources:
+            return resources[-1]
+        return None
     finally:
         storage_lock.release()
 
@@ -96,22 +243,135 @@ def delete_resource(data_id, data_type):
         if data_id in storage:
             if data_type in storage[data_id]:
                 stored_data = storage[data_id][data_type]
-                del storage[data_id][data_type]
+                _discard(data_id, data_type)
                 return stored_data
         return None
     finally:
         storage_lock.release()
 
 
+def clear_resource(data_id=None, data_type=None):
+    """
+    Remove stored resources: everything, everything for a data_id, or a
+    single (data_id, data_type)
+    """
+    storage_lock.acquire()
+    try:
+        if data_id is None:
+            storage.clear()
+            resource_sizes.clear()
+            resource_touched.clear()
+            resource_pushed.clear()
+            latest_data_ids.clear()
+            data_to_exch_id.clear()
+            exch_to_data_id.clear()
+            storage_stats["entries"] = 0
+            storage_stats["bytes"] = 0
+        elif data_id in storage:
+            _discard(data_id, data_type)
+    finally:
+        storage_lock.release()
+
+
+def get_storage_stats():
+    storage_lock.acquire()
+    try:
+        if STORAGE_TTL > 0:
+            _enforce_retention()
+        data_types = {}
+        for sizes in resource_sizes.values():
+            for (data_type, type_sizes) in sizes.items():
+                (entries, size) = _account(type_sizes)
+                stats = data_types.setdefault(data_type, {"entries": 0, "bytes": 0})
+                stats["entries"] += entries
+                stats["bytes"] += size
+        return {
+            **storage_stats,
+            "data_ids": len(storage),
+            "waiters": sum(len(waiters) for waiters in resource_waiters.values()),
+            "data_types": data_types,
+            "limits": {
+                "max_entries": STORAGE_MAX_ENTRIES,
+                "max_bytes": STORAGE_MAX_BYTES,
+                "ttl": STORAGE_TTL,
+            },
+        }
+    finally:
+        storage_lock.release()
+
+
+def _wake_waiters(key):
+    # must be called with the storage lock held
+    for waiter in resource_waiters.pop(key, []):
+        if not waiter.done():
+            # push_resource may be called from a thread other than the waiter's loop
+            waiter.get_loop().call_soon_threadsafe(_set_waiter_result, waiter)
+
+
+def _set_waiter_result(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def _record_residence(data_id, data_type, newest=False):
+    # must be called with the storage lock held
+    pushed = resource_pushed.get(data_id, {}).get(data_type)
+    if pushed:
+        pushed_at = pushed.pop() if newest else pushed.popleft()
+        storage_residence_seconds.observe(
+            default_timer() - pushed_at, data_type=data_type
+        )
+
+
+def _pop_resource(data_id, data_type):
+    # must be called with the storage lock held
+    resources = storage.get(data_id, {}).get(data_type)
+    if resources:
+        sizes = resource_sizes[data_id][data_type]
+        storage_stats["entries"] -= 1
+        storage_stats["bytes"] -= sizes.popleft()
+        _record_residence(data_id, data_type)
+        _touch(data_id)
+        return resources.popleft()
+    return None
+
+
+def _pop_resource_latest(data_type):
+    # must be called with the storage lock held
+    resources = _latest_resources(data_type)
+    if resources:
+        data_id = latest_data_ids[data_type]
+        sizes = resource_sizes[data_id][data_type]
+        storage_stats["entries"] -= 1
+        storage_stats["bytes"] -= sizes.pop()
+        _record_residence(data_id, data_type, newest=True)
+        _touch(data_id)
+        return resources.pop()
+    return None
+
+
 def push_resource(data_id, data_type, data, exch_id_name=None):
     storage_lock.acquire()
     try:
         if data_id not in storage:
             storage[data_id] = {}
+            resource_sizes[data_id] = {}
         if data_type not in storage[data_id]:
-            storage[data_id][data_type] = []
+            storage[data_id][data_type] = deque()
+            resource_sizes[data_id][data_type] = deque()
+            resource_pushed.setdefault(data_id, {})[data_type] = deque()
+        size = estimate_size(data)
         storage[data_id][data_type].append(data)
+        resource_sizes[data_id][data_type].append(size)
+        resource_pushed[data_id][data_type].append(default_timer())
+        storage_stats["entries"] += 1
+        storage_stats["bytes"] += size
+        _touch(data_id)
+        latest_data_ids[data_type] = data_id
         add_data_exch_mapping(data_id, data_type, data, exch_id_name)
+        _enforce_retention(keep_data_id=data_id)
+        _wake_waiters((data_id, data_type))
+        _wake_waiters((None, data_type))
         return data
     finally:
         storage_lock.release()
@@ -120,13 +380,7 @@ def push_resource(data_id, data_type, data, exch_id_name=None):
 def pop_resource(data_id, data_type):
     storage_lock.acquire()
     try:
-        if data_id in storage:
-            if data_type in storage[data_id]:
-                if 0 < len(storage[data_id][data_type]):
-                    data = storage[data_id][data_type][0]
-                    del storage[data_id][data_type][0]
-                    return data
-        return None
+        return _pop_resource(data_id, data_type)
     finally:
         storage_lock.release()
 
@@ -134,17 +388,59 @@ def pop_resource(data_id, data_type):
 def pop_resource_latest(data_type):
     storage_lock.acquire()
     try:
-        data_ids = list(storage.keys())
-        data_id = data_ids[len(data_ids) - 1]
-        if data_type in storage[data_id]:
-            if 0 < len(storage[data_id][data_type]):
-                if len(storage[data_id][data_type]) > 1:
-                    data = storage[data_id][data_type][-1]
-                    del storage[data_id][data_type][-1]
-                else:
-                    data = storage[data_id][data_type][0]
-                    del storage[data_id][data_type][0]
-                return data
-        return None
+        return _pop_resource_latest(data_type)
     finally:
         storage_lock.release()
+
+
+async def _wait_pop(key, pop, timeout):
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + timeout
+    while True:
+        storage_lock.acquire()
+        try:
+            data = pop()
+            if data is not None:
+                return data
+            waiter = loop.create_future()
+            resource_waiters.setdefault(key, []).append(waiter)
+        finally:
+            storage_lock.release()
+
+        remaining = deadline - loop.time()
+        try:
+            if remaining <= 0:
+                return None
+            await asyncio.wait_for(waiter, remaining)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            storage_lock.acquire()
+            try:
+                waiters = resource_waiters.get(key, [])
+                if waiter in waiters:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del resource_waiters[key]
+            finally:
+                storage_lock.release()
+
+
+async def wait_pop_resource(data_id, data_type, timeout):
+    """
+    Pop the oldest resource stored for (data_id, data_type), waiting up to
+    `timeout` seconds for one to be pushed. Returns None on timeout.
+    """
+    return await _wait_pop(
+        (data_id, data_type), lambda: _pop_resource(data_id, data_type), timeout
+    )
+
+
+async def wait_pop_resource_latest(data_type, timeout):
+    """
+    Pop the latest resource of data_type (see pop_resource_latest), waiting up
+    to `timeout` seconds for one to be pushed. Returns None on timeout.
+    """
+    return await _wait_pop(
+        (None, data_type), lambda: _pop_resource_latest(data_type), timeout
+    )
@@ -0,0 +1,75 @@
+"""
+Colorized output to an interactive terminal, with prompt_toolkit and pygments.
+
+Only imported by utils when the backchannel has a terminal to write to.
+"""
+import prompt_toolkit
+import pygments
+from prompt_toolkit.application import run_in_terminal
+from prompt_toolkit.formatted_text import FormattedText, PygmentsTokens
+from pygments.filter import Filter
+from pygments.lexer import Lexer
+from pygments.lexers.data import JsonLdLexer
+
+__all__ = ["JsonLdLexer", "print_colored", "print_lexer", "run_in_terminal"]
+
+
+class PrefixFilter(Filter):
+    def __init__(self, **options):
+        Filter.__init__(self, **options)
+        self.prefix = options.get("prefix")
+
+    def lines(self, stream):
+        line = []
+        for ttype, value in stream:
+            if "\n" in value:
+                parts = value.split("\n")
+                value = parts.pop()
+                for part in parts:
+                    line.append((ttype, part))
+                    line.append((ttype, "\n"))
+                    yield line
+                    line = []
+            line.append((ttype, value))
+        if line:
+            yield line
+
+    def filter(self, lexer, stream):
+        if isinstance(self.prefix, str):
+            prefix = ((pygments.token.Generic, self.prefix),)
+        elif self.prefix:
+            prefix = self.prefix
+        else:
+            prefix = ()
+        for line in self.lines(stream):
+            yield from prefix
+            yield from line
+
+
+def print_lexer(
+    body: str, lexer: Lexer, label: str = None, prefix: str = None, indent: int = None
+):
+    prefix_str = prefix + " " if prefix else ""
+    if prefix_str or indent:
+        prefix_body = prefix_str + " " * (indent or 0)
+        lexer.add_filter(PrefixFilter(prefix=prefix_body))
+    tokens = list(pygments.lex(body, lexer=lexer))
+    if label:
+        fmt_label = [("fg:ansimagenta", label)]
+        if prefix_str:
+            fmt_label.insert(0, ("", prefix_str))
+        print_formatted(FormattedText(fmt_label))
+    print_formatted(PygmentsTokens(tokens))
+
+
+def print_colored(text: str, color: str, label: str = None, prefix: str = None, **kwargs):
+    msg = [(color, text)]
+    if prefix:
+        msg.insert(0, ("", prefix + " "))
+    if label:
+        msg.insert(0, ("fg:ansimagenta", label + "\n"))
+    print_formatted(FormattedText(msg), **kwargs)
+
+
+def print_formatted(*args, **kwargs):
+    prompt_toolkit.print_formatted_text(*args, **kwargs)
@@ -1,75 +1,78 @@
+import atexit
 import functools
 import json
 import os
+import sys
+import threading
+import time
 import uuid
 
 from timeit import default_timer
 
 import asyncio
-import prompt_toolkit
-from prompt_toolkit.application import run_in_terminal
-from prompt_toolkit.shortcuts import PromptSession
-from prompt_toolkit.patch_stdout import patch_stdout
-
-import pygments
-from pygments.filter import Filter
-from pygments.lexer import Lexer
-from pygments.lexers.data import JsonLdLexer
-from prompt_toolkit.formatted_text import FormattedText, PygmentsTokens
 
 COLORIZE = bool(os.getenv("COLORIZE", True))
 MAIN_LOOP = asyncio.get_event_loop()
-session = PromptSession()
-
-class PrefixFilter(Filter):
-    def __init__(self, **options):
-        Filter.__init__(self, **options)
-        self.prefix = options.get("prefix")
-
-    def lines(self, stream):
-        line = []
-        for ttype, value in stream:
-            if "\n" in value:
-                parts = value.split("\n")
-                value = parts.pop()
-                for part in parts:
-                    line.append((ttype, part))
-                    line.append((ttype, "\n"))
-                    yield line
-                    line = []
-            line.append((ttype, value))
-        if line:
-            yield line
-
-    def filter(self, lexer, stream):
-        if isinstance(self.prefix, str):
-            prefix = ((pygments.token.Generic, self.prefix),)
-        elif self.prefix:
-            prefix = self.prefix
-        else:
-            prefix = ()
-        for line in self.lines(stream):
-            yield from prefix
-            yield from line
-
 
-def print_lexer(
-    body: str, lexer: Lexer, label: str = None, prefix: str = None, indent: int = None
-):
-    if COLORIZE:
-        prefix_str = prefix + " " if prefix else ""
-        if prefix_str or indent:
-            prefix_body = prefix_str + " " * (indent or 0)
-            lexer.add_filter(PrefixFilter(prefix=prefix_body))
-        tokens = list(pygments.lex(body, lexer=lexer))
-        if label:
-            fmt_label = [("fg:ansimagenta", label)]
-            if prefix_str:
-                fmt_label.insert(0, ("", prefix_str))
-            print_formatted(FormattedText(fmt_label))
-        print_formatted(PygmentsTokens(tokens))
-    else:
-        print_ext(body, label=label, prefix=prefix)
+# Without a terminal (e.g. output piped to a file or a log collector) the output is
+# written as plain text, in batches, and prompt_toolkit and pygments are never loaded.
+# BACKCHANNEL_HEADLESS=true/false overrides the detection, e.g. for "docker run -t".
+if os.getenv("BACKCHANNEL_HEADLESS"):
+    HEADLESS = os.getenv("BACKCHANNEL_HEADLESS").lower() in ("1", "true", "yes")
+else:
+    HEADLESS = not sys.stdout.isatty()
+
+HEADLESS_FLUSH_INTERVAL = 0.1
+HEADLESS_FLUSH_SIZE = 64 * 1024
+
+
+class BatchedOutput:
+    """
+    File-like output collecting the writes of any thread, written out to the stream in
+    batches: every HEADLESS_FLUSH_INTERVAL seconds, or once HEADLESS_FLUSH_SIZE
+    characters are pending. Writes to sys.stdout (as it is when flushed) by default.
+    """
+
+    def __init__(self, interval: float, max_pending: int, stream=None):
+        self.stream = stream
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = []
+        self._pending_size = 0
+        self._lock = threading.Lock()
+        self._writer = None
+
+    def write(self, text: str) -> int:
+        with self._lock:
+            self._pending.append(text)
+            self._pending_size += len(text)
+            full = self._pending_size >= self.max_pending
+            if not self._writer:
+                self._writer = threading.Thread(target=self._write_batches, daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+        if full:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            batch = "".join(self._pending)
+            self._pending = []
+            self._pending_size = 0
+            # written while holding the lock, so batches don't interleave
+            if batch:
+                stream = self.stream or sys.stdout
+                stream.write(batch)
+                stream.flush()
+
+    def _write_batches(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+
+headless_output = BatchedOutput(HEADLESS_FLUSH_INTERVAL, HEADLESS_FLUSH_SIZE)
 
 
 def print_json(data, label: str = None, prefix: str = None, indent: int = 2):
@@ -77,11 +80,12 @@ def print_json(data, label: str = None, prefix: str = None, indent: int = 2):
         data = json.loads(data)
     data = json.dumps(data, indent=2)
     prefix_str = prefix or ""
-    print_lexer(data, JsonLdLexer(), label=label, prefix=prefix_str, indent=indent)
-
+    if COLORIZE and not HEADLESS:
+        from .terminal import JsonLdLexer, print_lexer
 
-def print_formatted(*args, **kwargs):
-    prompt_toolkit.print_formatted_text(*args, **kwargs)
+        print_lexer(data, JsonLdLexer(), label=label, prefix=prefix_str, indent=indent)
+    else:
+        print_ext(data, label=label, prefix=prefix_str)
 
 
 def print_ext(
@@ -95,13 +99,12 @@ def print_ext(
     prefix_str = prefix or ""
     if indent:
         prefix_str += " " * indent
-    if color and COLORIZE:
-        msg = [(color, " ".join(map(str, msg)))]
-        if prefix_str:
-            msg.insert(0, ("", prefix_str + " "))
-        if label:
-            msg.insert(0, ("fg:ansimagenta", label + "\n"))
-        print_formatted(FormattedText(msg), **kwargs)
+    if HEADLESS:
+        kwargs.setdefault("file", headless_output)
+    elif color and COLORIZE:
+        from .terminal import print_colored
+
+        print_colored(" ".join(map(str, msg)), color, label=label, prefix=prefix_str, **kwargs)
         return
     if label:
         print(label, **kwargs)
@@ -110,6 +113,12 @@ def print_ext(
     print(*msg, **kwargs)
 
 def _run_in_main(func):
+    if HEADLESS:
+        # the batched output is thread safe, no need to wait for the main loop
+        func()
+        return
+    from .terminal import run_in_terminal
+
     MAIN_LOOP.call_soon_threadsafe(run_in_terminal, func)
 
 def output_reader(handle, callback, *args, **kwargs):
@@ -150,6 +159,9 @@ def prompt_init():
 
 
 async def prompt(*args, **kwargs):
+    from prompt_toolkit.patch_stdout import patch_stdout
+    from prompt_toolkit.shortcuts import PromptSession
+
     prompt_init()
     with patch_stdout():
         try:
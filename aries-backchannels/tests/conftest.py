@@ -0,0 +1,127 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from aiohttp import web
+
+# the backchannels import their shared code as "python.<module>" from this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FAKE_ADMIN_PORT = int(os.getenv("FAKE_ADMIN_PORT", "8799"))
+
+CONNECTION_RECORD = {
+    "connection_id": "conn-1",
+    "state": "active",
+    "their_role": "invitee",
+    "connection_protocol": "connections/1.0",
+    "their_did": "did:sov:theirs",
+    "my_did": "did:sov:mine",
+}
+
+CRED_EX_RECORD = {
+    "cred_ex_record": {
+        "cred_ex_id": "cred-ex-1",
+        "thread_id": "thread-1",
+        "state": "offer-received",
+        "connection_id": "conn-1",
+    },
+    "indy": {},
+    "ld_proof": None,
+}
+
+PRES_EX_RECORD = {
+    "pres_ex_id": "pres-ex-1",
+    "thread_id": "thread-1",
+    "state": "request-received",
+    "connection_id": "conn-1",
+}
+
+
+def fake_admin_app() -> web.Application:
+    """Canned ACA-Py admin API responses, so only the backchannel's own work is measured"""
+
+    async def create_invitation(request):
+        return web.json_response(
+            {
+                "connection_id": "conn-1",
+                "invitation": {"@id": "inv-1", "label": "Bench"},
+                "invitation_url": "http://localhost/?c_i=abc",
+                "state": "invitation",
+            }
+        )
+
+    async def connection(request):
+        return web.json_response(CONNECTION_RECORD)
+
+    async def cred_ex_record(request):
+        return web.json_response(CRED_EX_RECORD)
+
+    async def pres_ex_record(request):
+        return web.json_response(PRES_EX_RECORD)
+
+    app = web.Application()
+    app.add_routes(
+        [
+            web.post("/connections/create-invitation", create_invitation),
+            web.get("/connections/{id}", connection),
+            web.get("/issue-credential-2.0/records/{id}", cred_ex_record),
+            web.get("/present-proof-2.0/records/{id}", pres_ex_record),
+        ]
+    )
+    return app
+
+
+@pytest.fixture(scope="session", autouse=True)
+def quiet_headless_output():
+    """Keep formatting the backchannel log messages, but don't write them out"""
+    from python import utils
+
+    with open(os.devnull, "w") as devnull:
+        utils.headless_output.stream = devnull
+        yield
+        utils.headless_output.flush()
+        utils.headless_output.stream = None
+
+
+@pytest.fixture(scope="session")
+def bench_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def fake_admin_api(bench_loop):
+    runner = web.AppRunner(fake_admin_app())
+    bench_loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", FAKE_ADMIN_PORT)
+    bench_loop.run_until_complete(site.start())
+    yield f"http://127.0.0.1:{FAKE_ADMIN_PORT}"
+    bench_loop.run_until_complete(runner.cleanup())
+
+
+@pytest.fixture(scope="session")
+def acapy_backchannel(bench_loop, fake_admin_api):
+    acapy_backchannel = pytest.importorskip("acapy.acapy_backchannel")
+
+    async def create():
+        backchannel = acapy_backchannel.AcaPyAgentBackchannel(
+            "bench", {"admin": FAKE_ADMIN_PORT, "http": 0, "ws": 0}
+        )
+        backchannel.admin_url = fake_admin_api
+        return backchannel
+
+    backchannel = bench_loop.run_until_complete(create())
+    yield backchannel
+    bench_loop.run_until_complete(backchannel.client_session.close())
+
+
+@pytest.fixture
+def run(bench_loop):
+    """Run a coroutine on the shared event loop"""
+
+    def run(coroutine):
+        return bench_loop.run_until_complete(coroutine)
+
+    return run
@@ -0,0 +1,92 @@
+import sys
+import time
+
+from python.agent_process import AgentLogBuffer, AgentProcess
+
+
+def test_log_buffer_drops_oldest_lines():
+    buffer = AgentLogBuffer(max_bytes=10)
+    for line in ("aaaa\n", "bbbb\n", "cccc\n"):
+        buffer.append("stdout", line)
+
+    assert [entry["line"] for entry in buffer.since()["lines"]] == ["bbbb\n", "cccc\n"]
+    assert buffer.size == 10
+    assert buffer.dropped == 1
+
+
+def test_log_buffer_keeps_a_line_over_the_limit():
+    buffer = AgentLogBuffer(max_bytes=4)
+    buffer.append("stdout", "a long line\n")
+    assert len(buffer.since()["lines"]) == 1
+
+
+def test_log_buffer_since():
+    buffer = AgentLogBuffer(max_bytes=100)
+    buffer.append("stdout", "before\n")
+    time.sleep(0.01)
+    start = time.time()
+    buffer.append("stderr", "after\n")
+
+    log = buffer.since(start)
+    assert [(e["source"], e["line"]) for e in log["lines"]] == [("stderr", "after\n")]
+    assert not log["truncated"]
+
+
+def test_log_buffer_truncated():
+    buffer = AgentLogBuffer(max_bytes=10)
+    start = time.time()
+    for line in ("aaaa\n", "bbbb\n", "cccc\n"):
+        buffer.append("stdout", line)
+
+    # the first line asked for was dropped
+    assert buffer.since(start)["truncated"]
+    # the lines asked for are all still there
+    assert not buffer.since(time.time())["truncated"]
+
+
+def test_log_buffer_clear():
+    buffer = AgentLogBuffer(max_bytes=100)
+    buffer.append("stdout", "line\n")
+    buffer.clear()
+    assert buffer.since()["lines"] == []
+    assert buffer.size == 0
+
+
+def test_agent_process_output(run):
+    buffer = AgentLogBuffer()
+    output = []
+
+    async def run_agent():
+        process = await AgentProcess.start(
+            [
+                sys.executable,
+                "-c",
+                "import sys; print('out'); print('err', file=sys.stderr);"
+                " sys.stdout.write('last')",
+            ],
+            {},
+            lambda text, source: output.append((source, text)),
+            buffer,
+        )
+        await process.proc.wait()
+        await process.terminate()
+        return process
+
+    process = run(run_agent())
+    assert process.poll() == 0
+    assert sorted(output) == [("stderr", "err\n"), ("stdout", "last"), ("stdout", "out\n")]
+    assert len(buffer.since()["lines"]) == 3
+
+
+def test_agent_process_terminate(run):
+    async def run_agent():
+        process = await AgentProcess.start(
+            [sys.executable, "-c", "import time; time.sleep(30)"],
+            {},
+            lambda text, source: None,
+            AgentLogBuffer(),
+        )
+        await process.terminate(timeout=5)
+        return process
+
+    assert run(run_agent()).returncode is not None
@@ -0,0 +1,143 @@
+import os
+
+import pytest
+from aiohttp import web
+
+from python.agent_backchannel import AgentBackchannel, default_genesis_txns
+from python.bootstrap_cache import BootstrapCache, bootstrap_cache, content_hash
+
+FAKE_LEDGER_PORT = int(os.getenv("FAKE_LEDGER_PORT", "8797"))
+
+GENESIS = '{"reqSignature":{},"txn":{"data":{"alias":"Node1"}}}\n'
+
+
+def test_disabled_cache():
+    cache = BootstrapCache(None)
+    cache.put_genesis("http://ledger/genesis", GENESIS)
+    cache.put_did(GENESIS, "acme", {"did": "did"})
+    assert not cache.enabled
+    assert cache.get_genesis("http://ledger/genesis") is None
+    assert cache.get_did(GENESIS, "acme") is None
+
+
+def test_genesis_by_source(tmp_path):
+    cache = BootstrapCache(str(tmp_path))
+    assert cache.get_genesis("http://ledger/genesis") is None
+
+    cache.put_genesis("http://ledger/genesis", GENESIS)
+    assert cache.get_genesis("http://ledger/genesis") == GENESIS
+    assert cache.get_genesis("http://other-ledger/genesis") is None
+    assert (tmp_path / "genesis" / f"{content_hash(GENESIS)}.txn").read_text() == GENESIS
+
+    # an empty genesis is not kept
+    cache.put_genesis("http://empty/genesis", "")
+    assert cache.get_genesis("http://empty/genesis") is None
+
+
+def test_dids_by_ledger(tmp_path):
+    cache = BootstrapCache(str(tmp_path))
+    did_info = {"did": "did", "verkey": "verkey", "seed": "seed", "role": "ENDORSER"}
+    cache.put_did(GENESIS, "acme", did_info)
+
+    assert cache.get_did(GENESIS, "acme") == did_info
+    assert cache.get_did(GENESIS, "bob") is None
+    # agents on another ledger don't see the DID
+    assert cache.get_did(GENESIS + "\n", "acme") is None
+    assert cache.get_did(None, "acme") is None
+
+
+@pytest.fixture
+def fake_ledger(bench_loop):
+    """von-network ledger browser with the NYMs written to ledger["nyms"]"""
+    ledger = {"nyms": {}, "registrations": 0, "genesis": GENESIS}
+
+    async def genesis(request):
+        return web.Response(text=ledger["genesis"])
+
+    async def register(request):
+        data = await request.json()
+        did = data.get("did") or f"did-{data['seed']}"
+        ledger["nyms"][did] = data
+        ledger["registrations"] += 1
+        return web.json_response({"did": did, "seed": data.get("seed")})
+
+    async def domain(request):
+        did = request.query["query"]
+        results = (
+            [{"txn": {"data": {"dest": did}, "type": "1"}}]
+            if did in ledger["nyms"]
+            else []
+        )
+        return web.json_response({"results": results, "total": len(results)})
+
+    app = web.Application()
+    app.add_routes(
+        [
+            web.get("/genesis", genesis),
+            web.post("/register", register),
+            web.get("/ledger/domain", domain),
+        ]
+    )
+    runner = web.AppRunner(app)
+    bench_loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", FAKE_LEDGER_PORT)
+    bench_loop.run_until_complete(site.start())
+    ledger["url"] = f"http://127.0.0.1:{FAKE_LEDGER_PORT}"
+    yield ledger
+    bench_loop.run_until_complete(runner.cleanup())
+
+
+def test_register_did_checks_cached_did_on_ledger(
+    tmp_path, monkeypatch, fake_ledger, run
+):
+    monkeypatch.setattr(bootstrap_cache, "directory", str(tmp_path))
+
+    async def create():
+        return AgentBackchannel(
+            "acme", {"admin": 0, "http": 9021, "ws": 0}, genesis_data=GENESIS
+        )
+
+    backchannel = run(create())
+    try:
+        run(backchannel.register_did(fake_ledger["url"]))
+        did = backchannel.did
+        assert fake_ledger["registrations"] == 1
+
+        # the cached DID is still on the ledger
+        backchannel.did = None
+        run(backchannel.register_did(fake_ledger["url"]))
+        assert backchannel.did == did
+        assert fake_ledger["registrations"] == 1
+
+        # a reset ledger, with the same genesis: the DID is registered again
+        fake_ledger["nyms"].clear()
+        run(backchannel.register_did(fake_ledger["url"]))
+        assert fake_ledger["registrations"] == 2
+        assert did in fake_ledger["nyms"]
+    finally:
+        run(backchannel.client_session.close())
+
+
+def test_genesis_fetched_again_when_cached(tmp_path, monkeypatch, fake_ledger, run):
+    monkeypatch.setattr(bootstrap_cache, "directory", str(tmp_path))
+    genesis_url = fake_ledger["url"] + "/genesis"
+    monkeypatch.setattr("python.agent_backchannel.GENESIS_URL", genesis_url)
+
+    assert run(default_genesis_txns()) == GENESIS
+    assert bootstrap_cache.get_genesis(genesis_url) == GENESIS
+
+    # the ledger was reset with another genesis
+    fake_ledger["genesis"] = GENESIS.replace("Node1", "Node2")
+    assert run(default_genesis_txns()) == fake_ledger["genesis"]
+    assert bootstrap_cache.get_genesis(genesis_url) == fake_ledger["genesis"]
+
+
+def test_cached_genesis_when_unreachable(tmp_path, monkeypatch, run):
+    monkeypatch.setattr(bootstrap_cache, "directory", str(tmp_path))
+    # nothing listens on the fake ledger port outside of the fake_ledger fixture
+    genesis_url = f"http://127.0.0.1:{FAKE_LEDGER_PORT}/genesis"
+    monkeypatch.setattr("python.agent_backchannel.GENESIS_URL", genesis_url)
+
+    assert run(default_genesis_txns()) is None
+    bootstrap_cache.put_genesis(genesis_url, GENESIS)
+    assert run(default_genesis_txns()) == GENESIS
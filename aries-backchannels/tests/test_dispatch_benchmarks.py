@@ -0,0 +1,314 @@
+"""
+Benchmarks of the backchannel's own request handling overhead, against an in-process
+fake ACA-Py admin API (see conftest.py). Run from the aries-backchannels folder with:
+
+    pytest tests --benchmark-group-by=group
+
+Use --benchmark-autosave / --benchmark-compare to catch regressions between runs.
+"""
+import json
+from unittest import mock
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from aiohttp import ClientSession, streams
+from aiohttp.test_utils import make_mocked_request
+
+from python.agent_backchannel import BackchannelCommand
+from python.storage import (clear_resource, get_resource, pop_resource,
+                            push_resource, store_resource, wait_pop_resource)
+
+BACKCHANNEL_PORT = 8798
+
+PROOF_V2_REQUEST = {
+    "presentation_request": {
+        "format": "indy",
+        "comment": "This is a comment for the request for presentation.",
+        "connection_id": "conn-1",
+        "data": {
+            "requested_attributes": {
+                "address_attrs": {
+                    "name": "address",
+                    "restrictions": [
+                        {
+                            "schema_name": "Schema_DriversLicense_v2",
+                            "schema_version": "1.0.1",
+                        }
+                    ],
+                }
+            },
+            "version": "0.1.0",
+        },
+    }
+}
+
+PROOF_V2_PRESENTATION = {
+    "format": "indy",
+    "comment": "This is a comment for the send presentation.",
+    "requested_attributes": {
+        "address_attrs": {"cred_id": "cred-1", "revealed": True},
+    },
+}
+
+
+def command(topic, operation=None, record_id=None, data=None, method="GET"):
+    return BackchannelCommand(
+        record_id=record_id,
+        operation=operation,
+        topic=topic,
+        method=method,
+        data=data,
+        anoncreds=False,
+    )
+
+
+def mocked_post_request(loop, path, match_info, body: dict):
+    payload = streams.StreamReader(mock.Mock(), 2**16, loop=loop)
+    payload.feed_data(json.dumps(body).encode("utf8"))
+    payload.feed_eof()
+    return make_mocked_request(
+        "POST",
+        path,
+        headers={"Content-Type": "application/json"},
+        match_info=match_info,
+        payload=payload,
+    )
+
+
+@pytest.fixture(scope="module")
+def exchange_webhooks():
+    # the webhooks the backchannel maps thread ids to exchange ids with
+    push_resource("thread-1", "credential-msg", {"cred_ex_id": "cred-ex-1"})
+    push_resource("thread-1", "presentation-msg", {"pres_ex_id": "pres-ex-1"})
+    yield
+    clear_resource("thread-1")
+
+
+@pytest.fixture(scope="module")
+def backchannel_url(bench_loop, acapy_backchannel):
+    bench_loop.run_until_complete(acapy_backchannel.listen_backchannel(BACKCHANNEL_PORT))
+    return f"http://127.0.0.1:{BACKCHANNEL_PORT}"
+
+
+######################################################################
+# request parsing and dispatch
+######################################################################
+
+
+@pytest.mark.benchmark(group="parse_request")
+def test_parse_request_get(benchmark, run, acapy_backchannel):
+    request = make_mocked_request(
+        "GET",
+        "/agent/command/connection/conn-1",
+        match_info={"topic": "connection", "id": "conn-1"},
+    )
+
+    parsed = benchmark(lambda: run(acapy_backchannel.parse_request(request)))
+    assert parsed.topic == "connection" and parsed.record_id == "conn-1"
+
+
+@pytest.mark.benchmark(group="parse_request")
+def test_parse_request_post(benchmark, run, bench_loop, acapy_backchannel):
+    def setup():
+        request = mocked_post_request(
+            bench_loop,
+            "/agent/command/proof-v2/send-request",
+            {"topic": "proof-v2", "operation": "send-request"},
+            {"data": PROOF_V2_REQUEST},
+        )
+        return ((request,), {})
+
+    parsed = benchmark.pedantic(
+        lambda request: run(acapy_backchannel.parse_request(request)),
+        setup=setup,
+        rounds=2000,
+    )
+    assert parsed.operation == "send-request" and parsed.data == PROOF_V2_REQUEST
+
+
+@pytest.mark.benchmark(group="dispatch")
+def test_dispatch_get_status(benchmark, run, acapy_backchannel):
+    # first topic of the GET chain, no admin API call
+    (status, _) = benchmark(
+        lambda: run(acapy_backchannel.make_agent_GET_request(command("status")))
+    )
+    assert status in (200, 418)
+
+
+@pytest.mark.benchmark(group="dispatch")
+def test_dispatch_get_unknown_topic(benchmark, run, acapy_backchannel):
+    # falls through the whole GET chain
+    (status, _) = benchmark(
+        lambda: run(
+            acapy_backchannel.make_agent_GET_request(command("no-such-topic", record_id="x"))
+        )
+    )
+    assert status == 501
+
+
+@pytest.mark.benchmark(group="dispatch")
+def test_dispatch_get_connection(benchmark, run, acapy_backchannel):
+    (status, text) = benchmark(
+        lambda: run(
+            acapy_backchannel.make_agent_GET_request(command("connection", record_id="conn-1"))
+        )
+    )
+    assert status == 200 and json.loads(text)["state"] == "complete"
+
+
+@pytest.mark.benchmark(group="dispatch")
+def test_dispatch_get_issue_credential_v2(
+    benchmark, run, acapy_backchannel, exchange_webhooks
+):
+    (status, text) = benchmark(
+        lambda: run(
+            acapy_backchannel.make_agent_GET_request(
+                command("issue-credential-v2", record_id="thread-1")
+            )
+        )
+    )
+    assert status == 200 and json.loads(text)["state"] == "offer-received"
+
+
+@pytest.mark.benchmark(group="dispatch")
+def test_dispatch_get_proof_v2(benchmark, run, acapy_backchannel, exchange_webhooks):
+    (status, text) = benchmark(
+        lambda: run(
+            acapy_backchannel.make_agent_GET_request(
+                command("proof-v2", record_id="thread-1")
+            )
+        )
+    )
+    assert status == 200 and json.loads(text)["state"] == "request-received"
+
+
+@pytest.mark.benchmark(group="dispatch")
+def test_dispatch_post_create_invitation(benchmark, run, acapy_backchannel):
+    (status, text) = benchmark(
+        lambda: run(
+            acapy_backchannel.make_agent_POST_request(
+                command("connection", "create-invitation", data={}, method="POST")
+            )
+        )
+    )
+    assert status == 200 and json.loads(text)["connection_id"] == "conn-1"
+
+
+@pytest.mark.benchmark(group="dispatch")
+def test_http_round_trip_get_connection(benchmark, run, backchannel_url):
+    # middleware, routing and parse_request included, as seen by the test harness
+    session = run(_client_session())
+
+    async def get_connection():
+        async with session.get(backchannel_url + "/agent/command/connection/conn-1") as resp:
+            return (resp.status, await resp.text())
+
+    try:
+        (status, text) = benchmark(lambda: run(get_connection()))
+    finally:
+        run(session.close())
+    assert status == 200 and json.loads(text)["connection_id"] == "conn-1"
+
+
+async def _client_session() -> ClientSession:
+    return ClientSession()
+
+
+######################################################################
+# state and payload translation
+######################################################################
+
+
+@pytest.mark.benchmark(group="translation")
+def test_agent_state_translation_connection(benchmark, acapy_backchannel):
+    data = json.dumps({"connection_id": "conn-1", "state": "active", "connection": {}})
+
+    text = benchmark(acapy_backchannel.agent_state_translation, "connection", data)
+    assert json.loads(text)["state"] == "complete"
+
+
+@pytest.mark.benchmark(group="translation")
+def test_agent_state_translation_did_exchange(benchmark, acapy_backchannel):
+    data = json.dumps(
+        {
+            "connection_id": "conn-1",
+            "state": "request",
+            "their_role": "invitee",
+            "connection_protocol": "didexchange/1.0",
+        }
+    )
+
+    text = benchmark(acapy_backchannel.agent_state_translation, "did-exchange", data)
+    assert json.loads(text)["state"] != "request"
+
+
+@pytest.mark.benchmark(group="translation")
+def test_map_test_json_proof_v2_send_request(benchmark, acapy_backchannel):
+    admin_data = benchmark(
+        acapy_backchannel.map_test_json_to_admin_api_json,
+        "proof-v2",
+        "send-request",
+        PROOF_V2_REQUEST,
+    )
+    assert admin_data["connection_id"] == "conn-1"
+    assert "indy" in admin_data["presentation_request"]
+
+
+@pytest.mark.benchmark(group="translation")
+def test_map_test_json_proof_v2_send_presentation(benchmark, acapy_backchannel):
+    admin_data = benchmark(
+        acapy_backchannel.map_test_json_to_admin_api_json,
+        "proof-v2",
+        "send-presentation",
+        PROOF_V2_PRESENTATION,
+    )
+    assert "address_attrs" in admin_data["indy"]["requested_attributes"]
+
+
+######################################################################
+# webhook storage
+######################################################################
+
+
+@pytest.mark.benchmark(group="storage")
+def test_storage_push_pop(benchmark):
+    message = {"thread_id": "bench", "state": "offer-received", "cred_ex_id": "x"}
+
+    def push_pop():
+        push_resource("bench", "credential-msg", message)
+        return pop_resource("bench", "credential-msg")
+
+    try:
+        assert benchmark(push_pop) == message
+    finally:
+        clear_resource("bench")
+
+
+@pytest.mark.benchmark(group="storage")
+def test_storage_store_get(benchmark):
+    message = {"thread_id": "bench", "state": "offer-received", "cred_ex_id": "x"}
+
+    def store_get():
+        store_resource("bench", "connection-msg", message)
+        return get_resource("bench", "connection-msg")
+
+    try:
+        assert benchmark(store_get) == message
+    finally:
+        clear_resource("bench")
+
+
+@pytest.mark.benchmark(group="storage")
+def test_storage_wait_pop_available(benchmark, run):
+    message = {"thread_id": "bench", "state": "offer-received", "cred_ex_id": "x"}
+
+    def push_wait_pop():
+        push_resource("bench", "credential-msg", message)
+        return run(wait_pop_resource("bench", "credential-msg", 1))
+
+    try:
+        assert benchmark(push_wait_pop) == message
+    finally:
+        clear_resource("bench")
@@ -0,0 +1,35 @@
+import json
+import logging
+
+from python import event_log
+
+
+class RecordList(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_json_payload_serialized_when_logged(monkeypatch):
+    monkeypatch.setattr(event_log, "BACKCHANNEL_LOG_FORMAT", "json")
+    handler = RecordList()
+    level = event_log.LOGGER.level
+    event_log.LOGGER.setLevel(logging.DEBUG)
+    event_log.LOGGER.addHandler(handler)
+    try:
+        payload = {"state": "offer-received"}
+        event_log.log_event("webhook", payload)
+        # the handlers go on changing the payload after logging it
+        payload["state"] = "done"
+        payload["revocation_id"] = "1"
+    finally:
+        event_log.LOGGER.removeHandler(handler)
+        event_log.LOGGER.setLevel(level)
+
+    [record] = handler.records
+    entry = json.loads(event_log.JsonLinesFormatter().format(record))
+    assert entry["message"] == "webhook"
+    assert entry["payload"] == {"state": "offer-received"}
@@ -0,0 +1,37 @@
+from unittest import mock
+
+from python import json_text
+from python.json_text import JsonText, dumps, loads, parse_json
+
+
+def test_from_data_shares_the_value():
+    data = {"state": "active", "connection_id": "conn-1"}
+    text = JsonText.from_data(data)
+
+    assert loads(text) == data
+    assert text.json() is data
+    assert parse_json(text) is data
+
+
+def test_parsed_once():
+    text = JsonText('{"state": "active"}')
+    with mock.patch.object(json_text, "loads", wraps=json_text.loads) as parse:
+        first = parse_json(text)
+        second = parse_json(text)
+    assert first is second
+    assert parse.call_count == 1
+
+
+def test_plain_text_is_parsed():
+    assert parse_json('{"state": "active"}') == {"state": "active"}
+
+
+def test_str_behaviour():
+    text = JsonText.from_data({"a": 1})
+    assert isinstance(text, str)
+    assert text == dumps({"a": 1})
+    assert text.json() == {"a": 1}
+
+
+def test_dumps_falls_back_for_non_str_keys():
+    assert loads(dumps({1: "one"})) == {"1": "one"}
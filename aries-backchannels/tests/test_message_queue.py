@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from python.message_queue import DiscardingLifoQueue, MessageRegistry
+
+
+def test_queue_order_and_counters(run):
+    queues = MessageRegistry(asyncio.Queue)
+
+    async def push_pop():
+        await queues.push("connection", 1)
+        await queues.push("connection", 2)
+        return [await queues.pop("connection"), await queues.pop("connection")]
+
+    assert run(push_pop()) == [1, 2]
+    stats = queues.stats("connection")
+    assert (stats["pushed"], stats["popped"], stats["depth"]) == (2, 2, 0)
+    assert sum(stats["wait_time_buckets"].values()) == 2
+
+
+def test_pop_timeout(run):
+    queues = MessageRegistry(asyncio.Queue)
+    with pytest.raises(asyncio.TimeoutError):
+        run(queues.pop("connection", timeout=0.01))
+    stats = queues.stats("connection")
+    assert (stats["timeouts"], stats["getters"]) == (1, 0)
+
+
+def test_full_queue_blocks_push(run):
+    queues = MessageRegistry(asyncio.Queue, maxsize=1)
+
+    async def push_while_popping():
+        await queues.push("connection", 1)
+        pusher = asyncio.ensure_future(queues.push("connection", 2, timeout=5))
+        await asyncio.sleep(0.01)
+        # still waiting for room in the queue
+        assert not pusher.done()
+        return [await queues.pop("connection"), await pusher]
+
+    assert run(push_while_popping()) == [1, True]
+    assert queues.stats("connection")["depth"] == 1
+
+
+def test_full_queue_drops_push_on_timeout(run):
+    queues = MessageRegistry(asyncio.Queue, maxsize=1)
+    assert run(queues.push("connection", 1))
+    assert run(queues.push("connection", 2, timeout=0.01)) is False
+    stats = queues.stats("connection")
+    assert (stats["depth"], stats["pushed"], stats["discarded"]) == (1, 1, 1)
+    assert stats["putters"] == 0
+
+
+def test_push_timeout_is_bounded_by_default(run, monkeypatch):
+    monkeypatch.setattr("python.message_queue.MESSAGE_PUSH_TIMEOUT", 0.01)
+    queues = MessageRegistry(asyncio.Queue, maxsize=1)
+    run(queues.push("connection", 1))
+    assert run(queues.push("connection", 2)) is False
+    assert queues.stats("connection")["discarded"] == 1
+
+
+def test_full_stack_discards_oldest(run):
+    stacks = MessageRegistry(DiscardingLifoQueue, maxsize=2)
+
+    async def push_pop():
+        for value in (1, 2, 3):
+            await stacks.push("credential", value)
+        return [await stacks.pop("credential"), await stacks.pop("credential")]
+
+    assert run(push_pop()) == [3, 2]
+    assert stacks.stats("credential")["discarded"] == 1
+
+
+def test_clear_keeps_pending_pops(run):
+    queues = MessageRegistry(asyncio.Queue)
+
+    async def clear_while_popping():
+        await queues.push("connection", "stale")
+        queues.clear()
+        popper = asyncio.ensure_future(queues.pop("connection", timeout=5))
+        await asyncio.sleep(0)
+        queues.clear()
+        await queues.push("connection", "fresh")
+        return await popper
+
+    assert run(clear_while_popping()) == "fresh"
+
+
+def test_channels_dropped_for_another_loop(run):
+    queues = MessageRegistry(asyncio.Queue)
+    run(queues.push("connection", 1))
+
+    loop = asyncio.new_event_loop()
+    try:
+        # the channels of the old loop can't be used on this one
+        with pytest.raises(asyncio.TimeoutError):
+            loop.run_until_complete(queues.pop("connection", timeout=0.01))
+    finally:
+        loop.close()
@@ -0,0 +1,49 @@
+from python.metrics import MetricsRegistry
+
+
+def test_render_counter():
+    registry = MetricsRegistry()
+    counter = registry.counter("webhooks_total", "Webhooks received", ["topic"])
+    counter.inc(topic="connections")
+    counter.inc(2, topic="connections")
+    counter.inc(topic='issue "v2"\n')
+
+    assert registry.render() == (
+        "# HELP webhooks_total Webhooks received\n"
+        "# TYPE webhooks_total counter\n"
+        'webhooks_total{topic="connections"} 3\n'
+        'webhooks_total{topic="issue \\"v2\\"\\n"} 1\n'
+    )
+
+
+def test_render_histogram():
+    registry = MetricsRegistry()
+    histogram = registry.histogram(
+        "wait_seconds", "Wait time", ["topic"], buckets=(1.0, 0.1)
+    )
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, topic="proof")
+
+    assert registry.render() == (
+        "# HELP wait_seconds Wait time\n"
+        "# TYPE wait_seconds histogram\n"
+        'wait_seconds_bucket{topic="proof",le="0.1"} 1\n'
+        'wait_seconds_bucket{topic="proof",le="1.0"} 3\n'
+        'wait_seconds_bucket{topic="proof",le="+Inf"} 4\n'
+        'wait_seconds_sum{topic="proof"} 4.05\n'
+        'wait_seconds_count{topic="proof"} 4\n'
+    )
+
+
+def test_render_without_labels_or_samples():
+    registry = MetricsRegistry()
+    registry.counter("restarts_total", "Agent restarts").inc()
+    registry.histogram("idle_seconds", "Idle time")
+
+    assert registry.render() == (
+        "# HELP restarts_total Agent restarts\n"
+        "# TYPE restarts_total counter\n"
+        "restarts_total 1\n"
+        "# HELP idle_seconds Idle time\n"
+        "# TYPE idle_seconds histogram\n"
+    )
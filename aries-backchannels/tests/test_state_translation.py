@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+
+def did_exchange_record(state, their_role):
+    return {
+        "connection_id": "conn-1",
+        "state": state,
+        "their_role": their_role,
+        "connection_protocol": "didexchange/1.0",
+    }
+
+
+@pytest.mark.parametrize(
+    ("their_role", "rfc_state"),
+    [("invitee", "request-received"), ("inviter", "request-sent")],
+)
+def test_did_exchange_state_by_role(acapy_backchannel, their_role, rfc_state):
+    record = acapy_backchannel.translate_agent_state(
+        "connection", did_exchange_record("request", their_role)
+    )
+    assert record["state"] == rfc_state
+
+
+def test_role_of_a_wrapped_connection(acapy_backchannel):
+    record = {
+        "state": "response",
+        "connection": did_exchange_record("response", "inviter"),
+    }
+    acapy_backchannel.translate_agent_state("connection", record)
+    assert record["state"] == "response-received"
+    assert record["connection"]["state"] == "response-received"
+
+
+def test_out_of_band_without_role(acapy_backchannel):
+    record = acapy_backchannel.translate_agent_state(
+        "out-of-band", {"state": "invitation", "their_role": None}
+    )
+    assert record["state"] == "invitation-sent"
+
+
+def test_connection_protocol_ignores_role(acapy_backchannel):
+    record = acapy_backchannel.translate_agent_state(
+        "connection",
+        {"state": "active", "their_role": "inviter", "connection_protocol": "connections/1.0"},
+    )
+    assert record["state"] == "complete"
+
+
+def test_only_the_state_is_translated(acapy_backchannel):
+    data = json.dumps(
+        {
+            "state": "presentation_received",
+            "comment": "presentation_received",
+            "presentation": {"state": "request_sent"},
+        }
+    )
+    record = json.loads(acapy_backchannel.agent_state_translation("proof", data))
+    assert record == {
+        "state": "presentation-received",
+        "comment": "presentation_received",
+        "presentation": {"state": "request_sent"},
+    }
+
+
+def test_topic_without_state_map(acapy_backchannel):
+    record = {"state": "request_sent"}
+    assert acapy_backchannel.translate_agent_state("schema", record) == record
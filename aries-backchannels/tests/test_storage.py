@@ -0,0 +1,196 @@
+import asyncio
+import threading
+
+import pytest
+
+from python import storage
+from python.storage import (clear_resource, get_resource, get_resource_latest,
+                            get_storage_stats, pop_resource,
+                            pop_resource_latest, push_resource, store_resource,
+                            wait_pop_resource, wait_pop_resource_latest)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def empty_storage():
+    clear_resource()
+    yield
+    clear_resource()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(storage, "default_timer", clock)
+    return clock
+
+
+def evicted(reason):
+    return get_storage_stats()["evicted_" + reason]
+
+
+def test_push_pop_order():
+    for n in range(3):
+        push_resource("thread-1", "credential-msg", {"n": n})
+    push_resource("thread-2", "credential-msg", {"n": 3})
+
+    assert pop_resource("thread-1", "credential-msg") == {"n": 0}
+    assert pop_resource_latest("credential-msg") == {"n": 3}
+    assert pop_resource("thread-1", "credential-msg") == {"n": 1}
+    assert get_storage_stats()["entries"] == 1
+
+
+def test_lru_eviction_by_entries(monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_MAX_ENTRIES", 3)
+    lru = evicted("lru")
+    for data_id in ("a", "b", "c"):
+        store_resource(data_id, "connection-msg", {"id": data_id})
+
+    # reading "a" makes "b" the least recently used
+    assert get_resource("a", "connection-msg") == {"id": "a"}
+    store_resource("d", "connection-msg", {"id": "d"})
+
+    assert get_resource("b", "connection-msg") is None
+    assert [get_resource(d, "connection-msg") for d in ("a", "c", "d")] == [
+        {"id": "a"},
+        {"id": "c"},
+        {"id": "d"},
+    ]
+    assert evicted("lru") == lru + 1
+    assert get_storage_stats()["entries"] == 3
+
+
+def test_lru_eviction_by_bytes(monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_MAX_BYTES", 120)
+    store_resource("a", "connection-msg", {"data": "x" * 40})
+    store_resource("b", "connection-msg", {"data": "x" * 40})
+    store_resource("c", "connection-msg", {"data": "x" * 40})
+
+    assert get_resource("a", "connection-msg") is None
+    assert get_resource("b", "connection-msg") is not None
+    assert get_storage_stats()["bytes"] <= 120
+
+
+def test_stored_resource_over_the_limit_is_kept(monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_MAX_BYTES", 10)
+    store_resource("a", "connection-msg", {"data": "x" * 40})
+    assert get_resource("a", "connection-msg") == {"data": "x" * 40}
+
+
+def test_ttl_eviction(monkeypatch, clock):
+    monkeypatch.setattr(storage, "STORAGE_TTL", 60)
+    expired = evicted("expired")
+    push_resource("old", "credential-msg", {"n": 1})
+    clock.now += 30
+    push_resource("new", "credential-msg", {"n": 2})
+
+    # "old" was last touched more than the TTL ago
+    clock.now += 31
+    stats = get_storage_stats()
+    assert stats["data_ids"] == 1
+    assert stats["evicted_expired"] == expired + 1
+    assert pop_resource("old", "credential-msg") is None
+    assert pop_resource("new", "credential-msg") == {"n": 2}
+
+
+def test_clear_resource():
+    store_resource("a", "connection-msg", {"id": "a"})
+    store_resource("a", "oob-msg", {"id": "a"})
+    clear_resource("a", "oob-msg")
+    assert get_resource("a", "oob-msg") is None
+    assert get_resource("a", "connection-msg") == {"id": "a"}
+    assert get_storage_stats()["entries"] == 1
+
+
+def test_wait_pop_resource_timeout(run):
+    assert run(wait_pop_resource("thread-1", "credential-msg", 0.05)) is None
+    # the waiter is removed on timeout
+    assert get_storage_stats()["waiters"] == 0
+
+
+def test_wait_pop_resource_woken_by_push(run):
+    async def push_later():
+        await asyncio.sleep(0.01)
+        push_resource("thread-1", "credential-msg", {"n": 1})
+
+    async def wait_and_push():
+        (data, _) = await asyncio.gather(
+            wait_pop_resource("thread-1", "credential-msg", 5), push_later()
+        )
+        return data
+
+    assert run(wait_and_push()) == {"n": 1}
+    assert get_storage_stats()["waiters"] == 0
+
+
+def test_wait_pop_resource_latest_woken_by_thread(run):
+    async def wait_and_push():
+        waiter = asyncio.ensure_future(wait_pop_resource_latest("credential-msg", 5))
+        await asyncio.sleep(0.01)
+        # webhooks may be stored from another thread than the waiter's event loop
+        pusher = threading.Thread(
+            target=push_resource, args=("thread-2", "credential-msg", {"n": 2})
+        )
+        pusher.start()
+        data = await waiter
+        pusher.join()
+        return data
+
+    assert run(wait_and_push()) == {"n": 2}
+
+
+def test_wait_pop_resource_waiters_share_the_pushes(run):
+    async def wait_and_push():
+        waiters = [
+            asyncio.ensure_future(wait_pop_resource("thread-1", "credential-msg", 5))
+            for _ in range(2)
+        ]
+        await asyncio.sleep(0.01)
+        # a push for another thread doesn't wake them
+        push_resource("thread-2", "credential-msg", {"n": 0})
+        await asyncio.sleep(0.01)
+        assert not any(waiter.done() for waiter in waiters)
+
+        push_resource("thread-1", "credential-msg", {"n": 1})
+        push_resource("thread-1", "credential-msg", {"n": 2})
+        return await asyncio.gather(*waiters)
+
+    # each message is popped by one waiter only
+    assert sorted(run(wait_and_push()), key=lambda data: data["n"]) == [
+        {"n": 1},
+        {"n": 2},
+    ]
+    assert pop_resource("thread-2", "credential-msg") == {"n": 0}
+    assert get_storage_stats()["waiters"] == 0
+
+
+def test_latest_is_the_thread_of_the_last_push():
+    assert get_resource_latest("credential-msg") is None
+    assert pop_resource_latest("credential-msg") is None
+
+    push_resource("thread-1", "credential-msg", {"n": 1})
+    push_resource("thread-2", "credential-msg", {"n": 2})
+    push_resource("thread-2", "credential-msg", {"n": 3})
+    # a message of another type doesn't move the latest thread of this one
+    push_resource("thread-3", "presentation-msg", {"n": 4})
+    # nor does a new message for an older thread of another type
+    push_resource("thread-1", "presentation-msg", {"n": 5})
+
+    assert get_resource_latest("credential-msg") == {"n": 3}
+    assert pop_resource_latest("credential-msg") == {"n": 3}
+    assert pop_resource_latest("credential-msg") == {"n": 2}
+    assert get_resource_latest("presentation-msg") == {"n": 5}
+
+    push_resource("thread-1", "credential-msg", {"n": 6})
+    assert pop_resource_latest("credential-msg") == {"n": 6}
+    assert pop_resource_latest("credential-msg") == {"n": 1}
+
+    clear_resource()
+    assert get_resource_latest("presentation-msg") is None
@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+from aiohttp.test_utils import make_mocked_request
+
+from python.agent_backchannel import AgentBackchannel
+
+
+class RecordBackchannel(AgentBackchannel):
+    """Serves one record from memory, which doesn't exist until it is given a state"""
+
+    state = None
+
+    async def make_agent_GET_request(self, command):
+        if self.state is None:
+            return (404, "not found")
+        return (200, json.dumps({"thread_id": command.record_id, "state": self.state}))
+
+
+def wait_request(state, timeout):
+    return make_mocked_request(
+        "GET",
+        f"/agent/wait/credential/thread-1?state={state}&timeout={timeout}",
+        match_info={"topic": "credential", "id": "thread-1"},
+    )
+
+
+async def new_backchannel():
+    return RecordBackchannel("wait", {"admin": 0, "http": 0, "ws": 0})
+
+
+def test_wait_returns_once_the_record_is_created(run):
+    backchannel = run(new_backchannel())
+
+    async def create_record():
+        await asyncio.sleep(0.05)
+        backchannel.state = "offer-received"
+        await backchannel.notify_webhook("issue_credential")
+
+    async def wait():
+        creator = asyncio.ensure_future(create_record())
+        response = await backchannel._get_wait_backchannel(
+            wait_request("offer-received", 5)
+        )
+        await creator
+        return response
+
+    try:
+        response = run(wait())
+    finally:
+        run(backchannel.client_session.close())
+    assert response.status == 200
+    assert json.loads(response.text)["state"] == "offer-received"
+
+
+def test_wait_times_out_on_a_missing_record(run):
+    backchannel = run(new_backchannel())
+    try:
+        response = run(
+            backchannel._get_wait_backchannel(wait_request("offer-received", 0.1))
+        )
+    finally:
+        run(backchannel.client_session.close())
+    assert response.status == 408
+    assert json.loads(response.text) == {"state": None, "status": 404}
+
+
+def test_wait_times_out_on_another_state(run):
+    backchannel = run(new_backchannel())
+    backchannel.state = "proposal-sent"
+    try:
+        response = run(
+            backchannel._get_wait_backchannel(wait_request("offer-received", 0.1))
+        )
+    finally:
+        run(backchannel.client_session.close())
+    assert response.status == 408
+    assert json.loads(response.text) == {"state": "proposal-sent", "status": 200}
@@ -1,10 +1,16 @@
 import asyncio
+import atexit
 import json
+import os
 import os.path
-from time import sleep
+import re
+import threading
+from collections import deque
+import time
+from timeit import default_timer
 import urllib.parse
 
-from aiohttp import ClientSession
+from aiohttp import ClientSession, TCPConnector, TraceConfig
 
 ######################################################################
 # coroutine utilities
@@ -39,33 +45,575 @@ def run_coroutine_with_kwargs(coroutine, *args, **kwargs):
 
 
 async def make_agent_backchannel_request(
-    method, path, data=None, text=False, params=None
+    method,
+    path,
+    data=None,
+    text=False,
+    params=None,
+    client_session=None,
+    response_headers=None,
 ) -> (int, str):
     params = {k: v for (k, v) in (params or {}).items() if v is not None}
-    client_session: ClientSession = ClientSession()
+    if client_session is None:
+        async with ClientSession() as client_session:
+            async with client_session.request(
+                method, path, json=data, params=params
+            ) as resp:
+                if response_headers is not None:
+                    response_headers.update(resp.headers)
+                return (resp.status, await resp.text())
     async with client_session.request(method, path, json=data, params=params) as resp:
         resp_status = resp.status
         resp_text = await resp.text()
-        await client_session.close()
+        if response_headers is not None:
+            response_headers.update(resp.headers)
         return (resp_status, resp_text)
 
-def request_log(method, agent_url, resp_status, resp_text, payload=''):
-    if os.path.isdir('/aries-test-harness/logs'):
-        def sorted_payload(val, level=0):
-            valdict = None
-            if isinstance(val, str) and len(val) > 1 and (val[0]+val[-1]) == '{}':
-                valdict = dict(json.loads(val))
-            elif isinstance(val, dict):
-                valdict = val
-            if valdict:
-                valdict = dict(sorted(valdict.items()))
-                valdict = {k:sorted_payload(v, level+1) for (k,v) in valdict.items()}
-                val = level and valdict or json.dumps(valdict)
-            return val
-        with open('/aries-test-harness/logs/request.log', 'a') as fout:
-            print(f'Req: {method} {agent_url} {sorted_payload(payload)}', file=fout)
-            print(f'Res: {resp_status} {sorted_payload(resp_text)}', file=fout)
-            print('-----', file=fout)
+
+######################################################################
+# backchannel client runtime
+######################################################################
+
+# Max number of keep-alive connections held open per agent backchannel
+CLIENT_POOL_SIZE = int(os.getenv("BACKCHANNEL_CLIENT_POOL_SIZE", "10"))
+# Number of latency samples kept per agent for the percentile report
+LATENCY_SAMPLES = 1000
+
+
+class RequestStats:
+    """Connection reuse and latency counters for a single agent backchannel"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, duration: float, error: bool = False):
+        self.requests += 1
+        if error:
+            self.errors += 1
+        self.total_time += duration
+        self.max_time = max(self.max_time, duration)
+        self.latencies.append(duration)
+
+    def percentile(self, pct: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "mean": self.total_time / self.requests if self.requests else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "max": self.max_time,
+        }
+
+
+class BackchannelClientRuntime:
+    """
+    Long lived runtime used by the (synchronous) step code to talk to the backchannels.
+
+    A single background thread runs an event loop that owns one keep-alive
+    ClientSession per agent backchannel (scheme://host:port), so consecutive
+    requests to the same agent reuse sockets instead of creating a new event loop,
+    session, DNS lookup and TCP connection for every call.
+    """
+
+    def __init__(self, pool_size: int = CLIENT_POOL_SIZE):
+        self.pool_size = pool_size
+        self.sessions = {}
+        self.stats = {}
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="backchannel-client",
+                    daemon=True,
+                )
+                self._thread.start()
+            return self._loop
+
+    def _trace_config(self, stats: RequestStats) -> TraceConfig:
+        async def on_connection_create_end(session, ctx, params):
+            stats.connections_created += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            stats.connections_reused += 1
+
+        trace_config = TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    def _get_session(self, agent_key: str) -> ClientSession:
+        # only ever called from the runtime loop, so no locking needed
+        session = self.sessions.get(agent_key)
+        if session is None or session.closed:
+            stats = self.stats.setdefault(agent_key, RequestStats())
+            session = ClientSession(
+                connector=TCPConnector(
+                    limit_per_host=self.pool_size, keepalive_timeout=30.0
+                ),
+                trace_configs=[self._trace_config(stats)],
+            )
+            self.sessions[agent_key] = session
+        return session
+
+    async def _request(
+        self, method, url, data=None, params=None, response_headers=None
+    ) -> (int, str):
+        agent_key = agent_key_for_url(url)
+        session = self._get_session(agent_key)
+        stats = self.stats[agent_key]
+        start = default_timer()
+        error = True
+        try:
+            result = await make_agent_backchannel_request(
+                method,
+                url,
+                data=data,
+                params=params,
+                client_session=session,
+                response_headers=response_headers,
+            )
+            error = False
+            return result
+        finally:
+            stats.record(default_timer() - start, error=error)
+
+    def request(
+        self, method, url, data=None, params=None, response_headers=None
+    ) -> (int, str):
+        """Run a backchannel request on the runtime loop and wait for the result"""
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(
+            self._request(
+                method,
+                url,
+                data=data,
+                params=params,
+                response_headers=response_headers,
+            ),
+            loop,
+        )
+        return future.result()
+
+    def get_stats(self) -> dict:
+        return {agent: stats.as_dict() for (agent, stats) in self.stats.items()}
+
+    def print_stats(self):
+        for (agent, stats) in self.get_stats().items():
+            print(
+                f"Backchannel client {agent}: {stats['requests']} requests"
+                f" ({stats['errors']} errors),"
+                f" {stats['connections_created']} connections opened,"
+                f" {stats['connections_reused']} reused,"
+                f" mean {stats['mean'] * 1000:.1f}ms"
+                f" p50 {stats['p50'] * 1000:.1f}ms"
+                f" p95 {stats['p95'] * 1000:.1f}ms"
+                f" max {stats['max'] * 1000:.1f}ms"
+            )
+
+    def close(self):
+        with self._lock:
+            loop = self._loop
+            self._loop = None
+        if loop is None or loop.is_closed():
+            return
+
+        async def close_sessions():
+            for session in self.sessions.values():
+                await session.close()
+            self.sessions = {}
+
+        try:
+            asyncio.run_coroutine_threadsafe(close_sessions(), loop).result(timeout=5)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(timeout=5)
+            loop.close()
+
+
+def agent_key_for_url(url: str) -> str:
+    parsed = urllib.parse.urlsplit(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+client_runtime = BackchannelClientRuntime()
+atexit.register(client_runtime.close)
+
+
+def get_request_stats() -> dict:
+    return client_runtime.get_stats()
+
+######################################################################
+# request log
+######################################################################
+
+REQUEST_LOG_DIR = "/aries-test-harness/logs"
+# "text" (Req:/Res: blocks, as before) or "jsonl" (one compact JSON object per request)
+REQUEST_LOG_FORMAT = os.getenv("REQUEST_LOG_FORMAT", "text")
+# Max number of requests buffered between flushes; the oldest are dropped beyond that
+REQUEST_LOG_BUFFER_SIZE = int(os.getenv("REQUEST_LOG_BUFFER_SIZE", "10000"))
+# Seconds between background flushes of the request log
+REQUEST_LOG_FLUSH_INTERVAL = float(os.getenv("REQUEST_LOG_FLUSH_INTERVAL", "1.0"))
+
+
+class RequestLogWriter:
+    """
+    Buffers backchannel requests in memory and appends them to the request log
+    from a background thread, in batches.
+
+    Logging a request only appends a tuple to a ring buffer; formatting, file
+    access and writes happen off the step's critical path. Payloads are written
+    as-is, use util/request_log.py to get a deep-sorted, diffable copy of the log.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        log_format: str = REQUEST_LOG_FORMAT,
+        buffer_size: int = REQUEST_LOG_BUFFER_SIZE,
+        flush_interval: float = REQUEST_LOG_FLUSH_INTERVAL,
+    ):
+        self.path = path
+        self.log_format = log_format
+        self.flush_interval = flush_interval
+        self.buffer = deque(maxlen=buffer_size)
+        self.dropped = 0
+        self._enabled = None
+        self._closed = False
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        if self._enabled is None:
+            self._enabled = os.path.isdir(os.path.dirname(self.path))
+        return self._enabled and not self._closed
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="request-log-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def log(self, method, url, resp_status, resp_text, payload=None, duration=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1
+            self.buffer.append(
+                (time.time(), method, url, resp_status, resp_text, payload, duration)
+            )
+        self._ensure_thread()
+        if len(self.buffer) * 2 >= self.buffer.maxlen:
+            self._wakeup.set()
+
+    def _format_text(self, entry) -> str:
+        (_, method, url, resp_status, resp_text, payload, _) = entry
+        if isinstance(payload, dict):
+            payload = json.dumps(payload)
+        return (
+            f"Req: {method} {url} {payload or ''}\n"
+            f"Res: {resp_status} {resp_text}\n"
+            "-----\n"
+        )
+
+    def _format_json(self, entry) -> str:
+        (timestamp, method, url, resp_status, resp_text, payload, duration) = entry
+        record = {
+            "ts": timestamp,
+            "method": method,
+            "url": url,
+            "status": resp_status,
+            "duration": duration,
+            "request": payload or None,
+            "response": resp_text,
+        }
+        return json.dumps(record, separators=(",", ":")) + "\n"
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                entries = list(self.buffer)
+                self.buffer.clear()
+                dropped, self.dropped = self.dropped, 0
+            if not entries and not dropped:
+                return
+
+            lines = []
+            if dropped:
+                if self.log_format == "jsonl":
+                    lines.append(json.dumps({"dropped": dropped}) + "\n")
+                else:
+                    lines.append(f"Dropped: {dropped} requests\n-----\n")
+            format_entry = (
+                self._format_json if self.log_format == "jsonl" else self._format_text
+            )
+            lines.extend(format_entry(entry) for entry in entries)
+            with open(self.path, "a") as fout:
+                fout.writelines(lines)
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+
+request_log_writer = RequestLogWriter(os.path.join(REQUEST_LOG_DIR, "request.log"))
+atexit.register(request_log_writer.close)
+
+
+def request_log(
+    method, agent_url, resp_status, resp_text, payload=None, duration=None
+):
+    request_log_writer.log(method, agent_url, resp_status, resp_text, payload, duration)
+
+
+######################################################################
+# latency profiler
+######################################################################
+
+# Response headers set by the backchannel: time spent handling the request, and the
+# part of it spent waiting on the agent (admin API, ledger)
+BACKCHANNEL_TIME_HEADER = "X-Backchannel-Time"
+AGENT_TIME_HEADER = "X-Agent-Time"
+# Where the time of a step goes; "harness" is whatever is not accounted to the others
+PROFILE_CATEGORIES = ("harness", "backchannel", "agent", "sleep")
+# Number of steps / operations listed in each section of the profile report
+PROFILE_REPORT_TOP = 20
+# Folded stacks (feature;scenario;step;category microseconds), for flamegraph.pl / speedscope
+PROFILE_FOLDED_PATH = REQUEST_LOG_DIR + "/latency-profile.folded"
+
+
+def _folded_frame(name: str) -> str:
+    return name.replace(";", ",").replace("\n", " ")
+
+
+class StepTimes:
+    """Wall time of all the runs of one step, split by category"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max_time = 0.0
+        self.categories = dict.fromkeys(PROFILE_CATEGORIES, 0.0)
+
+    def record(self, wall: float, categories: dict):
+        self.count += 1
+        self.total += wall
+        self.max_time = max(self.max_time, wall)
+        for (category, duration) in categories.items():
+            self.categories[category] += duration
+
+
+class StepFrame:
+    """A step being profiled: its own time by category, and that of its sub-steps"""
+
+    def __init__(self, stack: tuple, start: float):
+        self.stack = stack
+        self.start = start
+        self.categories = dict.fromkeys(PROFILE_CATEGORIES, 0.0)
+        self.children = dict.fromkeys(PROFILE_CATEGORIES, 0.0)
+        self.children_wall = 0.0
+
+
+class LatencyProfiler:
+    """
+    Opt-in profile of where the wall time of a test run goes.
+
+    The time of every step (between the before_step and after_step hooks) is split
+    into the time the backchannel spent handling its requests, the part of that spent
+    waiting on the agent, the time spent sleeping or blocked on /agent/wait, and the
+    remaining harness overhead (step code, client, transport). Sub-steps run with
+    context.execute_steps are profiled as frames of the step running them. Backchannel
+    requests are also timed per topic/operation, wherever they are made from.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.steps = {}
+        self.operations = {}
+        self.folded = {}
+        self.totals = dict.fromkeys(PROFILE_CATEGORIES, 0.0)
+        # the steps being run, the sub-steps run by context.execute_steps on top
+        self._frames = []
+
+    def start_step(self, feature: str, scenario: str, step: str):
+        if not self.enabled:
+            return
+        if self._frames:
+            stack = self._frames[-1].stack + (step,)
+        else:
+            stack = (feature, scenario, step)
+        self._frames.append(StepFrame(stack, default_timer()))
+
+    def end_step(self):
+        if not self.enabled or not self._frames:
+            return
+        frame = self._frames.pop()
+        wall = default_timer() - frame.start
+        categories = frame.categories
+        accounted = sum(categories.values()) + frame.children_wall
+        wall = max(wall, accounted)
+        categories["harness"] = wall - accounted
+
+        # the step's own time goes to the totals and its frame in the folded stacks,
+        # the time of its sub-steps to theirs; the step times include the sub-steps
+        stack = ";".join(_folded_frame(name) for name in frame.stack)
+        for (category, duration) in categories.items():
+            self.totals[category] += duration
+            key = stack + ";" + category
+            self.folded[key] = self.folded.get(key, 0.0) + duration
+        inclusive = {
+            category: duration + frame.children[category]
+            for (category, duration) in categories.items()
+        }
+        self.steps.setdefault(frame.stack[-1], StepTimes()).record(wall, inclusive)
+
+        if self._frames:
+            parent = self._frames[-1]
+            parent.children_wall += wall
+            for (category, duration) in inclusive.items():
+                parent.children[category] += duration
+
+    @property
+    def _current(self):
+        return self._frames[-1].categories if self._frames else None
+
+    def record_request(
+        self, method, topic, operation, duration, headers, waiting=False
+    ):
+        if not self.enabled:
+            return
+        name = f"{method} {topic}" + (f"/{operation}" if operation else "")
+        self.operations.setdefault(name, RequestStats()).record(duration)
+        current = self._current
+        if current is None:
+            return
+        try:
+            backchannel_time = float(headers.get(BACKCHANNEL_TIME_HEADER, 0.0))
+            agent_time = float(headers.get(AGENT_TIME_HEADER, 0.0))
+        except ValueError:
+            return
+        agent_time = min(agent_time, backchannel_time)
+        current["agent"] += agent_time
+        # a /agent/wait request is the backchannel sleeping on behalf of the step
+        current["sleep" if waiting else "backchannel"] += (
+            backchannel_time - agent_time
+        )
+
+    def sleep(self, seconds: float):
+        """time.sleep, accounted to the current step"""
+        start = default_timer()
+        time.sleep(seconds)
+        if self.enabled and self._current is not None:
+            self._current["sleep"] += default_timer() - start
+
+    def print_report(self, top: int = PROFILE_REPORT_TOP):
+        if not self.enabled:
+            return
+        wall = sum(self.totals.values())
+        if not wall:
+            return
+
+        def split(categories: dict) -> str:
+            return ", ".join(
+                f"{category} {categories[category]:.1f}s"
+                for category in PROFILE_CATEGORIES
+            )
+
+        print(
+            f"Latency profile: {wall:.1f}s in"
+            f" {sum(s.count for s in self.steps.values())} steps ("
+            + ", ".join(
+                f"{category} {self.totals[category] / wall * 100:.1f}%"
+                for category in PROFILE_CATEGORIES
+            )
+            + ")"
+        )
+
+        print("Slowest steps (total time):")
+        slowest = sorted(self.steps.items(), key=lambda s: s[1].total, reverse=True)
+        for (step, times) in slowest[:top]:
+            print(
+                f"  {times.total:8.1f}s {times.count:5}x max {times.max_time:6.1f}s"
+                f"  {step}  ({split(times.categories)})"
+            )
+
+        print(
+            f"Time lost to sleeps: {self.totals['sleep']:.1f}s"
+            f" ({self.totals['sleep'] / wall * 100:.1f}%)"
+        )
+        sleepers = sorted(
+            (s for s in self.steps.items() if s[1].categories["sleep"]),
+            key=lambda s: s[1].categories["sleep"],
+            reverse=True,
+        )
+        for (step, times) in sleepers[:top]:
+            print(f"  {times.categories['sleep']:8.1f}s {times.count:5}x  {step}")
+
+        print("Backchannel operations (latency):")
+        operations = sorted(
+            self.operations.items(), key=lambda o: o[1].total_time, reverse=True
+        )
+        for (name, stats) in operations[:top]:
+            print(
+                f"  {stats.total_time:8.1f}s {stats.requests:5}x"
+                f" p50 {stats.percentile(50) * 1000:.1f}ms"
+                f" p95 {stats.percentile(95) * 1000:.1f}ms"
+                f" p99 {stats.percentile(99) * 1000:.1f}ms"
+                f" max {stats.max_time * 1000:.1f}ms  {name}"
+            )
+
+    def write_folded(self, path: str = PROFILE_FOLDED_PATH):
+        if not self.enabled or not self.folded:
+            return
+        if not os.path.isdir(os.path.dirname(path)):
+            return
+        with open(path, "w") as fout:
+            for (stack, duration) in sorted(self.folded.items()):
+                microseconds = int(duration * 1_000_000)
+                if microseconds:
+                    fout.write(f"{stack} {microseconds}\n")
+        print(f"Latency profile flamegraph stacks written to {path}")
+
+
+latency_profiler = LatencyProfiler()
+
 
 def agent_backchannel_GET(url, topic, operation=None, id=None, anoncreds=False) -> (int, str):
     agent_url = url + topic + "/"
@@ -80,10 +628,14 @@ def agent_backchannel_GET(url, topic, operation=None, id=None, anoncreds=False)
         agent_url = agent_url + id
     if (anoncreds):
         params["anoncreds"] = 'True'
-    (resp_status, resp_text) = run_coroutine_with_kwargs(
-        make_agent_backchannel_request, "GET", agent_url, params=params
+    headers = {}
+    start = default_timer()
+    (resp_status, resp_text) = client_runtime.request(
+        "GET", agent_url, params=params, response_headers=headers
     )
-    request_log("GET", agent_url, resp_status, resp_text)
+    duration = default_timer() - start
+    request_log("GET", agent_url, resp_status, resp_text, duration=duration)
+    latency_profiler.record_request("GET", topic, operation, duration, headers)
     return (resp_status, resp_text)
 
 
@@ -104,10 +656,14 @@ def agent_backchannel_POST(
             payload["id"] = id
     if anoncreds:
         params["anoncreds"] = 'True'
-    (resp_status, resp_text) = run_coroutine_with_kwargs(
-        make_agent_backchannel_request, "POST", agent_url, data=payload, params=params
+    headers = {}
+    start = default_timer()
+    (resp_status, resp_text) = client_runtime.request(
+        "POST", agent_url, data=payload, params=params, response_headers=headers
     )
-    request_log("POST", agent_url, resp_status, resp_text, payload)
+    duration = default_timer() - start
+    request_log("POST", agent_url, resp_status, resp_text, payload, duration)
+    latency_profiler.record_request("POST", topic, operation, duration, headers)
     return (resp_status, resp_text)
 
 
@@ -115,32 +671,66 @@ def agent_backchannel_DELETE(url, topic, id=None, data=None) -> (int, str):
     agent_url = url + topic + "/"
     if id:
         agent_url = agent_url + id
-    (resp_status, resp_text) = run_coroutine_with_kwargs(
-        make_agent_backchannel_request, "DELETE", agent_url
+    headers = {}
+    start = default_timer()
+    (resp_status, resp_text) = client_runtime.request(
+        "DELETE", agent_url, response_headers=headers
+    )
+    duration = default_timer() - start
+    request_log("DELETE", agent_url, resp_status, resp_text, duration=duration)
+    latency_profiler.record_request("DELETE", topic, None, duration, headers)
+    return (resp_status, resp_text)
+
+
+def agent_backchannel_WAIT(url, topic, id, states, timeout) -> (int, str):
+    """Block on the backchannel until the record reaches one of the given states"""
+    if "/" in id:
+        id = urllib.parse.quote(id, safe="")
+    agent_url = url + topic + "/" + id
+    params = {"state": ",".join(states), "timeout": str(timeout)}
+    headers = {}
+    start = default_timer()
+    (resp_status, resp_text) = client_runtime.request(
+        "GET", agent_url, params=params, response_headers=headers
+    )
+    duration = default_timer() - start
+    request_log("GET", agent_url, resp_status, resp_text, duration=duration)
+    latency_profiler.record_request(
+        "WAIT", topic, None, duration, headers, waiting=True
     )
-    request_log("DELETE", agent_url, resp_status, resp_text)
     return (resp_status, resp_text)
 
 
 def expected_agent_state(
     agent_url, protocol_txt, thread_id, status_txt, wait_time=2.0, sleep_time=0.5
 ):
-    sleep(sleep_time)
     state = "None"
     if type(status_txt) != list:
         status_txt = [status_txt]
     # "N/A" means that the backchannel can't determine the state - we'll treat this as a successful response
-    status_txt.append("N/A")
-    for i in range(int(wait_time / sleep_time)):
-        (resp_status, resp_text) = agent_backchannel_GET(
-            agent_url + "/agent/command/", protocol_txt, id=thread_id
-        )
-        if resp_status == 200:
-            resp_json = json.loads(resp_text)
-            state = resp_json["state"]
-            if state in status_txt:
-                return True
-        sleep(sleep_time)
+    status_txt = status_txt + ["N/A"]
+
+    # Backchannels that support it return as soon as the agent reports the state
+    (resp_status, resp_text) = agent_backchannel_WAIT(
+        agent_url + "/agent/wait/", protocol_txt, thread_id, status_txt, wait_time
+    )
+    if resp_status == 200:
+        return True
+    elif resp_status == 408:
+        state = json.loads(resp_text)["state"]
+        resp_status = json.loads(resp_text)["status"]
+    elif resp_status in (405, 501):
+        # Wait endpoint not supported by the backchannel, fall back to polling
+        for i in range(int(wait_time / sleep_time)):
+            (resp_status, resp_text) = agent_backchannel_GET(
+                agent_url + "/agent/command/", protocol_txt, id=thread_id
+            )
+            if resp_status == 200:
+                resp_json = json.loads(resp_text)
+                state = resp_json["state"]
+                if state in status_txt:
+                    return True
+            latency_profiler.sleep(sleep_time)
 
     print(
         "From",
@@ -236,3 +826,221 @@ def setup_already_connected(
         raise Exception(
             f"Problem retreiving responder's ({responder}) connection id for active connection. Requester's ({requester}) active connection info: {resp_text}"
         )
+
+
+# Features that test connection establishment itself always do the full handshake
+CONNECTION_ESTABLISHMENT_TAGS = ("RFC0160", "RFC0023")
+
+
+class ConnectionPool:
+    """
+    Run level pool of the connections established between pairs of agents.
+
+    Opt-in (CONNECTION_REUSE env var or connection_reuse userdata). Entries are keyed by
+    (sender, receiver, protocol, sender mediator, receiver mediator) and are validated with
+    a single active-connection GET on the sender before being reused.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.connections = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def usable(self, context) -> bool:
+        return self.enabled and not set(CONNECTION_ESTABLISHMENT_TAGS) & set(
+            context.tags
+        )
+
+    def key(self, context, sender, receiver) -> tuple:
+        protocol = (
+            "didexchange" if "DIDExchangeConnection" in context.tags else "connection"
+        )
+        return (
+            sender,
+            receiver,
+            protocol,
+            context.mediator_dict.get(sender),
+            context.mediator_dict.get(receiver),
+        )
+
+    def get(self, context, sender, receiver) -> bool:
+        """Put a pooled, still active connection into the context, if there is one"""
+        key = self.key(context, sender, receiver)
+        connection = self.connections.get(key)
+        if not connection:
+            self.misses += 1
+            return False
+
+        sender_url = context.config.userdata.get(sender)
+        (resp_status, resp_text) = agent_backchannel_GET(
+            sender_url + "/agent/command/",
+            "active-connection",
+            id=connection["their_did"],
+        )
+        if (
+            resp_status != 200
+            or json.loads(resp_text).get("connection_id")
+            != connection["sender_connection_id"]
+        ):
+            del self.connections[key]
+            self.stale += 1
+            return False
+
+        self.hits += 1
+        context.connection_id_dict[sender][receiver] = connection[
+            "sender_connection_id"
+        ]
+        context.connection_id_dict[receiver][sender] = connection[
+            "receiver_connection_id"
+        ]
+        return True
+
+    def put(self, context, sender, receiver):
+        """Pool the connection the scenario just established between the agents"""
+        sender_connection_id = context.connection_id_dict[sender].get(receiver)
+        receiver_connection_id = context.connection_id_dict[receiver].get(sender)
+        if not sender_connection_id or not receiver_connection_id:
+            return
+
+        sender_url = context.config.userdata.get(sender)
+        (resp_status, resp_text) = agent_backchannel_GET(
+            sender_url + "/agent/command/", "connection", id=sender_connection_id
+        )
+        if resp_status != 200:
+            return
+        their_did = json.loads(resp_text).get("connection", {}).get("their_did")
+        if not their_did:
+            # not every backchannel exposes the did, those connections can't be validated
+            return
+
+        self.connections[self.key(context, sender, receiver)] = {
+            "sender_connection_id": sender_connection_id,
+            "receiver_connection_id": receiver_connection_id,
+            "their_did": their_did,
+        }
+
+    def invalidate(self, agent):
+        """Forget the connections of the agent, e.g. after it was restarted"""
+        self.connections = {
+            k: v for (k, v) in self.connections.items() if agent not in k[:2]
+        }
+
+    def print_stats(self):
+        if self.enabled:
+            print(
+                f"Connection pool: {self.hits} reused, {self.misses} misses,"
+                f" {self.stale} stale, {len(self.connections)} pooled"
+            )
+
+
+# Backchannel topics the scenarios of a protocol feature can't run without
+PROTOCOL_TOPICS = {
+    "RFC0160": "connection",
+    "RFC0023": "did-exchange",
+    "RFC0434": "out-of-band",
+    "RFC0036": "issue-credential",
+    "RFC0037": "proof",
+    "RFC0453": "issue-credential-v2",
+    "RFC0454": "proof-v2",
+}
+
+
+class SupportedCommands:
+    """
+    Run level cache of the topics each backchannel reports on
+    /agent/command/supported-commands, used to skip the scenarios an agent can't run.
+
+    Opt-in (SKIP_UNSUPPORTED env var or skip_unsupported userdata). Backchannels that
+    don't report their commands are assumed to support every topic.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        # agent name -> set of topics, None when the backchannel doesn't tell
+        self.topics = {}
+        self.skipped = 0
+
+    def agent_topics(self, context, agent):
+        if agent not in self.topics:
+            topics = None
+            agent_url = context.config.userdata.get(agent)
+            try:
+                (resp_status, resp_text) = agent_backchannel_GET(
+                    agent_url + "/agent/command/", "supported-commands"
+                )
+                if resp_status == 200:
+                    topics = {command["topic"] for command in json.loads(resp_text)}
+            except Exception as e:
+                print(f"Unable to get the supported commands of {agent}: {e}")
+            self.topics[agent] = topics or None
+        return self.topics[agent]
+
+    def unsupported(self, context, scenario):
+        """Why the agents of the scenario can't run it, None if they can (or can't tell)"""
+        if not self.enabled:
+            return None
+        required = {PROTOCOL_TOPICS[tag] for tag in context.tags if tag in PROTOCOL_TOPICS}
+        if not required:
+            return None
+
+        for agent in scenario_agents(context, scenario):
+            topics = self.agent_topics(context, agent)
+            if topics is not None and not required <= topics:
+                self.skipped += 1
+                missing = ", ".join(sorted(required - topics))
+                return f"{agent} backchannel does not support {missing}"
+        return None
+
+    def print_stats(self):
+        if self.enabled:
+            print(f"Supported commands: {self.skipped} unsupported scenarios skipped")
+
+
+def scenario_agents(context, scenario) -> list:
+    """The agents of a scenario: the quoted names in its steps that have a backchannel url"""
+    agents = set()
+    for step in scenario.all_steps:
+        agents.update(re.findall(r'"([^"]+)"', step.name))
+    return [agent for agent in sorted(agents) if context.config.userdata.get(agent)]
+
+
+######################################################################
+# agent output of failed scenarios
+######################################################################
+
+AGENT_LOG_DIR = os.path.join(REQUEST_LOG_DIR, "agent-logs")
+
+
+def save_agent_logs(context, scenario, since: float):
+    """
+    Write the output of the scenario's agents since the start of the scenario, as kept
+    by their backchannels (GET /agent/command/agent-log), to
+    logs/agent-logs/<feature> - <scenario>/<agent>.log.
+    """
+    if not os.path.isdir(REQUEST_LOG_DIR):
+        return
+    scenario_dir = os.path.join(
+        AGENT_LOG_DIR,
+        re.sub(r"[^\w.-]+", "_", f"{scenario.feature.name} - {scenario.name}")[:150],
+    )
+    for agent in scenario_agents(context, scenario):
+        agent_url = context.config.userdata.get(agent)
+        try:
+            (resp_status, resp_text) = client_runtime.request(
+                "GET", agent_url + "/agent/command/agent-log", params={"since": since}
+            )
+        except Exception as e:
+            print(f"Unable to get the agent log of {agent}: {e}")
+            continue
+        if resp_status != 200:
+            # the backchannel doesn't keep the agent output
+            continue
+
+        agent_log = json.loads(resp_text)
+        os.makedirs(scenario_dir, exist_ok=True)
+        with open(os.path.join(scenario_dir, f"{agent}.log"), "w") as log_file:
+            if agent_log["truncated"]:
+                log_file.write("[older output was dropped by the backchannel]\n")
+            log_file.writelines(line["line"] for line in agent_log["lines"])
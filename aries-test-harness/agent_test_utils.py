@@ -1,7 +1,12 @@
 import datetime
 import json
 import time
-from typing import Optional
+from typing import Any, Callable, List, Optional, Union
+
+from agent_backchannel_client import agent_backchannel_GET, latency_profiler
+
+# Default deadline (seconds) for wait_until
+WAIT_UNTIL_TIMEOUT = 10.0
 
 
 def setup_schemas_for_issuance(context, credential_data):
@@ -33,6 +38,72 @@ def setup_schemas_for_issuance(context, credential_data):
             context.filters = context.filters_dict[schema]
 
 
+def wait_until(
+    predicate: Callable[[], Any],
+    timeout: float = WAIT_UNTIL_TIMEOUT,
+    initial_delay: float = 0.1,
+    max_delay: float = 2.0,
+    backoff: float = 2.0,
+):
+    """
+    Block until predicate() returns a truthy value or the timeout (seconds) expires.
+
+    The predicate is checked right away, then after delays growing exponentially from
+    initial_delay up to max_delay. Returns the last value of the predicate, so the
+    caller decides whether not reaching the condition is a failure.
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        result = predicate()
+        if result:
+            return result
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return result
+        latency_profiler.sleep(min(delay, remaining))
+        delay = min(delay * backoff, max_delay)
+
+
+def agent_state_in(agent_url, topic, id, states: Union[str, List[str], None] = None):
+    """
+    Predicate for wait_until: the agent has the record (e.g. a credential exchange thread)
+    and, if states are given, the record is in one of them.
+    """
+    if isinstance(states, str):
+        states = [states]
+
+    def predicate() -> bool:
+        (resp_status, resp_text) = agent_backchannel_GET(
+            agent_url + "/agent/command/", topic, id=id
+        )
+        if resp_status == 501:
+            # the backchannel can't report the record, nothing to wait for
+            return True
+        if resp_status != 200:
+            return False
+        state = json.loads(resp_text).get("state")
+        return states is None or state in states or state == "N/A"
+
+    return predicate
+
+
+def agent_response_received(agent_url, topic, id):
+    """
+    Predicate for wait_until: the backchannel has the webhook message for id.
+
+    Evaluates to the (status, text) of GET /agent/response/<topic>/<id> once that succeeds.
+    """
+
+    def predicate():
+        (resp_status, resp_text) = agent_backchannel_GET(
+            agent_url + "/agent/response/", topic, id=id
+        )
+        return (resp_status, resp_text) if resp_status == 200 else None
+
+    return predicate
+
+
 def create_non_revoke_interval(timeframe):
     # timeframe containes two variables, the To and from of the non-revoked to and from parameters in the send presentation request message
     # The to and from timeframe variables are always relative to now.
@@ -109,6 +180,75 @@ def get_schema_name(context):
     else:
         return context.schema["schema_name"]
 
+def get_schema_version(context):
+    if context.anoncreds:
+        return context.schema["schema"]["version"]
+    else:
+        return context.schema["schema_version"]
+
+
+class LedgerObjectCache:
+    """
+    Run level cache of the schemas and credential definitions written by the issuers.
+
+    Opt-in (LEDGER_OBJECT_CACHE env var or ledger_object_cache userdata). Schemas are keyed
+    by issuer agent and did, schema name, version and wallet type; credential definitions by
+    issuer agent, schema id, revocation support and wallet type. All entries of an agent are
+    dropped when the agent is restarted.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.schemas = {}
+        self.credential_definitions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, entries: dict, key: tuple):
+        if not self.enabled:
+            return None
+        value = entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def _put(self, entries: dict, key: tuple, value):
+        if self.enabled:
+            entries[key] = value
+
+    def get_schema_id(self, issuer, issuer_did, schema_name, schema_version, anoncreds) -> Optional[str]:
+        return self._get(self.schemas, (issuer, issuer_did, schema_name, schema_version, anoncreds))
+
+    def put_schema_id(self, issuer, issuer_did, schema_name, schema_version, anoncreds, schema_id: str):
+        self._put(self.schemas, (issuer, issuer_did, schema_name, schema_version, anoncreds), schema_id)
+
+    def get_credential_definition(self, issuer, schema_id, support_revocation, anoncreds) -> Optional[dict]:
+        """Cached {"id": <cred def id>, "created": <rev reg creation time or None>}"""
+        return self._get(self.credential_definitions, (issuer, schema_id, bool(support_revocation), anoncreds))
+
+    def put_credential_definition(self, issuer, schema_id, support_revocation, anoncreds, cred_def_id: str, created=None):
+        self._put(
+            self.credential_definitions,
+            (issuer, schema_id, bool(support_revocation), anoncreds),
+            {"id": cred_def_id, "created": created},
+        )
+
+    def invalidate(self, agent):
+        """Forget everything the agent has written, e.g. after it was restarted"""
+        self.schemas = {k: v for (k, v) in self.schemas.items() if k[0] != agent}
+        self.credential_definitions = {
+            k: v for (k, v) in self.credential_definitions.items() if k[0] != agent
+        }
+
+    def print_stats(self):
+        if self.enabled:
+            print(
+                f"Ledger object cache: {self.hits} hits, {self.misses} misses,"
+                f" {len(self.schemas)} schemas, {len(self.credential_definitions)} credential definitions"
+            )
+
 
 def amend_filters_with_runtime_data(context, filters, did_for_id=None):
     schema_name = get_schema_name(context)
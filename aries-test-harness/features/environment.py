@@ -7,17 +7,66 @@
 # -----------------------------------------------------------
 import json
 import os
+import time
 from collections import defaultdict
 
 from behave.contrib.scenario_autoretry import patch_scenario_with_autoretry
 from behave.model import Feature, Scenario
 from behave.runner import Context
 
+from agent_backchannel_client import (ConnectionPool, SupportedCommands,
+                                      client_runtime, latency_profiler,
+                                      save_agent_logs)
+from agent_test_utils import LedgerObjectCache
+
+
+def _flag(context: Context, env_name: str, userdata_key: str) -> bool:
+    """An opt-in switch, from the environment or else the behave userdata"""
+    value = os.environ.get(env_name, context.config.userdata.get(userdata_key, "false"))
+    return value.lower() in ("1", "true", "yes")
+
+def before_all(context: Context):
+    # opt-in run level cache of the schemas and credential definitions written by the issuers
+    context.ledger_object_cache = LedgerObjectCache(
+        enabled=_flag(context, "LEDGER_OBJECT_CACHE", "ledger_object_cache")
+    )
+
+    # opt-in reuse of the connections established by earlier scenarios
+    context.connection_pool = ConnectionPool(
+        enabled=_flag(context, "CONNECTION_REUSE", "connection_reuse")
+    )
+
+    # opt-in profile of where the time of the run goes (see after_all)
+    latency_profiler.enabled = _flag(context, "LATENCY_PROFILE", "latency_profile")
+
+    # opt-in skip of the scenarios using topics an agent's backchannel doesn't support
+    context.supported_commands = SupportedCommands(
+        enabled=_flag(context, "SKIP_UNSUPPORTED", "skip_unsupported")
+    )
 
 def before_step(context: Context, step):
     context.step = step
+    if not latency_profiler.enabled:
+        return
+    # steps run by after_feature (agent resets) have no scenario
+    scenario = getattr(context, "scenario", None)
+    latency_profiler.start_step(
+        context.feature.name, scenario.name if scenario else "after_feature", step.name
+    )
+
+def after_step(context: Context, step):
+    latency_profiler.end_step()
 
 def before_scenario(context: Context, scenario: Scenario):
+    # the agent output since then is saved if the scenario fails (see after_scenario)
+    context.scenario_start_time = time.time()
+
+    unsupported = context.supported_commands.unsupported(context, scenario)
+    if unsupported:
+        print(f'NOTE: Skipping "{scenario.name}", {unsupported}.')
+        scenario.skip(unsupported)
+        return
+
     setup_scenario_context(context, scenario)
 
     # Check if the scenario has an issue associated
@@ -278,6 +327,10 @@ def setup_scenario_context(context: Context, scenario: Scenario):
     # context.cred_rev_id = "c6d37ebd-a2d9-485f-b393-5fcb86b51fd2"
     context.rev_reg_id = None
 
+    # Time the last credential revocation was written
+    # context.revocation_time = time.time()
+    context.revocation_time = None
+
     # DIDExchange invitation
     context.responder_invitation = None
 
@@ -460,6 +513,10 @@ def setup_scenario_context(context: Context, scenario: Scenario):
     # context.anoncreds = True
     context.anoncreds = is_test_anoncreds(context)
 
+def after_scenario(context: Context, scenario: Scenario):
+    if scenario.status == "failed":
+        save_agent_logs(context, scenario, context.scenario_start_time)
+
 def before_feature(context, feature):
     # retry failed tests 
     test_retry_attempts = None
@@ -489,3 +546,13 @@ def after_feature(context: Context, feature: Feature):
             context.execute_steps(
                 f'Given "{agent}" is running with parameters ' + '"{}"'
             )
+
+
+def after_all(context: Context):
+    # report connection reuse and request latency for the backchannel client
+    client_runtime.print_stats()
+    context.ledger_object_cache.print_stats()
+    context.connection_pool.print_stats()
+    context.supported_commands.print_stats()
+    latency_profiler.print_report()
+    latency_profiler.write_folded()
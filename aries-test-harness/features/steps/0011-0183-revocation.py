@@ -17,7 +17,7 @@
 
 from behave import *
 import json
-from time import sleep
+import time
 from agent_backchannel_client import (
     agent_backchannel_GET,
     agent_backchannel_POST,
@@ -26,6 +26,10 @@ from agent_backchannel_client import (
 from agent_test_utils import create_non_revoke_interval
 
 
+# Seconds between a revocation and a proof request with a non-revoked interval
+REVOCATION_SETTLE_TIME = 2.0
+
+
 @when("{issuer} revokes the credential")
 @when("{issuer} revokes the credential with a revocation notification")
 def step_impl(context, issuer: str):
@@ -54,6 +58,7 @@ def step_impl(context, issuer: str):
     )
     assert resp_status == 200, f"resp_status {resp_status} is not 200; {resp_text}"
     # resp_json = json.loads(resp_text)
+    context.revocation_time = time.time()
 
     # Check the Holder wallet for the credential
     # Should be a 200 since the revoke doesn't remove the cred from the holders wallet.
@@ -137,8 +142,14 @@ def step_impl(context, issuer, timeframe):
 )
 def step_impl(context, verifier, request_for_proof, prover, timeframe):
 
-    # Sleep here just to give a little space between the revocation and the request.
-    sleep(2)
+    # Give a little space between the revocation and the request, so the "now" based
+    # non-revoked interval doesn't fall in the second the revocation was written
+    if context.revocation_time:
+        time.sleep(
+            max(0, context.revocation_time + REVOCATION_SETTLE_TIME - time.time())
+        )
+    else:
+        time.sleep(REVOCATION_SETTLE_TIME)
     context.non_revoked_timeframe = create_non_revoke_interval(timeframe)
 
     context.execute_steps(
@@ -10,13 +10,14 @@
 # -----------------------------------------------------------
 
 from behave import given, when, step
-import json, time
+import json
 from agent_backchannel_client import (
     agent_backchannel_GET,
     agent_backchannel_POST,
     expected_agent_state,
     setup_already_connected,
 )
+from agent_test_utils import agent_response_received, wait_until
 
 @step('"{sender}" and "{receiver}" create a new didexchange connection')
 def step_impl(context, sender: str, receiver: str):
@@ -320,11 +321,11 @@ def step_impl(context, responder: str):
     if context.requester_name not in context.connection_id_dict[responder]:
         # One way (maybe preferred) to get the connection id is to get it from the probable webhook that the controller gets because of the previous step
         invitation_id = context.responder_invitation["@id"]
-        time.sleep(0.5)  # delay for webhook to execute
-        (resp_status, resp_text) = agent_backchannel_GET(
-            responder_url + "/agent/response/", "did-exchange", id=invitation_id
-        )  # {}
-        assert resp_status == 200, f"resp_status {resp_status} is not 200; {resp_text}"
+        response = wait_until(
+            agent_response_received(responder_url, "did-exchange", invitation_id)
+        )
+        assert response, f"No did-exchange webhook received for invitation {invitation_id}"
+        (resp_status, resp_text) = response
         resp_json = json.loads(resp_text)
 
         if "connection_id" not in resp_text:
@@ -351,11 +352,11 @@ def step_impl(context, responder):
     if context.requester_name not in context.connection_id_dict[responder]:
         # One way (maybe preferred) to get the connection id is to get it from the probable webhook that the controller gets because of the previous step
         invitation_id = context.responder_invitation["@id"]
-        time.sleep(0.5)  # delay for webhook to execute
-        (resp_status, resp_text) = agent_backchannel_GET(
-            responder_url + "/agent/response/", "did-exchange", id=invitation_id
-        )  # {}
-        assert resp_status == 200, f"resp_status {resp_status} is not 200; {resp_text}"
+        response = wait_until(
+            agent_response_received(responder_url, "did-exchange", invitation_id)
+        )
+        assert response, f"No did-exchange webhook received for invitation {invitation_id}"
+        (resp_status, resp_text) = response
         resp_json = json.loads(resp_text)
 
         # The second way to do this is to call the connection protocol for the connection id given the invitation_id or a thread id.
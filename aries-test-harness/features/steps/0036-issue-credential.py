@@ -2,12 +2,12 @@ import json
 import time
 from copy import deepcopy
 from random import randint
-from time import sleep
 
 from agent_backchannel_client import (agent_backchannel_GET,
                                       agent_backchannel_POST,
                                       expected_agent_state)
-from agent_test_utils import get_schema_name
+from agent_test_utils import (agent_state_in, get_schema_name,
+                              get_schema_version, wait_until)
 from behave import given, then, when
 
 # This step is defined in another feature file
@@ -108,6 +108,20 @@ def step_impl(context, issuer):
         schema["schema_name"] = schema["schema_name"] + issuer
         schema["issuer_id"] = context.issuer_did
 
+    # reuse a schema this issuer already wrote earlier in the run
+    schema_name = get_schema_name(context)
+    cache_key = (
+        issuer,
+        context.issuer_did_dict.get(schema_name),
+        schema_name,
+        get_schema_version(context),
+        context.anoncreds,
+    )
+    cached_schema_id = context.ledger_object_cache.get_schema_id(*cache_key)
+    if cached_schema_id:
+        context.issuer_schema_id_dict[schema_name] = cached_schema_id
+        return
+
     (resp_status, resp_text) = agent_backchannel_POST(
         issuer_url + "/agent/command/", "schema", data=schema, anoncreds=context.anoncreds
     )
@@ -122,6 +136,9 @@ def step_impl(context, issuer):
         context.issuer_schema_id_dict[get_schema_name(context)] = resp_json[
             "schema_id"
         ]
+    context.ledger_object_cache.put_schema_id(
+        *cache_key, context.issuer_schema_id_dict[schema_name]
+    )
 
 
 @when('"{issuer}" creates a new credential definition')
@@ -129,6 +146,21 @@ def step_impl(context, issuer):
     issuer_url = context.config.userdata.get(issuer)
     schema_name = get_schema_name(context)
 
+    # reuse a credential definition this issuer already wrote earlier in the run;
+    # revocable ones (with their tails files) are the slowest ledger writes
+    cache_key = (
+        issuer,
+        context.issuer_schema_id_dict[schema_name],
+        context.support_revocation,
+        context.anoncreds,
+    )
+    cached_cred_def = context.ledger_object_cache.get_credential_definition(*cache_key)
+    if cached_cred_def:
+        context.credential_definition_id_dict[schema_name] = cached_cred_def["id"]
+        if context.support_revocation:
+            context.cred_rev_creation_time = cached_cred_def["created"]
+        return
+
     if context.anoncreds:
         cred_def = deepcopy(CRED_DEF_TEMPLATE_ANONCREDS)
         cred_def["credential_definition"]["schemaId"] = context.issuer_schema_id_dict[schema_name]
@@ -162,6 +194,11 @@ def step_impl(context, issuer):
         context.credential_definition_id_dict[get_schema_name(context)] = convert_fully_qualified_indy_cred_def_id_to_legacy(resp_json["credential_definition_id"])
     else:
         context.credential_definition_id_dict[get_schema_name(context)] = resp_json["credential_definition_id"]
+    context.ledger_object_cache.put_credential_definition(
+        *cache_key,
+        context.credential_definition_id_dict[schema_name],
+        context.cred_rev_creation_time if context.support_revocation else None,
+    )
 
 @then('"{issuer}" has an existing schema')
 def step_impl(context, issuer):
@@ -311,11 +348,12 @@ def convert_fully_qualified_indy_schema_id_to_legacy(id):
 def step_impl(context, issuer):
     issuer_url = context.config.userdata.get(issuer)
 
-    # Sometimes proposal arrives only after send-offer is called, hence the sleep
-    sleep(1)
-
     # If context has the credential thread id then the proposal was done.
     if context.cred_thread_id:
+        # Sometimes proposal arrives only after send-offer is called, so wait for the issuer to have it
+        assert wait_until(
+            agent_state_in(issuer_url, "issue-credential", context.cred_thread_id)
+        ), "the issuer never received the credential proposal"
         (resp_status, resp_text) = agent_backchannel_POST(
             issuer_url + "/agent/command/",
             "issue-credential",
@@ -354,8 +392,15 @@ def step_impl(context, issuer):
             context.cred_thread_id = resp_json["thread_id"]
 
     # Check the state of the holder after issuers call of send-offer
-    # TODO Removing this line causes too many failures in Acapy-Dotnet Acapy-Afgo.
-    sleep(3)
+    # Some agents (e.g. Dotnet, Afgo) take a while to process the offer.
+    assert wait_until(
+        agent_state_in(
+            context.holder_url,
+            "issue-credential",
+            context.cred_thread_id,
+            "offer-received",
+        )
+    ), "the holder never received the credential offer"
     assert expected_agent_state(
         context.holder_url, "issue-credential", context.cred_thread_id, "offer-received"
     )
@@ -396,12 +441,15 @@ def step_impl(context, issuer):
 def step_impl(context, holder):
     holder_url = context.holder_url
 
-    sleep(1)
-
     # If @indy then we can be sure we cannot start the protocol from this command. We can be sure that we have previously
     # received the thread_id.
     # if "Indy" in context.tags:
     if context.cred_thread_id:
+        assert wait_until(
+            agent_state_in(
+                holder_url, "issue-credential", context.cred_thread_id, "offer-received"
+            )
+        ), "the holder never received the credential offer"
         (resp_status, resp_text) = agent_backchannel_POST(
             holder_url + "/agent/command/",
             "issue-credential",
@@ -453,7 +501,14 @@ def step_impl(context, issuer):
     # assert resp_json["state"] == "credential-issued"
 
     # Verify holder status
-    sleep(1.0)
+    assert wait_until(
+        agent_state_in(
+            context.holder_url,
+            "issue-credential",
+            context.cred_thread_id,
+            ["credential-received", "done"],
+        )
+    ), "the holder never received the credential"
     # assert expected_agent_state(context.holder_url, "issue-credential", context.cred_thread_id, "credential-received")
 
 
@@ -468,7 +523,14 @@ def step_impl(context, holder):
     }
 
     # (resp_status, resp_text) = agent_backchannel_POST(holder_url + "/agent/command/", "credential", operation="store", id=context.holder_cred_ex_id)
-    sleep(3)
+    assert wait_until(
+        agent_state_in(
+            holder_url,
+            "issue-credential",
+            context.cred_thread_id,
+            ["credential-received", "done"],
+        )
+    ), "the holder never received the credential"
     (resp_status, resp_text) = agent_backchannel_POST(
         holder_url + "/agent/command/",
         "issue-credential",
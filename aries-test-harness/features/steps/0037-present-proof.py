@@ -1,8 +1,11 @@
 from behave import *
 import json
 from agent_backchannel_client import agent_backchannel_POST, expected_agent_state
-from agent_test_utils import get_relative_timestamp_to_epoch
-from time import sleep
+from agent_test_utils import (
+    agent_state_in,
+    get_relative_timestamp_to_epoch,
+    wait_until,
+)
 
 
 @when('{issuer} issues a new credential to "{prover}" with {credential_data}')
@@ -343,7 +346,14 @@ def step_impl(context, prover, presentation):
 def step_impl(context, verifier):
     verifier_url = context.verifier_url
 
-    sleep(3)
+    assert wait_until(
+        agent_state_in(
+            verifier_url,
+            "proof",
+            context.presentation_thread_id,
+            ["presentation-received", "done"],
+        )
+    ), "the verifier never received the presentation"
     (resp_status, resp_text) = agent_backchannel_POST(
         verifier_url + "/agent/command/",
         "proof",
@@ -9,6 +9,15 @@ import json
 from agent_backchannel_client import agent_backchannel_POST
 
 
+def agent_restarted(resp_text: str) -> bool:
+    """Whether the agent start response reports a restart (the default, e.g. for an empty body)"""
+    try:
+        resp_json = json.loads(resp_text)
+    except (TypeError, ValueError):
+        return True
+    return not isinstance(resp_json, dict) or resp_json.get("restarted", True) is not False
+
+
 @given('"{agent}" is running with parameters "{parameters}"')
 def step_impl(context, agent: str, parameters: str):
     agent_url = context.config.userdata.get(agent)
@@ -22,6 +31,12 @@ def step_impl(context, agent: str, parameters: str):
     )
     assert resp_status == 200, f"resp_status {resp_status} is not 200; {resp_text}"
 
+    # the backchannel skips the restart if the agent already runs with these parameters
+    if agent_restarted(resp_text):
+        # the restarted agent may not have the schemas, cred defs and connections of its previous run
+        context.ledger_object_cache.invalidate(agent)
+        context.connection_pool.invalidate(agent)
+
 
 @then('"{requester}" can\'t accept the invitation')
 def step_impl(context, requester):
@@ -8,7 +8,6 @@
 #
 # -----------------------------------------------------------
 
-from time import sleep
 from behave import given, when, then, step
 import json
 from agent_backchannel_client import (
@@ -17,6 +16,7 @@ from agent_backchannel_client import (
     expected_agent_state,
     check_if_already_connected,
 )
+from agent_test_utils import agent_state_in, wait_until
 
 
 @given("{n} agents")
@@ -214,8 +214,15 @@ def step_impl(context, inviter, invitee):
     invitee_connection_id = context.connection_id_dict[invitee][inviter]
 
     # Acapy sometimes sends connection requets only after accept-request is called,
-    # resulting in an error, hence the sleep
-    sleep(1)
+    # resulting in an error, hence wait for the inviter to have the request
+    assert wait_until(
+        agent_state_in(
+            inviter_url,
+            "connection",
+            inviter_connection_id,
+            ["requested", "responded", "complete"],
+        )
+    ), "the inviter never received the connection request"
     (resp_status, resp_text) = agent_backchannel_POST(
         inviter_url + "/agent/command/",
         "connection",
@@ -406,6 +413,11 @@ def step_impl(context, sender, receiver):
 @when('"{sender}" and "{receiver}" have an existing connection')
 @given('"{sender}" and "{receiver}" have an existing connection')
 def step_impl(context, sender, receiver):
+    # reuse a connection established by an earlier scenario, skipping the handshake
+    use_connection_pool = context.connection_pool.usable(context)
+    if use_connection_pool and context.connection_pool.get(context, sender, receiver):
+        return
+
     if "DIDExchangeConnection" in context.tags:
         context.use_existing_connection = True
         context.use_existing_connection_successful = False
@@ -441,6 +453,9 @@ def step_impl(context, sender, receiver):
         """
         )
 
+    if use_connection_pool:
+        context.connection_pool.put(context, sender, receiver)
+
 
 @when('"{sender}" sends a trust ping')
 def step_impl(context, sender):
@@ -537,7 +552,12 @@ def step_impl(context, sender, receiver):
     sender_connection_id = context.connection_id_dict[sender][receiver]
 
     data = {"comment": "acknowledgement from " + sender}
-    sleep(5)
+    # the connection must be usable (response received) before pinging over it
+    assert wait_until(
+        agent_state_in(
+            sender_url, "connection", sender_connection_id, ["responded", "complete"]
+        )
+    ), "the connection never reached the responded or complete state"
     (resp_status, resp_text) = agent_backchannel_POST(
         sender_url + "/agent/command/",
         "connection",
@@ -1,8 +1,9 @@
 import json
-from time import sleep
 
 from agent_backchannel_client import agent_backchannel_GET, agent_backchannel_POST
 from agent_test_utils import (
+    agent_state_in,
+    wait_until,
     setup_schemas_for_issuance,
     format_cred_proposal_by_aip_version,
     get_schema_name)
@@ -243,7 +244,14 @@ def step_impl(context, holder, cred_format):
     holder_url = context.config.userdata.get(holder)
     issuer_url = context.config.userdata.get(context.issuer_name)
 
-    sleep(1)
+    assert wait_until(
+        agent_state_in(
+            holder_url,
+            "issue-credential-v2",
+            context.cred_thread_id,
+            ["credential-received", "done"],
+        )
+    ), "the holder never received the credential"
     (resp_status, resp_text) = agent_backchannel_POST(
         holder_url + "/agent/command/",
         "issue-credential-v2",
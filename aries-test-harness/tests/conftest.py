@@ -0,0 +1,29 @@
+import asyncio
+import threading
+
+import pytest
+from aiohttp import web
+
+
+@pytest.fixture
+def serve():
+    """Serve aiohttp applications on a thread of their own, as a backchannel would"""
+    servers = []
+
+    def serve(app: web.Application) -> str:
+        loop = asyncio.new_event_loop()
+        runner = web.AppRunner(app)
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        loop.run_until_complete(site.start())
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        servers.append((loop, runner, thread))
+        return f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+    yield serve
+    for (loop, runner, thread) in servers:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        loop.close()
@@ -0,0 +1,74 @@
+import pytest
+from aiohttp import web
+
+from agent_backchannel_client import BackchannelClientRuntime, agent_key_for_url
+
+
+@pytest.fixture
+def backchannel_url(serve):
+    """A backchannel answering GET /agent/command/status"""
+
+    async def status(request):
+        return web.json_response({"status": "active", "id": request.query.get("id")})
+
+    app = web.Application()
+    app.add_routes([web.get("/agent/command/status", status)])
+    return serve(app)
+
+
+class TestBackchannelClientRuntime:
+
+    def test_reuses_the_loop_and_connection(self, backchannel_url):
+        runtime = BackchannelClientRuntime(pool_size=2)
+        try:
+            results = [
+                runtime.request(
+                    "GET", backchannel_url + "/agent/command/status", params={"id": n}
+                )
+                for n in range(3)
+            ]
+            loop = runtime._loop
+            runtime.request("GET", backchannel_url + "/agent/command/status")
+            # the same loop runs every request
+            assert runtime._loop is loop and runtime._thread.is_alive()
+        finally:
+            runtime.close()
+
+        assert [status for (status, _) in results] == [200, 200, 200]
+        assert '"id": "2"' in results[2][1]
+        stats = runtime.get_stats()[backchannel_url]
+        assert stats["requests"] == 4 and stats["errors"] == 0
+        assert stats["connections_created"] == 1
+        assert stats["connections_reused"] == 3
+
+    def test_close_stops_the_loop(self, backchannel_url):
+        runtime = BackchannelClientRuntime()
+        runtime.request("GET", backchannel_url + "/agent/command/status")
+        (loop, thread) = (runtime._loop, runtime._thread)
+        runtime.close()
+
+        assert loop.is_closed() and not thread.is_alive()
+        assert runtime.sessions == {}
+        # the next request starts a new loop
+        try:
+            (status, _) = runtime.request("GET", backchannel_url + "/agent/command/status")
+            assert status == 200
+            assert runtime._loop is not loop
+        finally:
+            runtime.close()
+
+    def test_records_errors(self):
+        runtime = BackchannelClientRuntime()
+        try:
+            with pytest.raises(Exception):
+                # nothing listens on port 1
+                runtime.request("GET", "http://127.0.0.1:1/agent/command/status")
+        finally:
+            runtime.close()
+        assert runtime.get_stats()["http://127.0.0.1:1"]["errors"] == 1
+
+
+def test_agent_key_for_url():
+    assert agent_key_for_url("http://localhost:9020/agent/command/status?id=1") == (
+        "http://localhost:9020"
+    )
@@ -0,0 +1,106 @@
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+
+from agent_backchannel_client import ConnectionPool
+
+
+@pytest.fixture
+def agents(serve):
+    """Acme's backchannel, with one connection to Bob that can be dropped"""
+    state = {"active": "acme-conn-1", "active_gets": 0}
+
+    async def connection(request):
+        return web.json_response(
+            {
+                "connection_id": request.match_info["id"],
+                "connection": {"their_did": "did:bob"},
+            }
+        )
+
+    async def active_connection(request):
+        state["active_gets"] += 1
+        if request.match_info["did"] != "did:bob" or not state["active"]:
+            return web.Response(status=404)
+        return web.json_response({"connection_id": state["active"]})
+
+    app = web.Application()
+    app.add_routes(
+        [
+            web.get("/agent/command/connection/{id}", connection),
+            web.get("/agent/command/active-connection/{did}", active_connection),
+        ]
+    )
+    state["url"] = serve(app)
+    return state
+
+
+def scenario_context(agents, tags=()):
+    return SimpleNamespace(
+        tags=list(tags),
+        mediator_dict={},
+        config=SimpleNamespace(userdata={"Acme": agents["url"], "Bob": agents["url"]}),
+        connection_id_dict={"Acme": {}, "Bob": {}},
+    )
+
+
+class TestConnectionPool:
+
+    def test_reuses_an_active_connection(self, agents):
+        pool = ConnectionPool(enabled=True)
+        context = scenario_context(agents)
+        assert not pool.get(context, "Acme", "Bob")
+
+        context.connection_id_dict = {
+            "Acme": {"Bob": "acme-conn-1"},
+            "Bob": {"Acme": "bob-conn-1"},
+        }
+        pool.put(context, "Acme", "Bob")
+
+        context = scenario_context(agents)
+        assert pool.get(context, "Acme", "Bob")
+        assert context.connection_id_dict == {
+            "Acme": {"Bob": "acme-conn-1"},
+            "Bob": {"Acme": "bob-conn-1"},
+        }
+        assert (pool.hits, pool.misses, pool.stale) == (1, 1, 0)
+
+    def test_drops_a_stale_connection(self, agents):
+        pool = ConnectionPool(enabled=True)
+        context = scenario_context(agents)
+        context.connection_id_dict = {
+            "Acme": {"Bob": "acme-conn-1"},
+            "Bob": {"Acme": "bob-conn-1"},
+        }
+        pool.put(context, "Acme", "Bob")
+
+        # Acme has another active connection to Bob now
+        agents["active"] = "acme-conn-2"
+        context = scenario_context(agents)
+        assert not pool.get(context, "Acme", "Bob")
+        assert context.connection_id_dict == {"Acme": {}, "Bob": {}}
+        assert pool.stale == 1 and not pool.connections
+
+    def test_keyed_by_protocol_and_invalidated_by_agent(self, agents):
+        pool = ConnectionPool(enabled=True)
+        context = scenario_context(agents)
+        context.connection_id_dict = {
+            "Acme": {"Bob": "acme-conn-1"},
+            "Bob": {"Acme": "bob-conn-1"},
+        }
+        pool.put(context, "Acme", "Bob")
+
+        assert not pool.get(
+            scenario_context(agents, ["DIDExchangeConnection"]), "Acme", "Bob"
+        )
+        pool.invalidate("Bob")
+        assert not pool.get(scenario_context(agents), "Acme", "Bob")
+        assert pool.misses == 2 and agents["active_gets"] == 0
+
+    def test_not_used_by_connection_scenarios(self, agents):
+        assert ConnectionPool(enabled=True).usable(scenario_context(agents))
+        assert not ConnectionPool(enabled=True).usable(
+            scenario_context(agents, ["RFC0160"])
+        )
+        assert not ConnectionPool().usable(scenario_context(agents))
@@ -0,0 +1,46 @@
+from agent_backchannel_client import (AGENT_TIME_HEADER, BACKCHANNEL_TIME_HEADER,
+                                      LatencyProfiler)
+
+
+class TestLatencyProfiler:
+
+    def test_nested_steps(self):
+        profiler = LatencyProfiler(enabled=True)
+
+        profiler.start_step("feature", "scenario", "outer")
+        profiler.record_request(
+            "POST", "connection", None, 0.2,
+            {BACKCHANNEL_TIME_HEADER: "0.2", AGENT_TIME_HEADER: "0.1"},
+        )
+        profiler.start_step("feature", "scenario", "inner")
+        profiler.record_request(
+            "GET", "connection", None, 0.5,
+            {BACKCHANNEL_TIME_HEADER: "0.5", AGENT_TIME_HEADER: "0.4"},
+        )
+        profiler.end_step()
+        profiler.end_step()
+
+        # the outer step includes the time of the inner step
+        outer = profiler.steps["outer"]
+        inner = profiler.steps["inner"]
+        assert outer.count == 1 and inner.count == 1
+        assert outer.total >= inner.total >= 0.5
+        assert abs(inner.categories["agent"] - 0.4) < 1e-9
+        assert abs(outer.categories["agent"] - 0.5) < 1e-9
+        assert abs(outer.categories["backchannel"] - 0.2) < 1e-9
+
+        # the totals and folded stacks count the time of each step once
+        assert abs(profiler.totals["agent"] - 0.5) < 1e-9
+        assert abs(sum(profiler.totals.values()) - outer.total) < 1e-9
+        assert abs(profiler.folded["feature;scenario;outer;agent"] - 0.1) < 1e-9
+        assert abs(profiler.folded["feature;scenario;outer;inner;agent"] - 0.4) < 1e-9
+
+        # requests after the steps are not accounted to any step
+        profiler.record_request("GET", "connection", None, 0.1, {})
+        assert profiler._frames == []
+
+    def test_disabled(self):
+        profiler = LatencyProfiler()
+        profiler.start_step("feature", "scenario", "step")
+        profiler.end_step()
+        assert profiler.steps == {}
@@ -0,0 +1,73 @@
+import time
+from types import SimpleNamespace
+
+from util.load import FlowError, LoadStats, exchange_counter, worker
+
+
+class TestLoadStats:
+
+    def test_as_dict(self):
+        stats = LoadStats()
+        for duration in (0.1, 0.2, 0.3):
+            stats.record(duration)
+        stats.record(0.4, "FlowError: timeout")
+        stats.record_setup_error("FlowError: no connection")
+
+        results = stats.as_dict(2.0)
+        assert results["exchanges"] == 4
+        assert results["completed"] == 3
+        assert results["errors"] == 1
+        assert results["error_rate"] == 0.25
+        assert results["throughput"] == 1.5
+        assert abs(results["mean"] - 0.25) < 1e-9
+        assert results["max"] == 0.4
+        assert results["setup_errors"] == 1
+        assert results["error_counts"] == {
+            "FlowError: timeout": 1,
+            "setup FlowError: no connection": 1,
+        }
+
+    def test_as_dict_without_exchanges(self):
+        results = LoadStats().as_dict(0)
+        assert results["exchanges"] == 0
+        assert results["error_rate"] == 0.0
+        assert results["throughput"] == 0.0
+        assert results["mean"] == 0.0
+
+
+class TestExchangeCounter:
+
+    def test_count(self):
+        next_exchange = exchange_counter(3, 0)
+        assert [next_exchange() for _ in range(5)] == [True, True, True, False, False]
+
+    def test_duration(self):
+        next_exchange = exchange_counter(0, 0.05)
+        assert next_exchange()
+        time.sleep(0.06)
+        assert not next_exchange()
+
+    def test_count_and_duration(self):
+        next_exchange = exchange_counter(2, 60)
+        assert [next_exchange() for _ in range(3)] == [True, True, False]
+
+
+class TestWorker:
+
+    def test_setup_failure_stops_the_worker(self, monkeypatch):
+        def run_connection(*args):
+            raise FlowError("POST connection/create-invitation returned 500")
+
+        monkeypatch.setattr("util.load.run_connection", run_connection)
+        args = SimpleNamespace(
+            flow="issue-credential-v2", issuer="issuer", holder="holder", timeout=1
+        )
+        stats = LoadStats()
+        next_exchange = exchange_counter(5, 0)
+
+        worker(args, {}, stats, next_exchange)
+
+        assert stats.setup_errors == 1
+        assert stats.exchanges.requests == 0
+        # the exchanges are left to the other workers
+        assert next_exchange()
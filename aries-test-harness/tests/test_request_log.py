@@ -0,0 +1,94 @@
+import io
+import json
+
+from agent_backchannel_client import RequestLogWriter
+from util.request_log import sort_request_log
+
+
+def read_log(writer):
+    with open(writer.path) as fin:
+        return fin.read()
+
+
+class TestRequestLogWriter:
+
+    def test_batches_until_flushed(self, tmp_path):
+        writer = RequestLogWriter(
+            str(tmp_path / "request.log"), "text", buffer_size=100, flush_interval=60
+        )
+        writer.log("GET", "http://bob/agent/command/status", 200, '{"status": "active"}')
+        writer.log("POST", "http://bob/agent/command/did", 200, "{}", {"data": 1})
+        assert not (tmp_path / "request.log").exists()
+
+        writer.flush()
+        assert read_log(writer) == (
+            'Req: GET http://bob/agent/command/status \n'
+            'Res: 200 {"status": "active"}\n'
+            "-----\n"
+            'Req: POST http://bob/agent/command/did {"data": 1}\n'
+            "Res: 200 {}\n"
+            "-----\n"
+        )
+        writer.close()
+
+    def test_drops_the_oldest_when_full(self, tmp_path):
+        writer = RequestLogWriter(
+            str(tmp_path / "request.log"), "jsonl", buffer_size=2, flush_interval=60
+        )
+        # keep the background thread from flushing in between
+        with writer._flush_lock:
+            for n in range(3):
+                writer.log("GET", f"http://bob/{n}", 200, "{}", duration=0.1)
+            assert writer.dropped == 1
+        writer.close()
+
+        records = [json.loads(line) for line in read_log(writer).splitlines()]
+        assert records[0] == {"dropped": 1}
+        assert [record["url"] for record in records[1:]] == ["http://bob/1", "http://bob/2"]
+        assert writer.dropped == 0
+
+    def test_disabled_without_the_log_folder(self, tmp_path):
+        writer = RequestLogWriter(str(tmp_path / "missing" / "request.log"))
+        writer.log("GET", "http://bob/", 200, "{}")
+        assert not writer.buffer and writer._thread is None
+
+
+class TestSortRequestLog:
+
+    def sort(self, text):
+        fout = io.StringIO()
+        sort_request_log(io.StringIO(text), fout)
+        return fout.getvalue()
+
+    def test_text_format(self):
+        log = (
+            'Req: POST http://bob/agent/command/did {"b": 2, "a": {"d": 4, "c": 3}}\n'
+            "Res: 200 {\n"
+            '  "state": "done",\n'
+            '  "id": "1"\n'
+            "}\n"
+            "-----\n"
+            "Req: GET http://bob/agent/command/status \n"
+            "Res: 500 Traceback:\n"
+            "  line 1\n"
+            "-----\n"
+        )
+        assert self.sort(log) == (
+            'Req: POST http://bob/agent/command/did {"a": {"c": 3, "d": 4}, "b": 2}\n'
+            'Res: 200 {"id": "1", "state": "done"}\n'
+            "-----\n"
+            "Req: GET http://bob/agent/command/status \n"
+            "Res: 500 Traceback:\n"
+            "  line 1\n"
+            "-----\n"
+        )
+
+    def test_jsonl_format(self):
+        log = (
+            '{"dropped":1}\n'
+            '{"url":"http://bob/","method":"GET","response":"{\\"b\\":2,\\"a\\":1}"}\n'
+        )
+        assert self.sort(log) == (
+            '{"dropped": 1}\n'
+            '{"method": "GET", "response": {"a": 1, "b": 2}, "url": "http://bob/"}\n'
+        )
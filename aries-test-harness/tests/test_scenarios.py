@@ -0,0 +1,57 @@
+import os
+
+from util.scenarios import (Feature, Scenario, read_features, select_features,
+                            shard_features)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def scenario(location, weight=1):
+    s = Scenario(location, [], location)
+    s.weight = weight
+    return s
+
+
+class TestShardFeatures:
+
+    def test_balanced_by_weight(self):
+        feature = Feature("f", [])
+        feature.scenarios = [
+            scenario("f:1", 4),
+            scenario("f:2", 1),
+            scenario("f:3", 3),
+            scenario("f:4", 2),
+            scenario("f:5", 2),
+        ]
+
+        shards = shard_features([feature], 2)
+        assert sorted(loc for shard in shards for loc in shard) == [
+            "f:1", "f:2", "f:3", "f:4", "f:5",
+        ]
+        weights = {s.location: s.weight for s in feature.scenarios}
+        assert sorted(sum(weights[loc] for loc in shard) for shard in shards) == [6, 6]
+        # in feature file order within a shard
+        assert all(shard == sorted(shard) for shard in shards)
+
+    def test_more_shards_than_scenarios(self):
+        feature = Feature("f", [])
+        feature.scenarios = [scenario("f:1")]
+        assert shard_features([feature], 3) == [["f:1"], [], []]
+
+
+class TestReadFeatures:
+
+    def test_shards_cover_the_selected_scenarios(self, monkeypatch):
+        monkeypatch.chdir(REPO_ROOT)
+        selected = select_features(read_features(), ["AcceptanceTest", "~wip"])
+        locations = [s.location for f in selected for s in f.scenarios]
+        assert locations
+
+        shards = shard_features(selected, 4)
+        assert sorted(loc for shard in shards for loc in shard) == sorted(locations)
+        assert all(shards)
+
+    def test_no_scenarios_selected(self, monkeypatch):
+        monkeypatch.chdir(REPO_ROOT)
+        selected = select_features(read_features(), ["no-such-tag"])
+        assert shard_features(selected, 2) == [[], []]
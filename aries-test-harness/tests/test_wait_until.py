@@ -0,0 +1,19 @@
+from agent_test_utils import wait_until
+
+
+class TestWaitUntil:
+
+    def test_returns_the_first_truthy_value(self):
+        values = iter([None, 0, "done"])
+        assert wait_until(lambda: next(values), timeout=5, initial_delay=0.01) == "done"
+
+    def test_returns_the_falsy_value_on_timeout(self):
+        calls = []
+
+        def predicate():
+            calls.append(1)
+            return []
+
+        assert wait_until(predicate, timeout=0.05, initial_delay=0.01) == []
+        # checked right away and again until the deadline
+        assert len(calls) > 1
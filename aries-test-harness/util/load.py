@@ -0,0 +1,396 @@
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from random import randint
+from timeit import default_timer
+
+# the load generator drives the backchannels with the same client as the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent_backchannel_client import (RequestStats, agent_backchannel_GET,
+                                      agent_backchannel_POST, client_runtime,
+                                      latency_profiler)
+from agent_test_utils import agent_state_in, wait_until
+
+FLOWS = ("connection", "issue-credential-v2", "present-proof-v2")
+
+SCHEMA_ATTRIBUTES = ["attr_1", "attr_2", "attr_3"]
+
+class FlowError(Exception):
+    pass
+
+class LoadStats:
+    """Latency and errors of the exchanges run by all the workers"""
+
+    def __init__(self):
+        self.exchanges = RequestStats()
+        self.error_counts = {}
+        # workers that stopped because the exchanges their flow depends on failed
+        self.setup_errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, duration, error=None):
+        with self._lock:
+            self.exchanges.record(duration, error=error is not None)
+            if error is not None:
+                self.error_counts[error] = self.error_counts.get(error, 0) + 1
+
+    def record_setup_error(self, error):
+        with self._lock:
+            self.setup_errors += 1
+            error = f"setup {error}"
+            self.error_counts[error] = self.error_counts.get(error, 0) + 1
+
+    def as_dict(self, elapsed) -> dict:
+        stats = self.exchanges
+        completed = stats.requests - stats.errors
+        return {
+            "exchanges": stats.requests,
+            "completed": completed,
+            "errors": stats.errors,
+            "error_rate": stats.errors / stats.requests if stats.requests else 0.0,
+            "elapsed": elapsed,
+            "throughput": completed / elapsed if elapsed else 0.0,
+            "mean": stats.total_time / stats.requests if stats.requests else 0.0,
+            "p50": stats.percentile(50),
+            "p90": stats.percentile(90),
+            "p95": stats.percentile(95),
+            "p99": stats.percentile(99),
+            "max": stats.max_time,
+            "setup_errors": self.setup_errors,
+            "error_counts": self.error_counts,
+            "operations": {
+                name: {
+                    "requests": op.requests,
+                    "p50": op.percentile(50),
+                    "p95": op.percentile(95),
+                    "p99": op.percentile(99),
+                    "max": op.max_time,
+                }
+                for (name, op) in sorted(latency_profiler.operations.items())
+            },
+        }
+
+def post(agent_url, topic, operation=None, id=None, data=None) -> dict:
+    (resp_status, resp_text) = agent_backchannel_POST(
+        agent_url + "/agent/command/", topic, operation=operation, id=id, data=data
+    )
+    if resp_status != 200:
+        raise FlowError(f"POST {topic}/{operation or ''} returned {resp_status}")
+    return json.loads(resp_text)
+
+def wait_for_state(agent_url, topic, id, states, timeout):
+    if not wait_until(agent_state_in(agent_url, topic, id, states), timeout):
+        raise FlowError(f"{topic} did not reach {'/'.join(states)}")
+
+def find_credential_id(data):
+    if isinstance(data, dict):
+        for (key, value) in data.items():
+            if key == "credential_id":
+                return value
+            result = find_credential_id(value)
+            if result is not None:
+                return result
+    elif isinstance(data, list):
+        for item in data:
+            result = find_credential_id(item)
+            if result is not None:
+                return result
+    return None
+
+def setup_issuer(issuer_url) -> dict:
+    # one schema and credential definition, shared by all the issuances
+    (resp_status, resp_text) = agent_backchannel_GET(issuer_url + "/agent/command/", "did")
+    if resp_status != 200:
+        raise FlowError(f"GET did returned {resp_status}")
+    issuer_did = json.loads(resp_text)["did"]
+
+    schema = post(issuer_url, "schema", data={
+        "schema_name": f"load_schema.{randint(1, 1_000_000)}",
+        "schema_version": "1.0.0",
+        "attributes": SCHEMA_ATTRIBUTES,
+    })
+    cred_def = post(issuer_url, "credential-definition", data={
+        "support_revocation": False,
+        "schema_id": schema["schema_id"],
+        "issuer_id": issuer_did,
+        "tag": str(randint(1, 10000)),
+    })
+    return {"did": issuer_did, "cred_def_id": cred_def["credential_definition_id"]}
+
+def run_connection(issuer_url, holder_url, timeout) -> dict:
+    # RFC0160: invitation, request, response, then a ping to complete the connection
+    invitation = post(issuer_url, "connection", "create-invitation", data={})
+    issuer_connection_id = invitation.get("connection_id")
+
+    received = post(
+        holder_url, "connection", "receive-invitation", data=invitation["invitation"]
+    )
+    holder_connection_id = received["connection_id"]
+    if not issuer_connection_id:
+        (resp_status, resp_text) = agent_backchannel_GET(
+            issuer_url + "/agent/response/",
+            "connection",
+            id=invitation["invitation"]["@id"],
+        )
+        if resp_status != 200:
+            raise FlowError(f"GET connection response returned {resp_status}")
+        issuer_connection_id = json.loads(resp_text)["connection_id"]
+
+    post(holder_url, "connection", "accept-invitation", id=holder_connection_id)
+    wait_for_state(
+        issuer_url,
+        "connection",
+        issuer_connection_id,
+        ["requested", "responded", "complete"],
+        timeout,
+    )
+    post(issuer_url, "connection", "accept-request", id=issuer_connection_id)
+    post(
+        holder_url,
+        "connection",
+        "send-ping",
+        id=holder_connection_id,
+        data={"comment": "load test ping"},
+    )
+    wait_for_state(holder_url, "connection", holder_connection_id, ["complete"], timeout)
+    wait_for_state(issuer_url, "connection", issuer_connection_id, ["complete"], timeout)
+    return {"issuer": issuer_connection_id, "holder": holder_connection_id}
+
+def run_issue_credential_v2(issuer_url, holder_url, issuer, connection, timeout) -> str:
+    offer = post(issuer_url, "issue-credential-v2", "send-offer", data={
+        "connection_id": connection["issuer"],
+        "credential_preview": {
+            "@type": "https://didcomm.org/issue-credential/2.0/credential-preview",
+            "attributes": [
+                {"name": name, "value": f"value_{n}"}
+                for (n, name) in enumerate(SCHEMA_ATTRIBUTES, 1)
+            ],
+        },
+        "filter": {"indy": {"cred_def_id": issuer["cred_def_id"]}},
+    })
+    thread_id = offer["thread_id"]
+
+    wait_for_state(holder_url, "issue-credential-v2", thread_id, ["offer-received"], timeout)
+    post(holder_url, "issue-credential-v2", "send-request", id=thread_id)
+    wait_for_state(issuer_url, "issue-credential-v2", thread_id, ["request-received"], timeout)
+    post(
+        issuer_url,
+        "issue-credential-v2",
+        "issue",
+        id=thread_id,
+        data={"comment": "issuing credential"},
+    )
+    wait_for_state(
+        holder_url,
+        "issue-credential-v2",
+        thread_id,
+        ["credential-received", "done"],
+        timeout,
+    )
+    stored = post(holder_url, "issue-credential-v2", "store", id=thread_id)
+    if stored.get("state") != "done":
+        raise FlowError(f"credential state is {stored.get('state')}, expected done")
+    return find_credential_id(stored)
+
+def run_present_proof_v2(verifier_url, prover_url, issuer, connection, credential_id, timeout):
+    request = post(verifier_url, "proof-v2", "send-request", data={
+        "presentation_request": {
+            "format": "indy",
+            "comment": "load test presentation request",
+            "connection_id": connection["issuer"],
+            "data": {
+                "requested_attributes": {
+                    "attr_1": {
+                        "name": "attr_1",
+                        "restrictions": [{"cred_def_id": issuer["cred_def_id"]}],
+                    }
+                },
+                "version": "0.1.0",
+            },
+        }
+    })
+    thread_id = request["thread_id"]
+
+    wait_for_state(prover_url, "proof-v2", thread_id, ["request-received"], timeout)
+    post(prover_url, "proof-v2", "send-presentation", id=thread_id, data={
+        "format": "indy",
+        "comment": "load test presentation",
+        "requested_attributes": {"attr_1": {"cred_id": credential_id, "revealed": True}},
+    })
+    wait_for_state(verifier_url, "proof-v2", thread_id, ["presentation-received"], timeout)
+    verified = post(verifier_url, "proof-v2", "verify-presentation", id=thread_id)
+    if verified.get("state") != "done":
+        raise FlowError(f"presentation state is {verified.get('state')}, expected done")
+
+def exchange_counter(count, duration):
+    """
+    The next_exchange() of the workers: True while another exchange should be started,
+    until count exchanges were started or duration seconds passed (0 for no limit)
+    """
+    lock = threading.Lock()
+    started = [0]
+    deadline = default_timer() + duration if duration else None
+
+    def next_exchange():
+        if deadline is not None and default_timer() >= deadline:
+            return False
+        with lock:
+            if count and started[0] >= count:
+                return False
+            started[0] += 1
+            return True
+
+    return next_exchange
+
+def worker(args, issuer, stats, next_exchange):
+    # the exchanges a flow depends on are set up once per worker, outside the measurements
+    connection = None
+    credential_id = None
+    try:
+        if args.flow != "connection":
+            connection = run_connection(args.issuer, args.holder, args.timeout)
+        if args.flow == "present-proof-v2":
+            credential_id = run_issue_credential_v2(
+                args.issuer, args.holder, issuer, connection, args.timeout
+            )
+    except Exception as e:
+        # without its connection (or credential) the worker can't run any exchange
+        stats.record_setup_error(f"{type(e).__name__}: {e}")
+        return
+
+    while next_exchange():
+        start = default_timer()
+        error = None
+        try:
+            if args.flow == "connection":
+                run_connection(args.issuer, args.holder, args.timeout)
+            elif args.flow == "issue-credential-v2":
+                run_issue_credential_v2(
+                    args.issuer, args.holder, issuer, connection, args.timeout
+                )
+            else:
+                run_present_proof_v2(
+                    args.issuer, args.holder, issuer, connection, credential_id, args.timeout
+                )
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        stats.record(default_timer() - start, error)
+
+def print_results(flow, concurrency, results):
+    print(
+        f"{flow}: {results['completed']}/{results['exchanges']} exchanges completed"
+        f" in {results['elapsed']:.1f}s with concurrency {concurrency},"
+        f" {results['throughput']:.2f} exchanges/sec,"
+        f" error rate {results['error_rate'] * 100:.1f}%"
+    )
+    print(
+        "  latency:"
+        + "".join(
+            f" {p} {results[p] * 1000:.0f}ms"
+            for p in ("mean", "p50", "p90", "p95", "p99", "max")
+        )
+    )
+    if results["setup_errors"]:
+        print(f"  {results['setup_errors']} of {concurrency} workers failed to set up")
+    for (error, count) in sorted(results["error_counts"].items(), key=lambda e: -e[1]):
+        print(f"  {count:5}x {error}")
+    print("  backchannel operations:")
+    for (name, op) in results["operations"].items():
+        print(
+            f"    {op['requests']:6}x p50 {op['p50'] * 1000:.0f}ms p95 {op['p95'] * 1000:.0f}ms"
+            f" p99 {op['p99'] * 1000:.0f}ms max {op['max'] * 1000:.0f}ms  {name}"
+        )
+
+def main(args):
+    client_runtime.pool_size = max(client_runtime.pool_size, args.concurrency)
+    # collect the latencies per backchannel topic/operation
+    latency_profiler.enabled = True
+    issuer = None
+    if args.flow != "connection":
+        issuer = setup_issuer(args.issuer)
+
+    stats = LoadStats()
+    next_exchange = exchange_counter(args.count, args.duration)
+
+    start = default_timer()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [
+            executor.submit(worker, args, issuer, stats, next_exchange)
+            for _ in range(args.concurrency)
+        ]
+        for future in futures:
+            future.result()
+    results = stats.as_dict(default_timer() - start)
+
+    print_results(args.flow, args.concurrency, results)
+    if args.output:
+        with open(args.output, "w") as fout:
+            json.dump({"flow": args.flow, "concurrency": args.concurrency, **results}, fout, indent=2)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Drive concurrent protocol exchanges between two backchannels and report throughput, latency and errors",
+        formatter_class=lambda prog: argparse.HelpFormatter(prog, max_help_position=80))
+
+    parser.add_argument(
+        "-f",
+        "--flow",
+        choices=FLOWS,
+        default="issue-credential-v2",
+        help="Exchange to measure; the connection (and credential) it needs are set up once per worker (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Number of exchanges run at the same time (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-n",
+        "--count",
+        type=int,
+        default=100,
+        help="Total number of exchanges, 0 for no limit (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-d",
+        "--duration",
+        type=float,
+        default=0,
+        help="Stop starting new exchanges after this many seconds (default: no limit)",
+    )
+    parser.add_argument(
+        "--issuer",
+        default="http://localhost:9020",
+        help="Backchannel of the inviter / issuer / verifier (default: %(default)s, Acme)",
+    )
+    parser.add_argument(
+        "--holder",
+        default="http://localhost:9030",
+        help="Backchannel of the invitee / holder / prover (default: %(default)s, Bob)",
+    )
+    parser.add_argument(
+        "-t",
+        "--timeout",
+        type=float,
+        default=60.0,
+        help="Seconds to wait for an agent to reach the next state (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Also write the results as JSON to this file",
+    )
+    args = parser.parse_args()
+    if not args.count and not args.duration:
+        parser.error("either --count or --duration must be given")
+
+    try:
+        main(args)
+    except KeyboardInterrupt:
+        exit(1)
@@ -0,0 +1,92 @@
+import argparse
+import json
+import sys
+
+def sorted_payload(val, level=0):
+    valdict = None
+    if isinstance(val, str) and len(val) > 1 and (val[0]+val[-1]) == '{}':
+        try:
+            valdict = dict(json.loads(val))
+        except ValueError:
+            valdict = None
+    elif isinstance(val, dict):
+        valdict = val
+    if valdict:
+        valdict = dict(sorted(valdict.items()))
+        valdict = {k:sorted_payload(v, level+1) for (k,v) in valdict.items()}
+        val = level and valdict or json.dumps(valdict)
+    return val
+
+def sort_text_entry(entry):
+    # Req: <method> <url> <payload>
+    # Res: <status> <text>
+    # either body can span several lines, the entry ends at a "-----" line
+    if not entry.startswith('Req: '):
+        return entry
+    (request, sep, response) = entry.partition('\nRes: ')
+    parts = request.split(' ', 3)
+    if len(parts) == 4:
+        parts[3] = sorted_payload(parts[3])
+    request = ' '.join(parts)
+    if sep:
+        parts = response.split(' ', 1)
+        if len(parts) == 2:
+            parts[1] = sorted_payload(parts[1])
+        response = ' '.join(parts)
+    return request + sep + response
+
+def sort_json_line(line):
+    record = json.loads(line)
+    for key in ('request', 'response'):
+        if isinstance(record.get(key), str):
+            try:
+                record[key] = json.loads(record[key])
+            except ValueError:
+                pass
+    return json.dumps(record, sort_keys=True)
+
+def sort_request_log(fin, fout):
+    entry = []
+    for line in fin:
+        line = line.rstrip('\n')
+        if not entry and line.startswith('{'):
+            print(sort_json_line(line), file=fout)
+        elif line == '-----':
+            print(sort_text_entry('\n'.join(entry)), file=fout)
+            print(line, file=fout)
+            entry = []
+        else:
+            entry.append(line)
+    if entry:
+        print(sort_text_entry('\n'.join(entry)), file=fout)
+
+def main(input_file, output_file):
+    with open(input_file, 'r') as fin:
+        if output_file:
+            with open(output_file, 'w') as fout:
+                sort_request_log(fin, fout)
+        else:
+            sort_request_log(fin, sys.stdout)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Deep sort the request/response payloads of the harness request log, so runs can be diffed",
+        formatter_class=lambda prog: argparse.HelpFormatter(prog, max_help_position=80))
+
+    parser.add_argument(
+        "-i",
+        "--input",
+        default=".logs/request.log",
+        help="Request log written by the test harness (text or jsonl format)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Write the sorted log to this file instead of stdout",
+    )
+    args = parser.parse_args()
+
+    try:
+        main(args.input, args.output)
+    except KeyboardInterrupt:
+        exit(1)
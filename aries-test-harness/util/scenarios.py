@@ -1,20 +1,27 @@
 import argparse
 import glob
+import os
 import re
+import sys
 
 from typing import List
 
 class Scenario:
-    def __init__(self, name, tags):
+    def __init__(self, name, tags, location=None):
         self.name = name
         self.tags = tags
+        # behave location (features/<file>:<line>) used to run just this scenario
+        self.location = location
+        # number of runs: 1 for a plain scenario, the number of example rows for an outline
+        self.weight = 1
     def __str__(self):
         return f'Scenario: {self.name}, {self.tags}'
 
 class Feature:
-    def __init__(self, name, tags):
+    def __init__(self, name, tags, path=None):
         self.name = name
         self.tags = tags
+        self.path = path
         self.scenarios = []
     def __str__(self):
         return f'Feature: {self.name}, {self.tags}'
@@ -37,7 +44,7 @@ def select_features(features, tag_options) -> List[Feature]:
         return ','.join(tlst)
 
     tag_options = [prefix(t) for t in tag_options]
-    print(f'Selecting: {tag_options}')
+    print(f'Selecting: {tag_options}', file=sys.stderr)
 
     def selected(feature_tags):
         result = True
@@ -58,10 +65,12 @@ def select_features(features, tag_options) -> List[Feature]:
 
     result = []
     for f in features:
-        auxf = Feature(f.name, f.tags)
+        auxf = Feature(f.name, f.tags, f.path)
         for s in f.scenarios:
             if selected(f.tags + s.tags):
-                auxf.scenarios.append(s)
+                auxs = Scenario(s.name, s.tags, s.location)
+                auxs.weight = s.weight
+                auxf.scenarios.append(auxs)
         auxf.tags = list(set(relevant_tags) & set(f.tags))
         for s in auxf.scenarios:
             scenario_tags = [x for x in s.tags if re.match(r'@T\d{3}.*', x)]
@@ -89,36 +98,75 @@ def show_features(features, markdown):
             else:
                 print(f"{prefix} {s.name}")
 
+def shard_features(features, shards) -> List[List[str]]:
+    """Split the scenarios of the features into balanced shards of behave locations"""
+    scenarios = [s for f in features for s in f.scenarios]
+    order = {s.location: n for (n, s) in enumerate(scenarios)}
+
+    # largest first, each to the least loaded shard
+    result = [[] for _ in range(shards)]
+    loads = [0] * shards
+    for s in sorted(scenarios, key=lambda s: s.weight, reverse=True):
+        idx = loads.index(min(loads))
+        result[idx].append(s.location)
+        loads[idx] += s.weight
+
+    # keep the feature file order within a shard
+    return [sorted(shard, key=lambda loc: order[loc]) for shard in result]
+
+def show_shards(shards):
+    for shard in shards:
+        print(" ".join(shard))
+
 def read_features() -> List[Feature]:
     features = []
     for path in sorted(glob.glob("./aries-test-harness/features/*.feature")):
+        location = "features/" + os.path.basename(path)
         with open(path, 'r') as fin:
             feature = None
+            scenario = None
             last_line = None
-            for line in fin.readlines():
+            in_examples = False
+            for (lineno, line) in enumerate(fin.readlines(), start=1):
                 line = line.strip()
                 if line.startswith('Feature'):
                     assert not feature, "Multiple features"
                     colidx = line.index(':')
                     name = line[colidx+1:].strip()
                     ftags = last_line.split()
-                    feature = Feature(name, ftags)
+                    feature = Feature(name, ftags, path)
                 elif line.startswith('Scenario'):
                     assert feature, "No features"
                     colidx = line.index(':')
                     name = line[colidx+1:].strip()
                     stags = last_line.split()
-                    scenario = Scenario(name, stags)
+                    scenario = Scenario(name, stags, f"{location}:{lineno}")
+                    if line.startswith('Scenario Outline'):
+                        scenario.weight = 0
                     feature.scenarios.append(scenario)
+                    in_examples = False
+                elif line.startswith('Examples'):
+                    in_examples = 'header'
+                elif in_examples and line.startswith('|'):
+                    # the first row of each examples table is the header
+                    if in_examples == 'header':
+                        in_examples = True
+                    else:
+                        scenario.weight += 1
                 last_line = line
             if feature and feature.scenarios:
+                for scenario in feature.scenarios:
+                    scenario.weight = max(scenario.weight, 1)
                 features.append(feature)
     return features
 
-def main(tags, markdown):
+def main(tags, markdown, shards=None):
     features = read_features()
     selected = select_features(features, tags)
-    show_features(selected, markdown)
+    if shards:
+        show_shards(shard_features(selected, shards))
+    else:
+        show_features(selected, markdown)
 
 if __name__ == "__main__":
 
@@ -137,10 +185,16 @@ if __name__ == "__main__":
         action='store_true',
         help="Display result as markdown table",
     )
+    parser.add_argument(
+        "-s",
+        "--shards",
+        type=int,
+        help="Split the selected scenarios into this many balanced shards, one line of behave locations per shard",
+    )
     args = parser.parse_args()
 
     try:
         # args.tags = ['@AcceptanceTest', '@AIP10', '~@wip']        
-        main(args.tags, args.markdown)
+        main(args.tags, args.markdown, args.shards)
     except KeyboardInterrupt:
         exit(1)
@@ -0,0 +1,512 @@
+"""
+In-memory stand-in for the von-network ledger, for runs that don't need a real Indy pool.
+
+Serves the endpoints the backchannels use to bootstrap against von-network, and the
+Indy ledger requests of the ACA-Py ledger plugin (aries-backchannels/acapy/ledger_stand_in):
+
+    GET  /genesis        an empty genesis: there are no ledger nodes
+    POST /register       "registers" a DID (from a seed, or a did and verkey): writes its NYM
+    GET  /ledger/domain  the domain ledger transactions, filtered by query and type
+    POST /submit         a (signed) Indy ledger request; the reply is {"op": "REPLY", "result"}
+                         or {"op": "REJECT", "reason"}, as from a pool
+    PUT  /tails/{id}     a tails file, for a revocation registry id (checked against its
+                         REVOC_REG_DEF) or for hash/{tails hash}, as to the indy tails-server
+    GET  /tails/{id}     the tails file
+    GET  /status         the number of registered DIDs and of ledger transactions
+
+The domain ledger supports the NYM, ATTRIB, SCHEMA, CLAIM_DEF, REVOC_REG_DEF and
+REVOC_REG_ENTRY transactions and their reads, which is what schema, credential definition
+and revocation scenarios need. It is written in one process' memory: request signatures
+and NYM roles are not checked, there is no consensus and the replies have no state proofs.
+It serves the tails files too, as the tails-server checks uploads on the Indy pool.
+"""
+import argparse
+import hashlib
+import json
+import secrets
+import string
+import time
+
+import base58
+import nacl.signing
+from aiohttp import web
+
+ROLES = ("STEWARD", "TRUSTEE", "ENDORSER", "TRUST_ANCHOR", "NETWORK_MONITOR", None)
+
+# the role codes of NYM transactions
+ROLE_CODES = {
+    "TRUSTEE": "0",
+    "STEWARD": "2",
+    "ENDORSER": "101",
+    "TRUST_ANCHOR": "101",
+    "NETWORK_MONITOR": "201",
+    None: None,
+}
+
+DOMAIN_LEDGER_ID = 1
+
+TAILS_MAX_BYTES = 100 * 1024 * 1024
+
+NYM = "1"
+ATTRIB = "100"
+SCHEMA = "101"
+CLAIM_DEF = "102"
+REVOC_REG_DEF = "113"
+REVOC_REG_ENTRY = "114"
+GET_TXN = "3"
+GET_TXN_AUTHR_AGRMT = "6"
+GET_TXN_AUTHR_AGRMT_AML = "7"
+GET_ATTR = "104"
+GET_NYM = "105"
+GET_SCHEMA = "107"
+GET_CLAIM_DEF = "108"
+GET_REVOC_REG_DEF = "115"
+GET_REVOC_REG = "116"
+GET_REVOC_REG_DELTA = "117"
+
+
+class RequestRejected(Exception):
+    """The ledger rejects a request, with this reason"""
+
+
+def required(data: dict, *keys: str) -> list:
+    """The values of the keys of a request, which is rejected if any is missing"""
+    if not isinstance(data, dict):
+        raise RequestRejected(f"Expected an object with {', '.join(keys)}")
+    missing = [key for key in keys if data.get(key) is None]
+    if missing:
+        raise RequestRejected(f"Missing required fields: {', '.join(missing)}")
+    return [data[key] for key in keys]
+
+
+def did_from_seed(seed: str) -> dict:
+    """The Indy DID and verkey of a 32 character seed"""
+    signing_key = nacl.signing.SigningKey(seed.encode("ascii"))
+    verkey = bytes(signing_key.verify_key)
+    return {
+        "did": base58.b58encode(verkey[:16]).decode("ascii"),
+        "verkey": base58.b58encode(verkey).decode("ascii"),
+    }
+
+
+class LedgerStandIn:
+    def __init__(self):
+        # the domain ledger: the transaction with seqNo n is txns[n - 1]
+        self.txns = []
+        # did -> {did, verkey, alias, role}
+        self.nyms = {}
+        # (did, attribute name) -> ATTRIB transaction
+        self.attribs = {}
+        # schema id -> SCHEMA transaction
+        self.schemas = {}
+        # cred def id -> CLAIM_DEF transaction
+        self.cred_defs = {}
+        # revocation registry id -> REVOC_REG_DEF transaction
+        self.rev_reg_defs = {}
+        # revocation registry id -> its REVOC_REG_ENTRY transactions, oldest first
+        self.rev_reg_entries = {}
+        # revocation registry id, or hash/{tails hash} -> tails file
+        self.tails = {}
+
+        self.writes = {
+            NYM: self.write_nym,
+            ATTRIB: self.write_attrib,
+            SCHEMA: self.write_schema,
+            CLAIM_DEF: self.write_cred_def,
+            REVOC_REG_DEF: self.write_rev_reg_def,
+            REVOC_REG_ENTRY: self.write_rev_reg_entry,
+        }
+        self.reads = {
+            GET_TXN: self.read_txn,
+            GET_TXN_AUTHR_AGRMT: self.read_taa,
+            GET_TXN_AUTHR_AGRMT_AML: self.read_taa,
+            GET_ATTR: self.read_attrib,
+            GET_NYM: self.read_nym,
+            GET_SCHEMA: self.read_schema,
+            GET_CLAIM_DEF: self.read_cred_def,
+            GET_REVOC_REG_DEF: self.read_rev_reg_def,
+            GET_REVOC_REG: self.read_rev_reg,
+            GET_REVOC_REG_DELTA: self.read_rev_reg_delta,
+        }
+
+    def register(self, data: dict) -> dict:
+        seed = data.get("seed")
+        role = data.get("role") or None
+        if role not in ROLES:
+            raise web.HTTPBadRequest(reason=f"Invalid role: {role}")
+
+        if data.get("did") and data.get("verkey"):
+            nym = {"did": data["did"], "verkey": data["verkey"]}
+        else:
+            if not seed:
+                alphabet = string.ascii_letters + string.digits
+                seed = "".join(secrets.choice(alphabet) for _ in range(32))
+            if len(seed) != 32 or not seed.isascii():
+                raise web.HTTPBadRequest(reason="Seed must be 32 characters")
+            nym = did_from_seed(seed)
+
+        self.write_nym(
+            None,
+            {
+                "dest": nym["did"],
+                "verkey": nym["verkey"],
+                "alias": data.get("alias"),
+                "role": ROLE_CODES[role],
+            },
+        )
+        return {**nym, "seed": seed}
+
+    def append(self, txn_type: str, request: dict, data: dict) -> dict:
+        """Write a transaction to the domain ledger"""
+        seq_no = len(self.txns) + 1
+        txn = {
+            "txn": {
+                "type": txn_type,
+                "data": data,
+                "metadata": {
+                    "from": request.get("identifier"),
+                    "reqId": request.get("reqId"),
+                },
+                "protocolVersion": 2,
+            },
+            "txnMetadata": {
+                "seqNo": seq_no,
+                "txnTime": int(time.time()),
+                "txnId": f"{seq_no}:{txn_type}",
+            },
+            "reqSignature": {},
+            "ver": "1",
+        }
+        self.txns.append(txn)
+        return txn
+
+    def submit(self, request: dict) -> dict:
+        """The reply of the ledger to an Indy request"""
+        operation = request.get("operation") or {}
+        if not isinstance(operation, dict):
+            raise RequestRejected("The operation must be an object")
+        txn_type = operation.get("type")
+        if txn_type in self.writes:
+            identifier = request.get("identifier")
+            if identifier not in self.nyms:
+                raise RequestRejected(f"verkey for {identifier} cannot be found")
+            data = {key: value for (key, value) in operation.items() if key != "type"}
+            return self.writes[txn_type](request, data)
+        if txn_type in self.reads:
+            result = {
+                "type": txn_type,
+                "identifier": request.get("identifier"),
+                "reqId": request.get("reqId"),
+                "seqNo": None,
+                "txnTime": None,
+                "data": None,
+            }
+            self.reads[txn_type](operation, result)
+            return result
+        raise RequestRejected(f"Unsupported transaction type: {txn_type}")
+
+    def write_nym(self, request: dict, data: dict) -> dict:
+        did = data.get("dest")
+        if not did:
+            raise RequestRejected("A NYM needs a dest")
+        nym = self.nyms.get(did, {"did": did, "verkey": None, "alias": None, "role": None})
+        nym.update({key: data[key] for key in ("verkey", "alias", "role") if key in data})
+        self.nyms[did] = nym
+        return self.append(NYM, request or {}, data)
+
+    def write_attrib(self, request: dict, data: dict) -> dict:
+        did = data.get("dest")
+        if did not in self.nyms:
+            raise RequestRejected(f"{did} is not a NYM on the ledger")
+        try:
+            names = list(json.loads(data["raw"]))
+        except (KeyError, TypeError, ValueError):
+            raise RequestRejected("Only raw attributes are supported")
+        txn = self.append(ATTRIB, request, data)
+        for name in names:
+            self.attribs[(did, name)] = txn
+        return txn
+
+    def write_schema(self, request: dict, data: dict) -> dict:
+        (schema,) = required(data, "data")
+        (name, version) = required(schema, "name", "version")
+        schema_id = f"{request['identifier']}:2:{name}:{version}"
+        if schema_id in self.schemas:
+            raise RequestRejected(
+                f"{request['identifier']} can have one and only one SCHEMA with name "
+                f"{name} and version {version}"
+            )
+        self.schemas[schema_id] = self.append(SCHEMA, request, data)
+        return self.schemas[schema_id]
+
+    def write_cred_def(self, request: dict, data: dict) -> dict:
+        (ref, signature_type) = required(data, "ref", "signature_type")
+        required(data, "data")
+        schema_txn = self.txn(ref)
+        if not schema_txn or schema_txn["txn"]["type"] != SCHEMA:
+            raise RequestRejected(f"Mentioned seqNo ({ref}) isn't a SCHEMA")
+        cred_def_id = self.cred_def_id(
+            request["identifier"], signature_type, ref, data.get("tag")
+        )
+        self.cred_defs[cred_def_id] = self.append(CLAIM_DEF, request, data)
+        return self.cred_defs[cred_def_id]
+
+    def write_rev_reg_def(self, request: dict, data: dict) -> dict:
+        (rev_reg_id, cred_def_id, value) = required(data, "id", "credDefId", "value")
+        required(value, "tailsHash")
+        if cred_def_id not in self.cred_defs:
+            raise RequestRejected(f"There is no claim def by path {cred_def_id}")
+        self.rev_reg_defs[rev_reg_id] = self.append(REVOC_REG_DEF, request, data)
+        return self.rev_reg_defs[rev_reg_id]
+
+    def write_rev_reg_entry(self, request: dict, data: dict) -> dict:
+        (rev_reg_id, _, value) = required(
+            data, "revocRegDefId", "revocDefType", "value"
+        )
+        required(value, "accum")
+        if rev_reg_id not in self.rev_reg_defs:
+            raise RequestRejected(f"There is no any REVOC_REG_DEF by path {rev_reg_id}")
+        txn = self.append(REVOC_REG_ENTRY, request, data)
+        self.rev_reg_entries.setdefault(rev_reg_id, []).append(txn)
+        return txn
+
+    def txn(self, seq_no) -> dict:
+        if isinstance(seq_no, int) and 0 < seq_no <= len(self.txns):
+            return self.txns[seq_no - 1]
+        return None
+
+    @staticmethod
+    def cred_def_id(did: str, signature_type: str, ref: int, tag: str) -> str:
+        return f"{did}:3:{signature_type}:{ref}:{tag or 'default'}"
+
+    @staticmethod
+    def set_found(result: dict, txn: dict, data):
+        result["seqNo"] = txn["txnMetadata"]["seqNo"]
+        result["txnTime"] = txn["txnMetadata"]["txnTime"]
+        result["data"] = data
+
+    def read_txn(self, operation: dict, result: dict):
+        seq_no = operation.get("data")
+        result["seqNo"] = seq_no
+        if operation.get("ledgerId", DOMAIN_LEDGER_ID) == DOMAIN_LEDGER_ID:
+            result["data"] = self.txn(seq_no)
+
+    def read_taa(self, operation: dict, result: dict):
+        # no transaction author agreement to accept
+        pass
+
+    def read_nym(self, operation: dict, result: dict):
+        result["dest"] = operation.get("dest")
+        nym = self.nyms.get(operation.get("dest"))
+        if not nym:
+            return
+        txn = next(
+            txn
+            for txn in reversed(self.txns)
+            if txn["txn"]["type"] == NYM and txn["txn"]["data"]["dest"] == nym["did"]
+        )
+        data = {
+            "dest": nym["did"],
+            "identifier": txn["txn"]["metadata"]["from"],
+            "role": nym["role"],
+            "seqNo": txn["txnMetadata"]["seqNo"],
+            "txnTime": txn["txnMetadata"]["txnTime"],
+            "verkey": nym["verkey"],
+        }
+        self.set_found(result, txn, json.dumps(data))
+
+    def read_attrib(self, operation: dict, result: dict):
+        (did, name) = (operation.get("dest"), operation.get("raw"))
+        result.update(dest=did, raw=name)
+        txn = self.attribs.get((did, name))
+        if txn:
+            raw = json.loads(txn["txn"]["data"]["raw"])
+            self.set_found(result, txn, json.dumps({name: raw[name]}))
+
+    def read_schema(self, operation: dict, result: dict):
+        did = operation.get("dest")
+        schema = operation.get("data") or {}
+        result["dest"] = did
+        result["data"] = schema
+        txn = self.schemas.get(f"{did}:2:{schema.get('name')}:{schema.get('version')}")
+        if txn:
+            self.set_found(result, txn, txn["txn"]["data"]["data"])
+
+    def read_cred_def(self, operation: dict, result: dict):
+        result.update(
+            {key: operation.get(key) for key in ("ref", "signature_type", "origin", "tag")}
+        )
+        txn = self.cred_defs.get(
+            self.cred_def_id(
+                operation.get("origin"),
+                operation.get("signature_type"),
+                operation.get("ref"),
+                operation.get("tag"),
+            )
+        )
+        if txn:
+            self.set_found(result, txn, txn["txn"]["data"]["data"])
+
+    def read_rev_reg_def(self, operation: dict, result: dict):
+        result["id"] = operation.get("id")
+        txn = self.rev_reg_defs.get(operation.get("id"))
+        if txn:
+            self.set_found(result, txn, txn["txn"]["data"])
+
+    def entries_until(self, rev_reg_id: str, timestamp: int) -> list:
+        """The entries of a revocation registry written at or before a timestamp"""
+        return [
+            txn
+            for txn in self.rev_reg_entries.get(rev_reg_id, [])
+            if txn["txnMetadata"]["txnTime"] <= timestamp
+        ]
+
+    @staticmethod
+    def accum(rev_reg_id: str, txn: dict) -> dict:
+        return {
+            "revocDefType": txn["txn"]["data"]["revocDefType"],
+            "revocRegDefId": rev_reg_id,
+            "txnTime": txn["txnMetadata"]["txnTime"],
+            "seqNo": txn["txnMetadata"]["seqNo"],
+            "value": {"accum": txn["txn"]["data"]["value"]["accum"]},
+        }
+
+    def read_rev_reg(self, operation: dict, result: dict):
+        rev_reg_id = operation.get("revocRegDefId")
+        result["revocRegDefId"] = rev_reg_id
+        entries = self.entries_until(rev_reg_id, operation.get("timestamp", 0))
+        if entries:
+            self.set_found(result, entries[-1], self.accum(rev_reg_id, entries[-1]))
+
+    def read_rev_reg_delta(self, operation: dict, result: dict):
+        rev_reg_id = operation.get("revocRegDefId")
+        result["revocRegDefId"] = rev_reg_id
+        entries_to = self.entries_until(rev_reg_id, operation.get("to", 0))
+        if not entries_to:
+            return
+        entries_from = (
+            self.entries_until(rev_reg_id, operation["from"])
+            if operation.get("from") is not None
+            else []
+        )
+
+        # the issued and revoked indexes since the "from" entry
+        (issued, revoked) = (set(), set())
+        for txn in entries_to[len(entries_from) :]:
+            value = txn["txn"]["data"]["value"]
+            for index in value.get("issued") or []:
+                issued.add(index)
+                revoked.discard(index)
+            for index in value.get("revoked") or []:
+                revoked.add(index)
+                issued.discard(index)
+
+        value = {
+            "accum_to": self.accum(rev_reg_id, entries_to[-1]),
+            "issued": sorted(issued),
+            "revoked": sorted(revoked),
+        }
+        if entries_from:
+            value["accum_from"] = self.accum(rev_reg_id, entries_from[-1])
+        data = {
+            "revocDefType": entries_to[-1]["txn"]["data"]["revocDefType"],
+            "revocRegDefId": rev_reg_id,
+            "value": value,
+        }
+        self.set_found(result, entries_to[-1], data)
+
+    async def handle_genesis(self, request: web.Request) -> web.Response:
+        return web.Response(text="")
+
+    async def handle_register(self, request: web.Request) -> web.Response:
+        try:
+            data = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(reason="Expected a JSON body")
+        return web.json_response(self.register(data))
+
+    async def handle_submit(self, request: web.Request) -> web.Response:
+        try:
+            ledger_request = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(reason="Expected a JSON body")
+        if not isinstance(ledger_request, dict):
+            raise web.HTTPBadRequest(reason="Expected a JSON object")
+        try:
+            reply = {"op": "REPLY", "result": self.submit(ledger_request)}
+        except RequestRejected as err:
+            reply = {
+                "op": "REJECT",
+                "identifier": ledger_request.get("identifier"),
+                "reqId": ledger_request.get("reqId"),
+                "reason": f"client request invalid: {err}",
+            }
+        return web.json_response(reply)
+
+    async def handle_put_tails(self, request: web.Request) -> web.Response:
+        tails_id = request.match_info["tails_id"]
+        if tails_id.startswith("hash/"):
+            tails_hash = tails_id[len("hash/") :]
+        else:
+            rev_reg_def = self.rev_reg_defs.get(tails_id)
+            if not rev_reg_def:
+                raise web.HTTPNotFound(reason=f"No revocation registry {tails_id}")
+            tails_hash = rev_reg_def["txn"]["data"]["value"]["tailsHash"]
+
+        tails = None
+        async for part in await request.multipart():
+            if part.name == "tails":
+                tails = await part.read()
+        if tails is None:
+            raise web.HTTPBadRequest(reason="Expected a tails file")
+        if base58.b58encode(hashlib.sha256(tails).digest()).decode("ascii") != tails_hash:
+            raise web.HTTPBadRequest(reason="The tails file doesn't match its hash")
+
+        self.tails[tails_id] = tails
+        return web.Response(text=tails_hash)
+
+    async def handle_get_tails(self, request: web.Request) -> web.Response:
+        tails = self.tails.get(request.match_info["tails_id"])
+        if tails is None:
+            raise web.HTTPNotFound()
+        return web.Response(body=tails, content_type="application/octet-stream")
+
+    async def handle_domain(self, request: web.Request) -> web.Response:
+        query = request.query.get("query")
+        txn_type = request.query.get("type")
+        results = [
+            txn
+            for txn in self.txns
+            if (not txn_type or txn["txn"]["type"] == txn_type)
+            and (not query or query in json.dumps(txn))
+        ]
+        return web.json_response({"results": results, "total": len(results)})
+
+    async def handle_status(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {"ready": True, "nyms": len(self.nyms), "txns": len(self.txns)}
+        )
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=TAILS_MAX_BYTES)
+        app.add_routes(
+            [
+                web.get("/genesis", self.handle_genesis),
+                web.post("/register", self.handle_register),
+                web.post("/submit", self.handle_submit),
+                web.get("/ledger/domain", self.handle_domain),
+                web.put("/tails/{tails_id:.+}", self.handle_put_tails),
+                web.get("/tails/{tails_id:.+}", self.handle_get_tails),
+                web.get("/status", self.handle_status),
+            ]
+        )
+        return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-memory von-network stand-in")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=9000)
+    args = parser.parse_args()
+
+    web.run_app(LedgerStandIn().app(), host=args.host, port=args.port)
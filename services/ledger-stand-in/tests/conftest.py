@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the stand-in is a single module, run as a script from its folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+
+import pytest
+
+pytest.importorskip("base58")
+pytest.importorskip("nacl.signing")
+
+import base58
+from aiohttp import FormData
+from aiohttp.test_utils import TestClient, TestServer
+
+from ledger_stand_in import (CLAIM_DEF, GET_CLAIM_DEF, GET_NYM, GET_REVOC_REG,
+                             GET_REVOC_REG_DELTA, GET_SCHEMA, REVOC_REG_DEF,
+                             REVOC_REG_ENTRY, SCHEMA, LedgerStandIn,
+                             RequestRejected)
+
+DID = "V4SGRU86Z58d6TV7PBUe6f"
+VERKEY = "GJ1SzoWzavQYfNL9XkaJdrQejfztN4XqdsiV4ct3LXKL"
+TAILS = b"\x00\x02" + bytes(range(256))
+TAILS_HASH = base58.b58encode(hashlib.sha256(TAILS).digest()).decode("ascii")
+
+
+def submit(ledger, operation, identifier=DID):
+    return ledger.submit({"identifier": identifier, "reqId": 1, "operation": operation})
+
+
+def write_entry(ledger, txn_time, accum, issued=(), revoked=()):
+    txn = submit(
+        ledger,
+        {
+            "type": REVOC_REG_ENTRY,
+            "revocRegDefId": "rev-reg-1",
+            "revocDefType": "CL_ACCUM",
+            "value": {"accum": accum, "issued": list(issued), "revoked": list(revoked)},
+        },
+    )
+    txn["txnMetadata"]["txnTime"] = txn_time
+    return txn
+
+
+@pytest.fixture
+def ledger():
+    ledger = LedgerStandIn()
+    ledger.register({"did": DID, "verkey": VERKEY})
+    submit(
+        ledger,
+        {"type": SCHEMA, "data": {"name": "degree", "version": "1.0", "attr_names": ["name"]}},
+    )
+    submit(
+        ledger,
+        {"type": CLAIM_DEF, "ref": 2, "signature_type": "CL", "tag": "tag", "data": {}},
+    )
+    submit(
+        ledger,
+        {
+            "type": REVOC_REG_DEF,
+            "id": "rev-reg-1",
+            "credDefId": f"{DID}:3:CL:2:tag",
+            "revocDefType": "CL_ACCUM",
+            "tag": "1",
+            "value": {"tailsHash": TAILS_HASH},
+        },
+    )
+    return ledger
+
+
+class TestSubmit:
+
+    def test_reads_the_writes(self, ledger):
+        nym = submit(ledger, {"type": GET_NYM, "dest": DID})
+        assert nym["seqNo"] == 1
+
+        schema = submit(
+            ledger,
+            {"type": GET_SCHEMA, "dest": DID, "data": {"name": "degree", "version": "1.0"}},
+        )
+        assert schema["seqNo"] == 2
+        assert schema["data"]["attr_names"] == ["name"]
+
+        cred_def = submit(
+            ledger,
+            {
+                "type": GET_CLAIM_DEF,
+                "origin": DID,
+                "ref": 2,
+                "signature_type": "CL",
+                "tag": "tag",
+            },
+        )
+        assert cred_def["seqNo"] == 3
+
+    def test_read_of_a_missing_record(self, ledger):
+        schema = submit(
+            ledger,
+            {"type": GET_SCHEMA, "dest": DID, "data": {"name": "degree", "version": "2.0"}},
+        )
+        assert schema["seqNo"] is None and schema["data"] == {
+            "name": "degree",
+            "version": "2.0",
+        }
+
+    def test_rejects_writes_by_unknown_dids(self, ledger):
+        with pytest.raises(RequestRejected):
+            submit(
+                ledger,
+                {"type": SCHEMA, "data": {"name": "other", "version": "1.0"}},
+                identifier="unknown",
+            )
+
+    def test_rejects_a_second_schema_version(self, ledger):
+        with pytest.raises(RequestRejected):
+            submit(
+                ledger, {"type": SCHEMA, "data": {"name": "degree", "version": "1.0"}}
+            )
+
+    @pytest.mark.parametrize(
+        "operation",
+        [
+            {"type": SCHEMA},
+            {"type": SCHEMA, "data": {"name": "degree"}},
+            {"type": CLAIM_DEF, "ref": 2, "tag": "tag", "data": {}},
+            {"type": REVOC_REG_DEF, "credDefId": f"{DID}:3:CL:2:tag", "value": {}},
+            {"type": REVOC_REG_ENTRY, "revocRegDefId": "rev-reg-1", "value": {}},
+        ],
+    )
+    def test_rejects_malformed_writes(self, ledger, operation):
+        txns = len(ledger.txns)
+        with pytest.raises(RequestRejected):
+            submit(ledger, operation)
+        assert len(ledger.txns) == txns
+
+    def test_rev_reg_at_a_timestamp(self, ledger):
+        write_entry(ledger, 100, "accum-1", issued=[1, 2, 3])
+        entry = write_entry(ledger, 200, "accum-2", revoked=[2])
+
+        rev_reg = submit(
+            ledger,
+            {"type": GET_REVOC_REG, "revocRegDefId": "rev-reg-1", "timestamp": 250},
+        )
+        assert rev_reg["seqNo"] == entry["txnMetadata"]["seqNo"]
+        assert rev_reg["data"]["value"] == {"accum": "accum-2"}
+
+    def test_rev_reg_delta_without_from(self, ledger):
+        write_entry(ledger, 100, "accum-1", issued=[1, 2, 3])
+        write_entry(ledger, 200, "accum-2", revoked=[2])
+        write_entry(ledger, 300, "accum-3", revoked=[1])
+
+        delta = submit(
+            ledger,
+            {"type": GET_REVOC_REG_DELTA, "revocRegDefId": "rev-reg-1", "to": 300},
+        )
+        value = delta["data"]["value"]
+        assert value["issued"] == [3] and value["revoked"] == [1, 2]
+        assert value["accum_to"]["value"] == {"accum": "accum-3"}
+        assert "accum_from" not in value
+
+    def test_rev_reg_delta_from(self, ledger):
+        write_entry(ledger, 100, "accum-1", issued=[1, 2, 3])
+        write_entry(ledger, 200, "accum-2", revoked=[2])
+        write_entry(ledger, 300, "accum-3", revoked=[1])
+
+        delta = submit(
+            ledger,
+            {
+                "type": GET_REVOC_REG_DELTA,
+                "revocRegDefId": "rev-reg-1",
+                "from": 150,
+                "to": 250,
+            },
+        )
+        value = delta["data"]["value"]
+        assert value["issued"] == [] and value["revoked"] == [2]
+        assert value["accum_from"]["value"] == {"accum": "accum-1"}
+        assert value["accum_to"]["value"] == {"accum": "accum-2"}
+
+
+def put_tails(ledger, tails_id, tails):
+    async def put():
+        async with TestClient(TestServer(ledger.app())) as client:
+            form = FormData()
+            form.add_field("tails", tails, filename="tails")
+            async with client.put(f"/tails/{tails_id}", data=form) as resp:
+                status = resp.status
+            async with client.get(f"/tails/{tails_id}") as resp:
+                return (status, resp.status, await resp.read())
+
+    return asyncio.run(put())
+
+
+class TestTails:
+
+    def test_put_and_get(self, ledger):
+        assert put_tails(ledger, "rev-reg-1", TAILS) == (200, 200, TAILS)
+
+    def test_put_by_hash(self, ledger):
+        assert put_tails(ledger, f"hash/{TAILS_HASH}", TAILS) == (200, 200, TAILS)
+
+    def test_rejects_a_tails_file_not_matching_its_hash(self, ledger):
+        (status, get_status, _) = put_tails(ledger, "rev-reg-1", TAILS + b"\x00")
+        assert status == 400 and get_status == 404
+
+    def test_unknown_rev_reg(self, ledger):
+        (status, _, _) = put_tails(ledger, "rev-reg-2", TAILS)
+        assert status == 404
+
+
+class TestHandleSubmit:
+
+    def test_malformed_write_is_rejected(self, ledger):
+        async def post():
+            async with TestClient(TestServer(ledger.app())) as client:
+                request = {
+                    "identifier": DID,
+                    "reqId": 7,
+                    "operation": {"type": CLAIM_DEF, "ref": 2, "data": {}},
+                }
+                async with client.post("/submit", json=request) as resp:
+                    return (resp.status, await resp.json())
+
+        (status, reply) = asyncio.run(post())
+        assert status == 200
+        assert reply["op"] == "REJECT" and reply["reqId"] == 7
+        assert "signature_type" in reply["reason"]
@@ -0,0 +1,44 @@
+#!/bin/bash
+
+SCRIPT_HOME="$( cd "$( dirname "$0" )" && pwd )"
+COMMAND=${1}
+
+export COMPOSE_PROJECT_NAME=ledger-stand-in
+
+pushd ${SCRIPT_HOME} > /dev/null
+
+# ========================================================================================================
+# Check Docker Compose
+# --------------------------------------------------------------------------------------------------------
+
+# Default to deprecated V1 'docker-compose'.
+dockerCompose="docker-compose --log-level ERROR"
+
+# Prefer 'docker compose' V2 if available
+if [[ $(docker compose version 2> /dev/null) == 'Docker Compose'* ]]; then
+  dockerCompose="docker --log-level error compose"
+fi
+echo "Using: ${dockerCompose}"
+
+case "${COMMAND}" in
+	clean)
+		${dockerCompose} down --volumes --rmi local
+		;;
+	build)
+		${dockerCompose} build
+		;;
+	start)
+		${dockerCompose} up -d --build
+		;;
+	stop)
+		${dockerCompose} down
+		;;
+	logs)
+		${dockerCompose} logs -f
+		;;
+	*)
+		echo "ledger-stand-in: valid commands are 'clean', 'build', 'start', 'stop', 'logs'"
+		;;
+esac
+
+popd > /dev/null # to caller